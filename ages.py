@@ -0,0 +1,283 @@
+"""
+Age analytics on NumPy arrays. The (born, prize year) pairs of every prize won by a person are fetched
+once with a projection, parsed into int arrays, and the yearly ages, the 5 year age buckets, the minor
+winners and the age-over-time regression are computed with vectorized operations instead of
+$substr/$toInt on every unwound row of every aggregation.
+
+Dates are "YYYY-MM-DD" strings. "0000-00-00" means the birth date is unknown and the prize is left out,
+like the KNOWN_BIRTH filter of the pipelines; partial dates such as "1898-00-00" keep their year and
+have month 0 and day 0. Ages are prize year minus birth year, the same as the pipelines.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from pipelines import KNOWN_BIRTH
+
+AGE_BOUNDARIES = np.arange(0, 105, 5)
+
+# one cell per year and per year of age for the age-over-time density grid
+YEAR_EDGES = np.arange(1900, 2041)
+AGE_EDGES = np.arange(0, 111)
+
+BIRTH_PROJECTION = {"_id": 0, "id": 1, "born": 1, "prizes.year": 1}
+
+LinearFit = namedtuple("LinearFit", ["slope", "intercept", "rvalue"])
+
+
+def parse_dates(values):
+    """
+    Parses "YYYY-MM-DD" strings, or their "YYYY" prefix, into int arrays
+    :param values: list of date strings, None for a missing date
+    :return: (year, month, day) int32 arrays, 0 where a part is unknown or missing
+    """
+    raw = np.array([(v or "").ljust(10, "0")[:10] for v in values], dtype="S10")
+    digits = raw.view(np.uint8).reshape(-1, 10).astype(np.int32) - ord("0")
+    if not len(digits):
+        empty = np.zeros(0, dtype=np.int32)
+        return empty, empty, empty
+    valid = ((digits >= 0) & (digits <= 9))[:, [0, 1, 2, 3, 5, 6, 8, 9]].all(axis=1)
+    year = np.where(valid, digits[:, 0] * 1000 + digits[:, 1] * 100 + digits[:, 2] * 10 + digits[:, 3], 0)
+    month = np.where(valid, digits[:, 5] * 10 + digits[:, 6], 0)
+    day = np.where(valid, digits[:, 8] * 10 + digits[:, 9], 0)
+    return year, month, day
+
+
+def linear_fit(x, y):
+    """
+    Least squares line through (x, y)
+    :param x: array of x values
+    :param y: array of y values
+    :return: LinearFit of the slope, intercept and correlation coefficient
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    dx = x - x.mean()
+    dy = y - y.mean()
+    sxx = (dx * dx).sum()
+    syy = (dy * dy).sum()
+    sxy = (dx * dy).sum()
+    slope = sxy / sxx if sxx else 0.0
+    rvalue = sxy / np.sqrt(sxx * syy) if sxx and syy else 0.0
+    return LinearFit(float(slope), float(y.mean() - slope * x.mean()), float(rvalue))
+
+
+class OnlineLinearFit:
+    """
+    Least squares line updated one chunk of points at a time. Only the count, the means and the sums of
+    squared deviations are kept, merged with the pairwise update of Chan et al., so memory does not grow
+    with the number of points and the result matches linear_fit on all of them.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.sxx = 0.0
+        self.syy = 0.0
+        self.sxy = 0.0
+
+    def _merge(self, n, mean_x, mean_y, sxx, syy, sxy):
+        total = self.n + n
+        if not n or not total:
+            return
+        dx = mean_x - self.mean_x
+        dy = mean_y - self.mean_y
+        weight = self.n * n / total
+        self.mean_x += dx * n / total
+        self.mean_y += dy * n / total
+        self.sxx += sxx + dx * dx * weight
+        self.syy += syy + dy * dy * weight
+        self.sxy += sxy + dx * dy * weight
+        self.n = total
+
+    def update(self, x, y):
+        """
+        :param x: array of x values
+        :param y: array of y values
+        :return: self
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if len(x):
+            dx = x - x.mean()
+            dy = y - y.mean()
+            self._merge(len(x), x.mean(), y.mean(), (dx * dx).sum(), (dy * dy).sum(), (dx * dy).sum())
+        return self
+
+    def merge(self, other):
+        """
+        Adds the points of another OnlineLinearFit, e.g. one computed by another worker
+        :param other: OnlineLinearFit
+        :return: self
+        """
+        self._merge(other.n, other.mean_x, other.mean_y, other.sxx, other.syy, other.sxy)
+        return self
+
+    def fit(self):
+        """
+        :return: LinearFit of the points so far
+        """
+        slope = self.sxy / self.sxx if self.sxx else 0.0
+        rvalue = self.sxy / np.sqrt(self.sxx * self.syy) if self.sxx and self.syy else 0.0
+        return LinearFit(float(slope), float(self.mean_y - slope * self.mean_x), float(rvalue))
+
+
+class AgeDensity:
+    """
+    Number of prizes in each (prize year, age) cell of a fixed grid, with the online regression of age
+    against year. Its size depends on the grid only, however many prizes are added.
+    """
+
+    def __init__(self, year_edges=YEAR_EDGES, age_edges=AGE_EDGES):
+        """
+        :param year_edges: sorted edges of the year cells, defaults to every year from 1900 to 2040
+        :param age_edges: sorted edges of the age cells, defaults to every age from 0 to 110
+        """
+        self.year_edges = np.asarray(year_edges)
+        self.age_edges = np.asarray(age_edges)
+        self.counts = np.zeros((len(self.year_edges) - 1, len(self.age_edges) - 1), dtype=np.int64)
+        self.outside = 0
+        self.regression = OnlineLinearFit()
+
+    def __len__(self):
+        return self.regression.n
+
+    @classmethod
+    def from_chunks(cls, chunks, **kwargs):
+        """
+        :param chunks: iterable of (prize years, ages) arrays, e.g. NobelAPI.iter_laureate_ages_yearly(
+                       chunk_size, arrays=True)
+        :param kwargs: grid edges of AgeDensity
+        :return: AgeDensity of every chunk
+        """
+        density = cls(**kwargs)
+        for years, ages in chunks:
+            density.update(years, ages)
+        return density
+
+    @classmethod
+    def from_table(cls, table, **kwargs):
+        """
+        :param table: AgeTable
+        :param kwargs: grid edges of AgeDensity
+        :return: AgeDensity of the table's prizes
+        """
+        return cls(**kwargs).update(*table.yearly())
+
+    def update(self, years, ages):
+        """
+        :param years: array of prize years
+        :param ages: array of ages
+        :return: self
+        """
+        years = np.asarray(years)
+        ages = np.asarray(ages)
+        counts, _, _ = np.histogram2d(years, ages, bins=(self.year_edges, self.age_edges))
+        counts = counts.astype(np.int64)
+        self.counts += counts
+        self.outside += len(years) - int(counts.sum())
+        self.regression.update(years, ages)
+        return self
+
+    def year_range(self):
+        """
+        :return: (first, last) edge of the years holding any prize, or None when the grid is empty
+        """
+        filled = np.flatnonzero(self.counts.any(axis=1))
+        if not len(filled):
+            return None
+        return self.year_edges[filled[0]], self.year_edges[filled[-1] + 1]
+
+
+class AgeTable:
+    """
+    One row per prize won by a person with a known birth year
+    """
+
+    def __init__(self, ids, prize_index, year, born_year, born_month, born_day):
+        """
+        :param ids: laureate ids
+        :param prize_index: position of the prize in the laureate's prizes array
+        :param year: prize years
+        :param born_year: birth years
+        :param born_month: birth months, 0 when unknown
+        :param born_day: birth days, 0 when unknown
+        """
+        self.ids = np.asarray(ids, dtype=object)
+        self.prize_index = np.asarray(prize_index, dtype=np.int32)
+        self.year = np.asarray(year, dtype=np.int32)
+        self.born_year = np.asarray(born_year, dtype=np.int32)
+        self.born_month = np.asarray(born_month, dtype=np.int32)
+        self.born_day = np.asarray(born_day, dtype=np.int32)
+        self.age = self.year - self.born_year
+
+    def __len__(self):
+        return len(self.year)
+
+    @classmethod
+    def from_laureates(cls, laureates):
+        """
+        :param laureates: iterable of laureate documents, e.g. loader.iter_laureates(path) or a cursor
+        :return: AgeTable of their prizes; organizations and unknown birth dates are skipped
+        """
+        ids, prize_index, years, born = [], [], [], []
+        for laureate in laureates:
+            if laureate.get("gender") == "org":
+                continue
+            for i, prize in enumerate(laureate.get("prizes", [])):
+                ids.append(laureate.get("id"))
+                prize_index.append(i)
+                years.append(prize["year"])
+                born.append(laureate.get("born"))
+        year, _, _ = parse_dates(years)
+        born_year, born_month, born_day = parse_dates(born)
+        known = born_year > 0
+        return cls(np.array(ids, dtype=object)[known], np.array(prize_index, dtype=np.int32)[known],
+                   year[known], born_year[known], born_month[known], born_day[known])
+
+    @classmethod
+    def from_collection(cls, collection, batch_size=1000):
+        """
+        Fetches only the fields the ages need from the laureate collection
+        :param collection: the laureate collection
+        :param batch_size: documents per cursor batch, defaults to 1000
+        :return: AgeTable
+        """
+        return cls.from_laureates(collection.find(KNOWN_BIRTH, BIRTH_PROJECTION, batch_size=batch_size))
+
+    def yearly(self):
+        """
+        :return: (prize years, ages) arrays in the order of the prizes
+        """
+        return self.year, self.age
+
+    def buckets(self, boundaries=AGE_BOUNDARIES):
+        """
+        Counts prizes per age bucket like the $bucket stage of ages_of_laureates
+        :param boundaries: sorted bucket edges, defaults to every 5 years from 0 to 100
+        :return: dictionary of bucket lower edges and counts, plus "other" for ages outside the edges
+        """
+        boundaries = np.asarray(boundaries)
+        inside = (self.age >= boundaries[0]) & (self.age < boundaries[-1])
+        counts = np.bincount(np.searchsorted(boundaries, self.age[inside], side="right") - 1,
+                             minlength=len(boundaries) - 1)
+        result = {int(boundaries[i]): int(count) for i, count in enumerate(counts) if count}
+        other = int((~inside).sum())
+        if other:
+            result["other"] = other
+        return result
+
+    def minors(self, age=18):
+        """
+        :param age: the age winners had to be under, defaults to 18
+        :return: (laureate ids, prize indexes, ages) arrays of the prizes won under that age
+        """
+        rows = self.age < age
+        return self.ids[rows], self.prize_index[rows], self.age[rows]
+
+    def regression(self):
+        """
+        :return: LinearFit of age against prize year
+        """
+        return linear_fit(self.year, self.age)
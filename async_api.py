@@ -0,0 +1,262 @@
+"""
+asyncio version of NobelAPI for services that cannot block the event loop. Every method returns exactly what
+the NobelAPI method of the same name returns and shares its result cache. The plotting methods stay on NobelAPI.
+
+The aggregation queries in NATIVE_QUERIES run on an asyncio driver when one is installed: PyMongo's
+AsyncMongoClient (pymongo 4.9+), or else Motor. They build the same pipelines from the registries in
+pipelines.py as MongoBackend and shape them with backends.RESULT_SHAPES. Everything else runs the NobelAPI
+method on a thread pool. That includes loading the laureates, rebuilding stale prize_facts, the age table,
+motivation search and the streaming iter_* methods. Every query falls back to the pool when no driver is
+installed, when the backend is not a MongoBackend, or when db or api is given without async_db.
+
+    api = AsyncNobelAPI()
+    results = await api.gather(["top_countries", "top_categories", ("most_prizes_per_year", {"limit": 5})])
+    async for years, ages in api.iter_laureate_ages_yearly(chunk_size=10000, arrays=True):
+        ...
+"""
+import asyncio
+import functools
+import inspect
+import time
+
+from backends import RESULT_SHAPES, MongoBackend
+from connection import default_uri
+from loader import METADATA_COLLECTION
+from nobel_api import NobelAPI
+from prize_facts import FACTS_COLLECTION, GROUPS_COLLECTION, build_prize_facts, build_prize_groups
+import pipelines
+
+# the queries MongoBackend answers with a single pipeline from the registries
+NATIVE_QUERIES = ("top_countries", "top_categories", "most_prizes_per_year", "laureate_gender",
+                  "category_introduction_year", "top_category_per_country", "category_winner_counts",
+                  "solo_vs_collaborative_prizes", "categories_split", "country_decades_winners")
+
+_DONE = object()
+
+
+def async_client_class():
+    """
+    :return: PyMongo's AsyncMongoClient, or Motor's AsyncIOMotorClient on older pymongo, or None if neither
+             is installed
+    """
+    try:
+        from pymongo import AsyncMongoClient
+
+        return AsyncMongoClient
+    except ImportError:
+        pass
+    try:
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        return AsyncIOMotorClient
+    except ImportError:
+        return None
+
+
+async def _resolve(value):
+    # PyMongo's async aggregate and close are coroutines, while Motor's return the cursor or None directly
+    return await value if inspect.isawaitable(value) else value
+
+
+class AsyncNobelAPI:
+
+    def __init__(self, db=None, api=None, executor=None, async_db=None, **kwargs):
+        """
+        Nothing is connected or loaded until the first query
+        :param db: the pymongo database to query, defaults to the prize database of the shared MongoClient
+        :param api: NobelAPI to run the queries with, defaults to NobelAPI(db, **kwargs)
+        :param executor: concurrent.futures executor the thread pool methods run on, defaults to the event loop's
+        :param async_db: the same database opened with an asyncio driver, defaults to one opened with
+                         async_client_class() when db and api are None
+        :param kwargs: other arguments of NobelAPI, such as path, use_facts, cache, uri or client_options
+        """
+        self.api = api if api is not None else NobelAPI(db, **kwargs)
+        self.executor = executor
+        self._async_db = async_db
+        self._client = None
+        self._uri = kwargs.get("uri")
+        self._client_options = kwargs.get("client_options") or {}
+        self.native = isinstance(self.api.backend, MongoBackend) and (
+            async_db is not None or (db is None and api is None and async_client_class() is not None))
+        self._collection = None
+        self._version = None
+        self._version_checked = None
+
+    async def _call(self, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(method, *args, **kwargs))
+
+    async def _iterate(self, method, *args):
+        # each step of the generator runs on the pool; pass chunk_size so a step reads many rows
+        rows = await self._call(method, *args)
+        try:
+            while (row := await self._call(next, rows, _DONE)) is not _DONE:
+                yield row
+        finally:
+            # closes the cursor when the caller stops early
+            await asyncio.get_running_loop().run_in_executor(self.executor, rows.close)
+
+    async def _laureates(self):
+        """
+        Loads the laureates through NobelAPI on first use
+        :return: the synchronous laureate collection
+        """
+        if self._collection is None:
+            self._collection = await self._call(getattr, self.api, "collection")
+        return self._collection
+
+    async def _database(self):
+        """
+        :return: the async database, opening a client of async_client_class() on the shared client's uri
+                 on first use
+        """
+        if self._async_db is None:
+            collection = await self._laureates()
+            self._client = async_client_class()(default_uri(self._uri), **self._client_options)
+            self._async_db = self._client[collection.database.name]
+        return self._async_db
+
+    async def _source(self, name, version):
+        """
+        Picks the registry and async collection like MongoBackend._source. When the dataset version changed
+        since prize_facts or prize_groups was built, they are rebuilt on the pool first.
+        """
+        db = await self._database()
+        backend = self.api.backend
+        if backend.use_facts and version is not None:
+            for registry, target, build in ((pipelines.GROUP_PIPELINES, GROUPS_COLLECTION, build_prize_groups),
+                                            (pipelines.FACT_PIPELINES, FACTS_COLLECTION, build_prize_facts)):
+                if name in registry:
+                    if backend._derived.get(target) != version:
+                        await self._call(backend._current, target, build)
+                    return registry, db[target]
+        return pipelines.PIPELINES, db[self._collection.name]
+
+    async def _query(self, name, **arguments):
+        """
+        Runs a query natively, reading and filling NobelAPI's result cache like the cached decorator
+        :param name: name of a query in NATIVE_QUERIES
+        :param arguments: every argument of the NobelAPI method, defaults included
+        :return: the shaped result
+        """
+        if not self.native:
+            return await self._call(getattr(self.api, name), **arguments)
+        version = await self.dataset_version()
+        cache = self.api.cache
+        if cache is not None:
+            hit, result = cache.get(name, arguments, version)
+            if hit:
+                return result
+        registry, collection = await self._source(name, version)
+        with registry.timed(name):
+            cursor = await _resolve(collection.aggregate(registry.build(name, **arguments)))
+            result = RESULT_SHAPES[name](await cursor.to_list(None))
+        if cache is not None:
+            cache.set(name, arguments, version, result)
+        return result
+
+    async def close(self):
+        """
+        Closes the async client if this instance opened it and releases the NobelAPI's connection
+        :return: None
+        """
+        if self._client is not None:
+            await _resolve(self._client.close())
+            self._client = None
+            self._async_db = None
+        self._collection = None
+        await self._call(self.api.close)
+
+    async def dataset_version(self):
+        """
+        The version stamp of the laureates, looked up at most once every version_ttl seconds of the NobelAPI
+        :return: the dataset version string, or None if it is unknown
+        """
+        if not self.native:
+            return await self._call(self.api.dataset_version)
+        now = time.monotonic()
+        if self._version_checked is None or now - self._version_checked > self.api.version_ttl:
+            collection = await self._laureates()
+            db = await self._database()
+            meta = await db[METADATA_COLLECTION].find_one({"_id": collection.name}, {"checksum": 1})
+            self._version = meta["checksum"] if meta else None
+            self._version_checked = now
+        return self._version
+
+    async def top_countries(self, limit=10):
+        return await self._query("top_countries", limit=limit)
+
+    async def top_categories(self):
+        return await self._query("top_categories")
+
+    async def most_prizes_per_year(self, limit=10):
+        return await self._query("most_prizes_per_year", limit=limit)
+
+    async def laureate_gender(self):
+        return await self._query("laureate_gender")
+
+    async def laureate_ages_yearly(self, batch_size=None):
+        return await self._call(self.api.laureate_ages_yearly, batch_size)
+
+    def iter_laureate_ages_yearly(self, chunk_size=None, arrays=False, batch_size=None):
+        return self._iterate(self.api.iter_laureate_ages_yearly, chunk_size, arrays, batch_size)
+
+    async def ages_of_laureates(self):
+        return await self._call(self.api.ages_of_laureates)
+
+    async def age_table(self):
+        return await self._call(self.api.age_table)
+
+    async def age_density(self, chunk_size=100000, **kwargs):
+        return await self._call(self.api.age_density, chunk_size, **kwargs)
+
+    async def minor_winners(self, fields=None, batch_size=None):
+        return await self._call(self.api.minor_winners, fields, batch_size)
+
+    def iter_minor_winners(self, fields=None, columns=None, chunk_size=None, arrays=False, batch_size=None):
+        return self._iterate(self.api.iter_minor_winners, fields, columns, chunk_size, arrays, batch_size)
+
+    async def category_introduction_year(self):
+        return await self._query("category_introduction_year")
+
+    async def top_category_per_country(self, limit=10):
+        return await self._query("top_category_per_country", limit=limit)
+
+    async def category_winner_counts(self):
+        return await self._query("category_winner_counts")
+
+    async def avg_winners_per_category(self):
+        return await self._call(self.api.avg_winners_per_category)
+
+    async def solo_vs_collaborative_prizes(self):
+        return await self._query("solo_vs_collaborative_prizes")
+
+    async def categories_split(self):
+        return await self._query("categories_split")
+
+    async def country_decades_winners(self):
+        return await self._query("country_decades_winners")
+
+    async def search_motivations(self, query, limit=10, category=None):
+        return await self._call(self.api.search_motivations, query, limit, category)
+
+    async def batch(self, queries):
+        return await self._call(self.api.batch, queries)
+
+    async def gather(self, queries):
+        """
+        Runs independent queries concurrently with asyncio.gather
+        :param queries: list of query method names, or (name, dictionary of arguments) pairs
+        :return: dictionary of query names and results
+        :raises ValueError: for a name that is not a query or appears more than once
+        """
+        requests = {}
+        for query in queries:
+            name, kwargs = (query, {}) if isinstance(query, str) else query
+            if name not in RESULT_SHAPES:
+                raise ValueError(f"{name} is not a NobelAPI query")
+            if name in requests:
+                raise ValueError(f"{name} is requested more than once")
+            requests[name] = kwargs
+        results = await asyncio.gather(*(getattr(self, name)(**kwargs) for name, kwargs in requests.items()))
+        return dict(zip(requests, results))
@@ -0,0 +1,335 @@
+"""
+Query backends for NobelAPI. A backend answers every NobelAPI query with the same return shapes;
+NobelAPI adds caching and plotting on top. MongoBackend runs the pipelines in pipelines.py, and
+columnar.ColumnarBackend answers the same queries from NumPy arrays without a database.
+"""
+import os
+import threading
+
+from ages import BIRTH_PROJECTION, AgeTable
+from connection import acquire_client, release_client
+from indexes import ensure_indexes
+from loader import dataset_version, load_laureates
+from motivation_search import build_motivation_index
+from prize_facts import FACTS_COLLECTION, GROUPS_COLLECTION, build_prize_facts, build_prize_groups
+import pipelines
+
+
+def _counts(docs):
+    return {doc["_id"]: doc["count"] for doc in docs}
+
+
+RESULT_SHAPES = {
+    "top_countries": _counts,
+    "top_categories": _counts,
+    "most_prizes_per_year": _counts,
+    "laureate_gender": _counts,
+    "laureate_ages_yearly": list,
+    "ages_of_laureates": _counts,
+    "minor_winners": list,
+    "category_introduction_year": lambda docs: {doc["_id"]: doc["firstYear"] for doc in docs},
+    "top_category_per_country": lambda docs: {doc["_id"]: {"category": doc["topCategory"], "count": doc["count"]}
+                                              for doc in docs},
+    "category_winner_counts": list,
+    "country_decades_winners": lambda docs: {(doc["_id"]["country"], doc["_id"]["decade"]): doc["count"]
+                                             for doc in docs},
+    "solo_vs_collaborative_prizes": lambda docs: {(doc["_id"]["decade"], doc["_id"]["type"]): doc["count"]
+                                                  for doc in docs},
+    "categories_split": lambda docs: {doc["_id"]: doc["unevenCount"] for doc in docs},
+}
+
+
+def winner_counts_by_category(docs):
+    """
+    :param docs: result of category_winner_counts
+    :return: dictionary of categories and their one, two, three and four or more winner counts, like
+             avg_winners_per_category in nobel_prize_collection.py
+    """
+    return {doc["_id"]: {field: doc[field] for field in
+                         ("one_winner", "two_winners", "three_winners", "four_or_more_winners")}
+            for doc in docs}
+
+
+class MongoBackend:
+
+    def __init__(self, db=None, path="laureate.json", use_facts=True, instrumentation=None, uri=None,
+                 client_options=None):
+        """
+        Nothing is connected or loaded until the first query
+        :param db: the mongo database to query, defaults to the prize database of the shared client for
+                   uri and client_options
+        :param path: laureate.json to load into the collection before the first query, None to skip loading
+        :param use_facts: answer the per-prize queries from the prize_facts collection and the co-winner
+                          queries from prize_groups, defaults to True; needs MongoDB 5.2, see prize_facts.py
+        :param instrumentation: instrumentation.Instrumentation recording every aggregate and find, defaults to None
+        :param uri: mongodb uri of the shared client when db is None, see connection.py
+        :param client_options: dictionary of MongoClient options of the shared client, e.g.
+                               {"readPreference": "secondaryPreferred"}
+        """
+        self._db = db
+        self._uri = uri
+        self.client_options = client_options or {}
+        self.instrumentation = instrumentation
+        self._path = path
+        self.use_facts = use_facts
+        self._client = None
+        self._pid = None
+        self._collection = None
+        self._init_lock = threading.Lock()
+        self._ages = None
+        self._motivations = None
+        self._derived = {}
+
+    @property
+    def collection(self):
+        """
+        The laureate collection, connecting and loading the data on first access
+        """
+        if self._client is not None and self._pid != os.getpid():
+            self._forget_inherited()
+        if self._collection is None:
+            with self._init_lock:
+                # another thread may have finished connecting and loading while this one waited
+                if self._collection is None:
+                    if self._db is None:
+                        self._client = acquire_client(self._uri, **self.client_options)
+                        self._pid = os.getpid()
+                        self._db = self._client.prize
+                    if self._path is not None:
+                        load_laureates(self._db, self._path)
+                        ensure_indexes(self._db.collection)
+                    # prize_facts and prize_groups are built by _current when first queried
+                    self._collection = self._db.collection
+        return self._collection
+
+    def _forget_inherited(self):
+        # a forked child must not use the parent's sockets; connection.py has already forgotten the client,
+        # so it is dropped rather than released, and the lock is replaced in case a parent thread held it
+        self._init_lock = threading.Lock()
+        self._client = None
+        self._pid = None
+        self._db = None
+        self._collection = None
+
+    @property
+    def facts(self):
+        """
+        The prize_facts collection, built on first access along with the laureate collection
+        """
+        return self.collection.database[FACTS_COLLECTION]
+
+    @property
+    def groups(self):
+        """
+        The prize_groups collection, built on first access along with the laureate collection
+        """
+        return self.collection.database[GROUPS_COLLECTION]
+
+    def _current(self, target, build):
+        """
+        Checks a derived collection against the loaded dataset version, like the result cache, and rebuilds
+        it when the laureates were reloaded since it was built
+        :param target: name of the derived collection
+        :param build: build_prize_facts or build_prize_groups
+        :return: True if the derived collection matches the laureates, False if the laureates have no
+                 version to check against and queries should read the laureate collection
+        """
+        collection = self.collection
+        version = self.dataset_version()
+        if version is None:
+            return False
+        if self._derived.get(target) != version:
+            with self._init_lock:
+                if self._derived.get(target) != version:
+                    # a no-op when another process already built it for this version
+                    build(collection.database, collection.name)
+                    self._derived[target] = version
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Releases the shared MongoClient if this backend borrowed one; it is closed once no other backend
+        holds it
+        :return: None
+        """
+        with self._init_lock:
+            if self._client is not None:
+                release_client(self._client)
+                self._client = None
+                self._db = None
+            self._collection = None
+            self._ages = None
+            self._motivations = None
+            self._derived = {}
+
+    def dataset_version(self):
+        """
+        :return: the version stamp the loader wrote for the collection, or None if it was loaded some other way
+        """
+        return dataset_version(self.collection.database, self.collection.name)
+
+    def _source(self, name):
+        """
+        :param name: name of the pipeline in pipelines.py
+        :return: (registry, collection) to run it with: prize_groups if it has a groups version, then
+                 prize_facts if it has a facts version, otherwise the laureate collection. The derived
+                 collections are only read once they match the loaded laureates.
+        """
+        if self.use_facts and name in pipelines.GROUP_PIPELINES and self._current(GROUPS_COLLECTION,
+                                                                                  build_prize_groups):
+            return pipelines.GROUP_PIPELINES, self.groups
+        if self.use_facts and name in pipelines.FACT_PIPELINES and self._current(FACTS_COLLECTION,
+                                                                                 build_prize_facts):
+            return pipelines.FACT_PIPELINES, self.facts
+        return pipelines.PIPELINES, self.collection
+
+    def _query(self, name, batch_size=None, **params):
+        """
+        Runs the named pipeline against the collection picked by _source and shapes the results like the
+        NobelAPI method of the same name
+        :param name: name of the pipeline in pipelines.py
+        :param batch_size: documents per cursor batch, defaults to the server's
+        :param params: keyword arguments of the pipeline builder
+        :return: the shaped result
+        """
+        registry, collection = self._source(name)
+        return registry.run(collection, name, RESULT_SHAPES[name], batch_size, self.instrumentation, **params)
+
+    def _stream(self, name, batch_size=None, **params):
+        """
+        Like _query, but yields the unshaped documents as the cursor returns them
+        """
+        registry, collection = self._source(name)
+        return registry.stream(collection, name, batch_size, self.instrumentation, **params)
+
+    def top_countries(self, limit=10):
+        return self._query("top_countries", limit=limit)
+
+    def top_categories(self):
+        return self._query("top_categories")
+
+    def most_prizes_per_year(self, limit=10):
+        return self._query("most_prizes_per_year", limit=limit)
+
+    def laureate_gender(self):
+        return self._query("laureate_gender")
+
+    def age_table(self, batch_size=1000):
+        """
+        Fetches the birth dates and prize years once per dataset version and parses them into arrays
+        :param batch_size: documents per cursor batch when the table is fetched, defaults to 1000
+        :return: ages.AgeTable
+        """
+        version = self.dataset_version()
+        if self._ages is None or self._ages[0] != version or version is None:
+            with pipelines.PIPELINES.timed("age_table"):
+                if self.instrumentation is not None and self.instrumentation.enabled:
+                    laureates = self.instrumentation.find(self.collection, "age_table", pipelines.KNOWN_BIRTH,
+                                                          BIRTH_PROJECTION, batch_size=batch_size)
+                    self._ages = (version, AgeTable.from_laureates(laureates))
+                else:
+                    self._ages = (version, AgeTable.from_collection(self.collection, batch_size))
+        return self._ages[1]
+
+    def motivation_index(self):
+        """
+        Loads the motivation index persisted in the database once per dataset version, re-indexing the
+        laureates that changed since it was saved
+        :return: motivation_search.MotivationIndex
+        """
+        version = self.dataset_version()
+        if self._motivations is None or self._motivations[0] != version or version is None:
+            with pipelines.PIPELINES.timed("motivation_index"):
+                index = build_motivation_index(self.collection.database, self.collection.name)
+            self._motivations = (version, index)
+        return self._motivations[1]
+
+    def search_motivations(self, query, limit=10, category=None):
+        return self.motivation_index().search(query, limit, category)
+
+    def laureate_ages_yearly(self, batch_size=None):
+        years, ages = self.age_table(batch_size or 1000).yearly()
+        return [{"year": int(year), "age": int(age)} for year, age in zip(years.tolist(), ages.tolist())]
+
+    def iter_laureate_ages_yearly(self, batch_size=None):
+        return self._stream("laureate_ages_yearly", batch_size)
+
+    def ages_of_laureates(self):
+        return self.age_table().buckets()
+
+    def minor_winners(self, fields=None, batch_size=None):
+        ids, prize_index, ages = self.age_table().minors()
+        if not len(ids):
+            return []
+        # projected prize arrays keep their length, so the prize index still points at the right prize
+        spec = pipelines.projection(fields, "id")
+        query = {"id": {"$in": list(set(ids.tolist()))}}
+        if self.instrumentation is not None and self.instrumentation.enabled:
+            cursor = self.instrumentation.find(self.collection, "minor_winners", query, spec,
+                                               {"fields": fields}, batch_size or 0)
+        else:
+            cursor = self.collection.find(query, spec, batch_size=batch_size or 0)
+        laureates = {doc["id"]: doc for doc in cursor}
+        keep_id = fields is None or "id" in fields
+        results = []
+        for i, p, age in zip(ids.tolist(), prize_index.tolist(), ages.tolist()):
+            row = dict(laureates[i])
+            if "prizes" in row:
+                row["prizes"] = row["prizes"][p]
+            if not keep_id:
+                del row["id"]
+            row["age"] = age
+            results.append(row)
+        return results
+
+    def iter_minor_winners(self, fields=None, batch_size=None):
+        registry, collection = self._source("minor_winners")
+        if registry is pipelines.FACT_PIPELINES:
+            # the facts pipeline looks the documents up in the laureate collection, whatever its name
+            return registry.stream(collection, "minor_winners", batch_size, self.instrumentation,
+                                   collection_name=self.collection.name, fields=fields)
+        return registry.stream(collection, "minor_winners", batch_size, self.instrumentation, fields=fields)
+
+    def category_introduction_year(self):
+        return self._query("category_introduction_year")
+
+    def top_category_per_country(self, limit=10):
+        return self._query("top_category_per_country", limit=limit)
+
+    def category_winner_counts(self):
+        return self._query("category_winner_counts")
+
+    def avg_winners_per_category(self):
+        return winner_counts_by_category(self.category_winner_counts())
+
+    def solo_vs_collaborative_prizes(self):
+        return self._query("solo_vs_collaborative_prizes")
+
+    def categories_split(self):
+        return self._query("categories_split")
+
+    def country_decades_winners(self):
+        return self._query("country_decades_winners")
+
+    def batch(self, queries):
+        """
+        Runs several queries in a single aggregation round trip
+        :param queries: list of (query name, dictionary of arguments) pairs
+        :return: dictionary of query names and results
+        """
+        facets = {name: pipelines.facet_pipeline(pipelines.PIPELINES.build(
+                      name, **{k: v for k, v in arguments.items() if k != "batch_size"}))
+                  for name, arguments in queries}
+        with pipelines.PIPELINES.timed("batch"):
+            if self.instrumentation is not None and self.instrumentation.enabled:
+                outputs = self.instrumentation.aggregate(self.collection, "batch", pipelines.batch_pipeline(facets),
+                                                         dict(queries))[0]
+            else:
+                outputs = next(self.collection.aggregate(pipelines.batch_pipeline(facets)))
+        return {name: RESULT_SHAPES[name](outputs[name]) for name, _ in queries}
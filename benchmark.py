@@ -0,0 +1,255 @@
+"""
+Benchmarks the load path and every NobelAPI query and registry pipeline, and writes the results as json so
+runs from different commits can be compared.
+
+    python benchmark.py --backend mongo --scale 1 10 --output bench_results.json
+    python benchmark.py --backend columnar --compare old_results.json
+
+Backends:
+    mongo     a local mongod (or --uri), using the "nobel_bench" database which is dropped first
+    mongomock an in-memory mongomock client, if mongomock is installed
+    columnar  columnar.ColumnarBackend, which has no load path or pipelines and only times the queries
+
+Every query is timed cold (first call on a new NobelAPI, including the connection and load), warm (later
+calls served by the result cache) and uncached (repeated calls with the cache turned off). Times are
+reported as p50/p95/p99 in milliseconds, memory as the peak of Python allocations during the runs.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import pipelines
+from backends import RESULT_SHAPES
+from columnar import ColumnarBackend
+from indexes import execution_summary, explain_pipeline, sample_parameters
+from loader import insert_laureates, iter_laureates, load_laureates
+from nobel_api import NobelAPI
+from synthetic import LaureateModel, write_dataset
+
+BENCH_DATABASE = "nobel_bench"
+
+
+def percentiles(samples):
+    """
+    :param samples: list of durations in seconds
+    :return: dictionary of p50, p95, p99, mean and max in milliseconds
+    """
+    ordered = sorted(samples)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))] * 1000
+
+    return {"p50": rank(50), "p95": rank(95), "p99": rank(99),
+            "mean": sum(ordered) / len(ordered) * 1000, "max": ordered[-1] * 1000, "runs": len(ordered)}
+
+
+def measure(func, repeat=1, setup=None):
+    """
+    Times repeated calls of func and tracks the peak Python memory allocated while they run
+    :param func: function with no arguments
+    :param repeat: number of calls, defaults to 1
+    :param setup: function called before every call and not timed
+    :return: dictionary of latency percentiles plus "peak_kb"
+    """
+    samples = []
+    tracemalloc.start()
+    try:
+        for _ in range(repeat):
+            if setup is not None:
+                setup()
+            tracemalloc.reset_peak()
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {**percentiles(samples), "peak_kb": peak / 1024}
+
+
+def scale_dataset(path, factor, out_path, seed=0):
+    """
+    Writes a synthetic dataset factor times the size of path, drawn from the distributions of path
+    :param path: laureate.json
+    :param factor: size of the new dataset as a multiple of path
+    :param out_path: where to write the wrapped {"laureates": [...]} file
+    :param seed: random seed, so every run benchmarks the same data, defaults to 0
+    :return: out_path
+    """
+    count = factor * sum(1 for _ in iter_laureates(path))
+    write_dataset(LaureateModel.fit(path).generate(count, seed), out_path)
+    return out_path
+
+
+def bench_load(db, path, repeat):
+    """
+    Times the legacy json.load + insert_many load, the streaming insert, and load_laureates on a fresh
+    and on an unchanged collection
+    """
+    collection = db.bench_load
+
+    def legacy():
+        with open(path) as json_file:
+            data = json.load(json_file)
+        collection.insert_many(data["laureates"])
+
+    def reset():
+        db.drop_collection("bench_load")
+        db.metadata.delete_one({"_id": "bench_load"})
+
+    results = {
+        "json_load+insert_many": measure(legacy, repeat, setup=reset),
+        "insert_laureates": measure(lambda: insert_laureates(collection, path), repeat, setup=reset),
+        "load_laureates:fresh": measure(lambda: load_laureates(db, path, "bench_load"), repeat, setup=reset),
+        "load_laureates:unchanged": measure(lambda: load_laureates(db, path, "bench_load"), repeat),
+    }
+    reset()
+    return results
+
+
+def bench_api(make_api, repeat):
+    """
+    Times every NobelAPI query cold, warm and uncached
+    :param make_api: function returning a new NobelAPI, taking the cache argument
+    :param repeat: number of warm and uncached runs per query
+    """
+    results = {}
+    for name in RESULT_SHAPES:
+        cold = measure(lambda: getattr(make_api(cache=True), name)())
+        api = make_api(cache=True)
+        getattr(api, name)()
+        warm = measure(lambda: getattr(api, name)(), repeat)
+        uncached_api = make_api(cache=False)
+        getattr(uncached_api, name)()
+        uncached = measure(lambda: getattr(uncached_api, name)(), repeat)
+        results[name] = {"cold": cold, "warm": warm, "uncached": uncached}
+    return results
+
+
+def bench_pipelines(collection, repeat, explain=True):
+    """
+    Times every pipeline in the registry against the laureate collection, the way the functions in
+    nobel_prize_collection.py run them, and records the work reported by explain
+    """
+    results = {}
+    samples = sample_parameters(collection)
+    for name in pipelines.PIPELINES:
+        params = samples.get(name, {})
+        pipeline = pipelines.PIPELINES.build(name, **params)
+        results[name] = measure(lambda: list(collection.aggregate(pipeline)), repeat)
+        if explain:
+            results[name].update(execution_summary(explain_pipeline(collection, pipeline, "executionStats")))
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _database(backend, uri):
+    if backend == "mongomock":
+        import mongomock
+
+        return mongomock.MongoClient()[BENCH_DATABASE]
+    from connection import acquire_client
+
+    client = acquire_client(uri)
+    client.drop_database(BENCH_DATABASE)
+    return client[BENCH_DATABASE]
+
+
+def run(backend="mongo", path="laureate.json", scales=(1,), repeat=20, uri=None, workdir=None):
+    """
+    Runs the whole benchmark
+    :return: dictionary of results, one entry per scale
+    """
+    report = {"commit": _git_commit(), "time": time.time(), "backend": backend, "repeat": repeat,
+              "python": platform.python_version(), "scales": {}}
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        for factor in scales:
+            data_path = path if factor == 1 else scale_dataset(path, factor, os.path.join(tmp, f"laureate_{factor}x.json"))
+            entry = {"laureates": sum(1 for _ in iter_laureates(data_path))}
+            if backend == "columnar":
+                entry["load"] = {"columnar": measure(lambda: ColumnarBackend(data_path).load(), max(1, repeat // 10))}
+                entry["queries"] = bench_api(
+                    lambda cache: NobelAPI(backend=ColumnarBackend(data_path), cache=cache), repeat)
+            else:
+                db = _database(backend, uri)
+                entry["load"] = bench_load(db, data_path, max(1, repeat // 10))
+                load_laureates(db, data_path)
+                # mongomock cannot $merge into prize_facts
+                use_facts = backend == "mongo"
+                entry["queries"] = bench_api(
+                    lambda cache: NobelAPI(db, data_path, use_facts=use_facts, cache=cache), repeat)
+                entry["pipelines"] = bench_pipelines(db.collection, repeat, explain=backend == "mongo")
+                db.client.drop_database(BENCH_DATABASE)
+            report["scales"][f"{factor}x"] = entry
+    return report
+
+
+def compare(old, new, threshold=1.2):
+    """
+    Lists the timings that got slower between two reports
+    :param old: earlier report
+    :param new: later report
+    :param threshold: ratio of p50 latencies above which a timing counts as a regression, defaults to 1.2
+    :return: list of (path, old p50, new p50) tuples
+    """
+    regressions = []
+
+    def walk(a, b, path):
+        if isinstance(a, dict) and isinstance(b, dict):
+            if "p50" in a and "p50" in b:
+                if a["p50"] > 0 and b["p50"] / a["p50"] > threshold:
+                    regressions.append(("/".join(path), a["p50"], b["p50"]))
+                return
+            for key in a.keys() & b.keys():
+                walk(a[key], b[key], path + [key])
+
+    walk(old.get("scales", {}), new.get("scales", {}), [])
+    return sorted(regressions)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the NobelAPI load path and queries")
+    parser.add_argument("--backend", choices=["mongo", "mongomock", "columnar"], default="mongo")
+    parser.add_argument("--uri", default=None, help="mongodb uri, defaults to localhost")
+    parser.add_argument("--path", default="laureate.json")
+    parser.add_argument("--scale", type=int, nargs="+", default=[1], help="dataset sizes as multiples of --path")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", default=None, help="earlier results file to check for regressions")
+    args = parser.parse_args(argv)
+
+    report = run(args.backend, args.path, args.scale, args.repeat, args.uri)
+    with open(args.output, "w") as out:
+        json.dump(report, out, indent=2)
+
+    for scale, entry in report["scales"].items():
+        print(f"{scale} ({entry['laureates']} laureates)")
+        for section in ("load", "queries", "pipelines"):
+            for name, result in entry.get(section, {}).items():
+                for mode, stats in (result.items() if section == "queries" else [("", result)]):
+                    print(f"  {section:<9} {name + (':' + mode if mode else ''):<42} "
+                          f"p50 {stats['p50']:9.3f} ms  p99 {stats['p99']:9.3f} ms  peak {stats['peak_kb']:9.1f} KB")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report)
+        for path, before, after in regressions:
+            print(f"slower: {path} {before:.3f} ms -> {after:.3f} ms")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,200 @@
+"""
+Result cache for NobelAPI queries. Entries are keyed by the method name, its arguments and the dataset
+version written by the loader, so reloading a changed laureate.json makes every older entry unreachable.
+"""
+import functools
+import hashlib
+import inspect
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryBackend:
+    """
+    In-process LRU cache with a time to live
+    """
+
+    def __init__(self, maxsize=256, ttl=300):
+        """
+        :param maxsize: the most entries kept before the least recently used is evicted, defaults to 256
+        :param ttl: seconds an entry stays valid, defaults to 300
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        :param key: cache key
+        :return: the stored bytes, or None on a miss or an expired entry
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """
+        :param key: cache key
+        :param value: bytes to store
+        :return: None
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskBackend:
+    """
+    LRU cache with a time to live kept in a sqlite file, so several processes can share it
+    """
+
+    def __init__(self, path="nobel_cache.sqlite", maxsize=1024, ttl=300):
+        """
+        :param path: path to the sqlite file, defaults to "nobel_cache.sqlite"
+        :param maxsize: the most entries kept before the least recently used are evicted, defaults to 1024
+        :param ttl: seconds an entry stays valid, defaults to 300
+        """
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS cache "
+                         "(key TEXT PRIMARY KEY, value BLOB, expires REAL, used REAL)")
+
+    def _connection(self):
+        # sqlite connections cannot be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=10)
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        with self._connection() as conn:
+            row = conn.execute("SELECT value FROM cache WHERE key = ? AND expires > ?", (key, now)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE cache SET used = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def set(self, key, value):
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)", (key, value, now + self.ttl, now))
+            conn.execute("DELETE FROM cache WHERE expires <= ?", (now,))
+            conn.execute("DELETE FROM cache WHERE key NOT IN "
+                         "(SELECT key FROM cache ORDER BY used DESC LIMIT ?)", (self.maxsize,))
+
+    def clear(self):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM cache")
+
+
+class ResultCache:
+    """
+    Stores pickled query results in a backend, so callers always get their own copy of a result
+    """
+
+    def __init__(self, backend=None):
+        """
+        :param backend: MemoryBackend, DiskBackend or any object with get, set and clear, defaults to a
+                        MemoryBackend
+        """
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(name, arguments, version):
+        """
+        :param name: method name
+        :param arguments: dictionary of the method's arguments
+        :param version: dataset version stamp
+        :return: cache key string
+        """
+        encoded = repr((name, sorted(arguments.items()), version)).encode("utf-8")
+        return f"{name}:{hashlib.sha1(encoded).hexdigest()}"
+
+    def get(self, name, arguments, version):
+        """
+        :param name: method name
+        :param arguments: dictionary of the method's arguments
+        :param version: dataset version stamp
+        :return: (True, result) on a hit, (False, None) on a miss
+        """
+        stored = self.backend.get(self.key(name, arguments, version))
+        if stored is None:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, pickle.loads(stored)
+
+    def set(self, name, arguments, version, result):
+        """
+        :param name: method name
+        :param arguments: dictionary of the method's arguments
+        :param version: dataset version stamp
+        :param result: the query result
+        :return: None
+        """
+        self.backend.set(self.key(name, arguments, version), pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def get_or_compute(self, name, arguments, version, compute):
+        """
+        Returns the cached result of a query, running it on a miss
+        :param name: method name
+        :param arguments: dictionary of the method's arguments
+        :param version: dataset version stamp
+        :param compute: function with no arguments that runs the query
+        :return: the query result
+        """
+        hit, result = self.get(name, arguments, version)
+        if not hit:
+            result = compute()
+            self.set(name, arguments, version, result)
+        return result
+
+    def clear(self):
+        self.backend.clear()
+
+
+# arguments that tune how a result is fetched without changing it, so they are left out of cache keys
+UNKEYED_ARGUMENTS = ("batch_size",)
+
+
+def cached(method):
+    """
+    Decorator for NobelAPI query methods that serves results from self.cache, if there is one,
+    keyed by self.dataset_version()
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.cache is None:
+            return method(self, *args, **kwargs)
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        arguments = {k: v for k, v in list(bound.arguments.items())[1:] if k not in UNKEYED_ARGUMENTS}
+        return self.cache.get_or_compute(method.__name__, arguments, self.dataset_version(),
+                                         lambda: method(self, *args, **kwargs))
+
+    return wrapper
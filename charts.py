@@ -0,0 +1,279 @@
+"""
+Headless chart rendering. Every chart is drawn by a function on a matplotlib Figure of its own, never on
+pyplot's global figure, so charts can be rendered from threads or a process pool with the Agg backend and
+written to PNG or SVG files or in-memory bytes. show() draws the same chart in a pyplot window.
+
+ReportRenderer renders many charts across a process pool. Rendered charts are kept in a content
+addressed ChartCache keyed by the chart, its data and its options, so a chart whose query result has
+not changed is read back instead of drawn again.
+
+    renderer = ReportRenderer("chart_cache")
+    renderer.render_many([ChartJob("age_histogram", api.ages_of_laureates(), "ages.png"),
+                          ChartJob("category_winners", api.category_winner_counts(), "winners.svg")])
+"""
+import hashlib
+import io
+import os
+import pickle
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# bump when a drawing function changes, so cached charts drawn by the old one are not served
+CHART_VERSION = 2
+
+FORMATS = ("png", "svg")
+
+# above this many prizes age_over_time draws a density grid instead of one marker per prize
+SCATTER_LIMIT = 20000
+
+ChartJob = namedtuple("ChartJob", ["chart", "data", "path", "format", "options"], defaults=(None, None, None))
+
+
+def draw_age_histogram(fig, data, title="Nobel Prize Laureates by Age"):
+    """
+    :param fig: matplotlib Figure
+    :param data: dictionary of age buckets and counts from ages_of_laureates
+    :param title: chart title
+    :return: None
+    """
+    ax = fig.subplots()
+    ax.bar([str(label) for label in data], list(data.values()))
+    ax.tick_params(axis="x", labelrotation=45)
+    ax.set_title(title)
+
+
+def draw_category_winners(fig, data, title="Nobel Prize Winners per Prize by Category"):
+    """
+    :param fig: matplotlib Figure
+    :param data: list of documents from category_winner_counts
+    :param title: chart title
+    :return: None
+    """
+    ax = fig.subplots()
+    categories = [doc["_id"] for doc in data]
+    x = np.arange(len(categories))
+    bottom = np.zeros(len(categories))
+    for field, label, color in (("one_winner", "1 Winner", "steelblue"), ("two_winners", "2 Winners", "orange"),
+                                ("three_winners", "3 Winners", "green"),
+                                ("four_or_more_winners", "4+ Winners", "purple")):
+        counts = np.array([doc[field] for doc in data])
+        ax.bar(x, counts, label=label, color=color, bottom=bottom)
+        bottom += counts
+    ax.set_xticks(x, categories, rotation=45, ha="right")
+    ax.set_xlabel("Category")
+    ax.set_ylabel("Number of Prizes")
+    ax.set_title(title)
+    ax.legend()
+
+
+def draw_age_over_time(fig, data, title="Nobel Prize Winner Age Over Time", mode="auto", gridsize=60,
+                       scatter_limit=SCATTER_LIMIT):
+    """
+    :param fig: matplotlib Figure
+    :param data: (prize years, ages) arrays, or an ages.AgeDensity
+    :param title: chart title
+    :param mode: "scatter" for one marker per prize, "hexbin" for hexagonal bins, "density" for the
+                 AgeDensity grid, or "auto" (the default) for a scatter up to scatter_limit prizes and a
+                 density grid above it
+    :param gridsize: number of hexagons across the x axis in hexbin mode, defaults to 60
+    :param scatter_limit: the most prizes auto mode draws as a scatter, defaults to SCATTER_LIMIT
+    :return: None
+    """
+    from ages import AgeDensity, linear_fit
+
+    ax = fig.subplots()
+    if not isinstance(data, AgeDensity):
+        years, ages = (np.asarray(values) for values in data)
+        if mode == "auto":
+            mode = "scatter" if len(years) <= scatter_limit else "density"
+        if mode == "density":
+            data = AgeDensity().update(years, ages)
+    elif mode in ("scatter", "hexbin"):
+        raise ValueError(f"{mode} mode needs the (years, ages) arrays, not an AgeDensity")
+
+    if isinstance(data, AgeDensity):
+        # only the grid is drawn, so the cost does not depend on the number of prizes
+        counts = np.ma.masked_equal(data.counts.T, 0)
+        mesh = ax.pcolormesh(data.year_edges, data.age_edges, counts, cmap="Blues")
+        fig.colorbar(mesh, ax=ax, label="Prizes")
+        slope, intercept, r = data.regression.fit()
+        ends = data.year_range()
+        if ends is not None:
+            ends = np.array(ends, dtype=np.float64)
+            ax.set_xlim(*ends)
+    else:
+        if mode == "hexbin":
+            hexes = ax.hexbin(years, ages, gridsize=gridsize, mincnt=1, cmap="Blues")
+            fig.colorbar(hexes, ax=ax, label="Prizes")
+        else:
+            ax.scatter(years, ages, alpha=0.4, color="steelblue", label="Winners")
+        slope, intercept, r = linear_fit(years, ages)
+        ends = np.array([years.min(), years.max()]) if len(years) else None
+    if ends is not None:
+        ax.plot(ends, slope * ends + intercept, color="red", label=f"Best fit (r={r:.2f})")
+    ax.set_xlabel("Year")
+    ax.set_ylabel("Age at Time of Winning")
+    ax.set_title(title)
+    ax.legend()
+
+
+# name: (drawing function, figure size in inches)
+CHARTS = {
+    "age_histogram": (draw_age_histogram, (8, 5)),
+    "category_winners": (draw_category_winners, (14, 6)),
+    "age_over_time": (draw_age_over_time, (14, 6)),
+}
+
+
+def _figure(chart, data, options):
+    from matplotlib.figure import Figure
+
+    draw, size = CHARTS[chart]
+    fig = Figure(figsize=size, layout="tight")
+    draw(fig, data, **options)
+    return fig
+
+
+def render(chart, data, format="png", dpi=100, **options):
+    """
+    Draws a chart without pyplot
+    :param chart: name of the chart in CHARTS
+    :param data: the query result the chart is drawn from
+    :param format: "png" or "svg", defaults to "png"
+    :param dpi: resolution of png output, defaults to 100
+    :param options: keyword arguments of the drawing function, such as title
+    :return: the image as bytes
+    """
+    if format not in FORMATS:
+        raise ValueError(f"format must be one of {FORMATS}, not {format!r}")
+    buffer = io.BytesIO()
+    # a bare Figure saves through the Agg canvas, whatever pyplot's backend is
+    _figure(chart, data, options).savefig(buffer, format=format, dpi=dpi)
+    return buffer.getvalue()
+
+
+def show(chart, data, **options):
+    """
+    Draws a chart in a pyplot window
+    :param chart: name of the chart in CHARTS
+    :param data: the query result the chart is drawn from
+    :param options: keyword arguments of the drawing function
+    :return: None
+    """
+    import matplotlib.pyplot as plt
+
+    draw, size = CHARTS[chart]
+    fig = plt.figure(figsize=size, layout="tight")
+    draw(fig, data, **options)
+    plt.show()
+
+
+def chart_key(chart, data, format="png", dpi=100, **options):
+    """
+    :return: sha256 hex digest of everything that decides how a chart looks
+    """
+    if isinstance(data, tuple):
+        # the arrays of age_over_time hash by their contents rather than by how they were built
+        data = tuple(np.ascontiguousarray(values).tobytes() for values in data)
+    encoded = pickle.dumps((CHART_VERSION, chart, data, format, dpi, sorted(options.items())), protocol=4)
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class ChartCache:
+    """
+    Rendered charts stored in a directory under their chart_key
+    """
+
+    def __init__(self, directory="chart_cache"):
+        """
+        :param directory: directory of the cached images, created if needed, defaults to "chart_cache"
+        """
+        self.directory = directory
+
+    def _path(self, key, format):
+        return os.path.join(self.directory, key[:2], f"{key}.{format}")
+
+    def get(self, key, format):
+        """
+        :return: the cached image bytes, or None on a miss
+        """
+        try:
+            with open(self._path(key, format), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key, format, image):
+        """
+        Stores an image; the file is written under a temporary name first so readers never see half of it
+        :return: None
+        """
+        path = self._path(key, format)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(image)
+        os.replace(temporary, path)
+
+
+def _render_job(chart, data, format, dpi, options):
+    return render(chart, data, format, dpi, **options)
+
+
+class ReportRenderer:
+
+    def __init__(self, cache=None, processes=None, dpi=100, mp_context=None):
+        """
+        :param cache: ChartCache, or a directory for one, defaults to no cache
+        :param processes: number of worker processes, defaults to the number of CPUs; 0 renders in this process
+        :param dpi: resolution of png output, defaults to 100
+        :param mp_context: multiprocessing context of the pool, defaults to the platform's
+        """
+        self.cache = ChartCache(cache) if isinstance(cache, str) else cache
+        self.processes = processes
+        self.dpi = dpi
+        self.mp_context = mp_context
+
+    def render_many(self, jobs):
+        """
+        Renders charts in parallel, reading the unchanged ones from the cache
+        :param jobs: iterable of ChartJob; a job without a path returns its image as bytes, and its format
+                     defaults to the extension of path, or png
+        :return: list with the path, or the bytes, of every job in order
+        """
+        jobs = list(jobs)
+        keys, formats, images, pending = [], [], [None] * len(jobs), []
+        for i, job in enumerate(jobs):
+            format = job.format or (os.path.splitext(job.path)[1][1:].lower() if job.path else "") or "png"
+            key = chart_key(job.chart, job.data, format, self.dpi, **(job.options or {}))
+            keys.append(key)
+            formats.append(format)
+            images[i] = self.cache.get(key, format) if self.cache is not None else None
+            if images[i] is None:
+                pending.append(i)
+
+        arguments = [(jobs[i].chart, jobs[i].data, formats[i], self.dpi, jobs[i].options or {}) for i in pending]
+        if self.processes == 0 or len(pending) < 2:
+            rendered = [_render_job(*args) for args in arguments]
+        else:
+            with ProcessPoolExecutor(self.processes, mp_context=self.mp_context) as pool:
+                rendered = list(pool.map(_render_job, *zip(*arguments), chunksize=max(1, len(pending) // 32)))
+        for i, image in zip(pending, rendered):
+            images[i] = image
+            if self.cache is not None:
+                self.cache.set(keys[i], formats[i], image)
+
+        results = []
+        for job, image in zip(jobs, images):
+            if job.path is None:
+                results.append(image)
+                continue
+            directory = os.path.dirname(job.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(job.path, "wb") as f:
+                f.write(image)
+            results.append(job.path)
+        return results
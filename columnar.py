@@ -0,0 +1,273 @@
+"""
+In-memory columnar backend for NobelAPI. laureate.json is loaded into NumPy arrays once and every query
+is answered with vectorized group-bys, so no MongoDB server is needed.
+
+Laureate columns (one entry per laureate):
+    country, gender: int codes into the countries and genders tables, -1 when the field is missing
+    birth_year: int, -1 when the birth date is missing or "0000-00-00"
+    prize_offsets: the prizes of laureate i are rows prize_offsets[i]:prize_offsets[i + 1]
+Prize columns (one entry per laureate-prize):
+    laureate: index of the laureate
+    year, share: int
+    category: int code into the categories table
+Prize group columns (one entry per (year, category) prize, like the prize_groups collection):
+    group_year, group_category: the year and category code of the group
+    group_winners: number of winners
+    group_uneven: True when the winners got different shares
+    prize_group: index of the group of each prize row
+"""
+import numpy as np
+
+from ages import AgeTable
+from backends import winner_counts_by_category
+from loader import file_checksum, iter_laureates
+from motivation_search import MotivationIndex
+from pipelines import select_fields
+
+
+def _codes(values):
+    """
+    Turns a list of strings (None for missing) into int codes and the sorted table they index
+    """
+    table = sorted({v for v in values if v is not None})
+    lookup = {v: i for i, v in enumerate(table)}
+    return np.array([lookup.get(v, -1) for v in values], dtype=np.int32), table
+
+
+def _ranked(keys, counts, limit=None):
+    """
+    Orders keys by count from most to least, keeping the original key order among ties
+    """
+    order = np.argsort(-counts, kind="stable")
+    if limit is not None:
+        order = order[:limit]
+    return [(keys[i], int(counts[i])) for i in order]
+
+
+class ColumnarBackend:
+
+    def __init__(self, path="laureate.json"):
+        """
+        Nothing is read until the first query
+        :param path: laureate.json or laureates_array.json
+        """
+        self.path = path
+        self._loaded = False
+
+    def load(self):
+        """
+        Reads the laureate file into columns
+        :return: self
+        """
+        laureates = []
+        countries, genders, birth_years, offsets = [], [], [], [0]
+        prize_laureate, years, categories, shares = [], [], [], []
+        for i, laureate in enumerate(iter_laureates(self.path)):
+            laureates.append(laureate)
+            countries.append(laureate.get("bornCountry"))
+            genders.append(laureate.get("gender"))
+            born = laureate.get("born", "0000-00-00")
+            birth_years.append(-1 if born == "0000-00-00" else int(born[:4]))
+            for prize in laureate.get("prizes", []):
+                prize_laureate.append(i)
+                years.append(int(prize["year"][:4]))
+                categories.append(prize["category"])
+                shares.append(int(prize["share"]))
+            offsets.append(len(years))
+
+        self.laureates = laureates
+        self.country, self.countries = _codes(countries)
+        self.gender, self.genders = _codes(genders)
+        self.birth_year = np.array(birth_years, dtype=np.int32)
+        self.prize_offsets = np.array(offsets, dtype=np.int64)
+        self.prize_laureate = np.array(prize_laureate, dtype=np.int64)
+        self.year = np.array(years, dtype=np.int32)
+        self.category, self.categories = _codes(categories)
+        self.share = np.array(shares, dtype=np.int32)
+        self._group_prizes()
+        self.version = file_checksum(self.path)
+        self._ages = None
+        self._motivations = None
+        self._loaded = True
+        return self
+
+    def _group_prizes(self):
+        n_categories = len(self.categories)
+        keys, self.prize_group, self.group_winners = np.unique(
+            self.year.astype(np.int64) * n_categories + self.category, return_inverse=True, return_counts=True)
+        self.group_year = (keys // n_categories).astype(np.int32)
+        self.group_category = (keys % n_categories).astype(np.int32)
+        low = np.full(len(keys), np.iinfo(np.int32).max, dtype=np.int32)
+        high = np.zeros(len(keys), dtype=np.int32)
+        np.minimum.at(low, self.prize_group, self.share)
+        np.maximum.at(high, self.prize_group, self.share)
+        self.group_uneven = low != high
+
+    def _columns(self):
+        if not self._loaded:
+            self.load()
+        return self
+
+    def close(self):
+        return None
+
+    def dataset_version(self):
+        """
+        :return: checksum of the laureate file
+        """
+        return self._columns().version
+
+    def _aged_prizes(self):
+        """
+        :return: indexes of the prize rows with a known birth year won by a person, and their ages
+        """
+        cols = self._columns()
+        org = cols.genders.index("org") if "org" in cols.genders else -2
+        laureate = cols.prize_laureate
+        rows = np.flatnonzero((cols.birth_year[laureate] >= 0) & (cols.gender[laureate] != org))
+        return rows, cols.year[rows] - cols.birth_year[laureate[rows]]
+
+    def top_countries(self, limit=10):
+        cols = self._columns()
+        counts = np.bincount(cols.country[cols.country >= 0], minlength=len(cols.countries))
+        return dict(_ranked(cols.countries, counts, limit))
+
+    def top_categories(self):
+        cols = self._columns()
+        counts = np.bincount(cols.category, minlength=len(cols.categories))
+        return dict(_ranked(cols.categories, counts))
+
+    def most_prizes_per_year(self, limit=10):
+        years, counts = np.unique(self._columns().year, return_counts=True)
+        return {str(year): count for year, count in _ranked(years, counts, limit)}
+
+    def laureate_gender(self):
+        cols = self._columns()
+        counts = np.bincount(cols.gender + 1, minlength=len(cols.genders) + 1)
+        keys = [None] + cols.genders
+        return {keys[i]: int(count) for i, count in enumerate(counts) if count}
+
+    def laureate_ages_yearly(self, batch_size=None):
+        return list(self.iter_laureate_ages_yearly())
+
+    def iter_laureate_ages_yearly(self, batch_size=None):
+        rows, ages = self._aged_prizes()
+        years = self.year[rows]
+        return ({"year": int(year), "age": int(age)} for year, age in zip(years, ages))
+
+    def age_table(self):
+        """
+        :return: ages.AgeTable of the loaded laureates
+        """
+        cols = self._columns()
+        if cols._ages is None:
+            cols._ages = AgeTable.from_laureates(cols.laureates)
+        return cols._ages
+
+    def motivation_index(self):
+        """
+        :return: motivation_search.MotivationIndex of the loaded laureates
+        """
+        cols = self._columns()
+        if cols._motivations is None:
+            cols._motivations = MotivationIndex.from_laureates(cols.laureates)
+        return cols._motivations
+
+    def search_motivations(self, query, limit=10, category=None):
+        return self.motivation_index().search(query, limit, category)
+
+    def ages_of_laureates(self):
+        return self.age_table().buckets()
+
+    def minor_winners(self, fields=None, batch_size=None):
+        return list(self.iter_minor_winners(fields))
+
+    def iter_minor_winners(self, fields=None, batch_size=None):
+        rows, ages = self._aged_prizes()
+        minors = ages < 18
+        for row, age in zip(rows[minors], ages[minors]):
+            laureate_index = self.prize_laureate[row]
+            laureate = select_fields(self.laureates[laureate_index], fields)
+            if "prizes" in laureate:
+                laureate = {**laureate, "prizes": laureate["prizes"][row - self.prize_offsets[laureate_index]]}
+            yield {**laureate, "age": int(age)}
+
+    def prize_table(self):
+        """
+        The rows of the prize_table pipeline as columns, for export.prize_table
+        :return: dictionary of laureate_id, gender, country, category, year, birth_year and share arrays,
+                 with "" for a missing string and -1 for a missing int
+        """
+        cols = self._columns()
+        laureate = cols.prize_laureate
+        # code -1 (missing) picks the trailing ""
+        return {
+            "laureate_id": np.array([l.get("id", "") for l in cols.laureates], dtype=str)[laureate],
+            "gender": np.array(cols.genders + [""], dtype=str)[cols.gender[laureate]],
+            "country": np.array(cols.countries + [""], dtype=str)[cols.country[laureate]],
+            "category": np.array(cols.categories + [""], dtype=str)[cols.category],
+            "year": cols.year.astype(np.int64),
+            "birth_year": cols.birth_year[laureate].astype(np.int64),
+            "share": cols.share.astype(np.int64),
+        }
+
+    def category_introduction_year(self):
+        cols = self._columns()
+        first = np.full(len(cols.categories), np.iinfo(np.int32).max, dtype=np.int32)
+        np.minimum.at(first, cols.category, cols.year)
+        order = np.argsort(first, kind="stable")
+        return {cols.categories[i]: str(first[i]) for i in order}
+
+    def top_category_per_country(self, limit=10):
+        cols = self._columns()
+        country = cols.country[cols.prize_laureate]
+        known = country >= 0
+        n_categories = len(cols.categories)
+        counts = np.bincount(country[known] * n_categories + cols.category[known],
+                             minlength=len(cols.countries) * n_categories).reshape(-1, n_categories)
+        top = counts.argmax(axis=1)
+        best = counts[np.arange(len(top)), top]
+        present = np.flatnonzero(best > 0)
+        order = present[np.argsort(-best[present], kind="stable")][:limit]
+        return {cols.countries[i]: {"category": cols.categories[top[i]], "count": int(best[i])} for i in order}
+
+    def category_winner_counts(self):
+        cols = self._columns()
+        results = []
+        for code, category in enumerate(cols.categories):
+            in_category = cols.group_winners[cols.group_category == code]
+            results.append({
+                "_id": category,
+                "one_winner": int((in_category == 1).sum()),
+                "two_winners": int((in_category == 2).sum()),
+                "three_winners": int((in_category == 3).sum()),
+                "four_or_more_winners": int((in_category >= 4).sum())
+            })
+        return results
+
+    def avg_winners_per_category(self):
+        return winner_counts_by_category(self.category_winner_counts())
+
+    def solo_vs_collaborative_prizes(self):
+        cols = self._columns()
+        decade = cols.group_year - cols.group_year % 10
+        solo = cols.group_winners == 1
+        keys, counts = np.unique(decade.astype(np.int64) * 2 + solo, return_counts=True)
+        # sorted by decade, then "collaborative" before "solo" like the pipeline
+        return {(int(key // 2), "solo" if key % 2 else "collaborative"): int(count)
+                for key, count in zip(keys, counts)}
+
+    def categories_split(self):
+        cols = self._columns()
+        counts = np.bincount(cols.group_category[cols.group_uneven], minlength=len(cols.categories))
+        return {category: count for category, count in _ranked(cols.categories, counts) if count}
+
+    def country_decades_winners(self):
+        cols = self._columns()
+        country = cols.country[cols.prize_laureate]
+        known = country >= 0
+        decade = cols.year[known] - cols.year[known] % 10
+        n_countries = len(cols.countries)
+        keys, counts = np.unique(decade.astype(np.int64) * n_countries + country[known], return_counts=True)
+        return {(cols.countries[key % n_countries], int(key // n_countries)): int(count)
+                for key, count in zip(keys, counts)}
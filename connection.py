@@ -0,0 +1,179 @@
+"""
+Shared MongoClients. A MongoClient is a connection pool, so every NobelAPI, backend and script in a process
+borrows the same client for a given uri and options instead of opening its own pool, and the client is
+closed when the last borrower releases it.
+
+Clients are not fork-safe: a client created before a fork must not be used by the child, whose copies of
+the parent's sockets would be shared with it. After a fork the child forgets every inherited client without
+closing it and opens new ones on first use, so gunicorn --preload workers and multiprocessing pools each
+get their own pool.
+
+    with mongo_client(readPreference="secondaryPreferred") as client:
+        api = NobelAPI(client.prize)
+
+The uri defaults to the NOBEL_MONGO_URI environment variable, then to localhost.
+"""
+import atexit
+import os
+import threading
+from contextlib import contextmanager
+from importlib.util import find_spec
+
+URI_ENVIRONMENT = "NOBEL_MONGO_URI"
+
+# pymongo's defaults are 100 connections and no socket timeout; a pre-fork server multiplies the pool by
+# its worker count, so keep it small and let maxConnecting smooth out the connection storm at startup
+DEFAULT_OPTIONS = {
+    "maxPoolSize": 20,
+    "minPoolSize": 0,
+    "maxConnecting": 2,
+    "maxIdleTimeMS": 60000,
+    "connectTimeoutMS": 5000,
+    "serverSelectionTimeoutMS": 10000,
+    "socketTimeoutMS": 60000,
+    "waitQueueTimeoutMS": 10000,
+    "retryReads": True,
+    "appname": "nobel-prize",
+}
+
+
+def available_compressors():
+    """
+    :return: wire compressors supported in this environment, best first; zstd and snappy need the
+             zstandard and python-snappy packages, zlib is always available
+    """
+    compressors = [name for name, module in (("zstd", "zstandard"), ("snappy", "snappy")) if find_spec(module)]
+    return compressors + ["zlib"]
+
+
+def client_options(**options):
+    """
+    :param options: MongoClient keyword arguments overriding DEFAULT_OPTIONS, e.g.
+                    readPreference="secondaryPreferred" for analytics reads
+    :return: dictionary of MongoClient keyword arguments
+    """
+    result = dict(DEFAULT_OPTIONS, compressors=",".join(available_compressors()))
+    result.update(options)
+    return result
+
+
+def default_uri(uri=None):
+    """
+    :param uri: mongodb uri
+    :return: uri, or the NOBEL_MONGO_URI environment variable, or None for localhost
+    """
+    return uri or os.environ.get(URI_ENVIRONMENT) or None
+
+
+class ClientRegistry:
+    """
+    Reference counted MongoClients of the current process, one per uri and options
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._pid = os.getpid()
+
+    def _forget_inherited(self):
+        # the sockets belong to the parent, so the clients are dropped rather than closed
+        if self._pid != os.getpid():
+            self._lock = threading.Lock()
+            self._clients = {}
+            self._pid = os.getpid()
+
+    def acquire(self, uri=None, **options):
+        """
+        :param uri: mongodb uri, defaults to NOBEL_MONGO_URI or localhost
+        :param options: MongoClient keyword arguments overriding DEFAULT_OPTIONS
+        :return: the shared MongoClient for the uri and options; pass it to release when done
+        """
+        from pymongo import MongoClient
+
+        self._forget_inherited()
+        uri = default_uri(uri)
+        options = client_options(**options)
+        key = (uri, tuple(sorted((name, repr(value)) for name, value in options.items())))
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is None:
+                entry = self._clients[key] = [MongoClient(uri, **options), 0]
+            entry[1] += 1
+            return entry[0]
+
+    def release(self, client):
+        """
+        Gives back a client from acquire, closing it once nothing else holds it
+        :param client: MongoClient
+        :return: None
+        """
+        self._forget_inherited()
+        with self._lock:
+            for key, entry in self._clients.items():
+                if entry[0] is client:
+                    entry[1] -= 1
+                    if entry[1] <= 0:
+                        del self._clients[key]
+                        client.close()
+                    return
+
+    def close_all(self):
+        """
+        Closes every client of this process, whoever holds it
+        :return: None
+        """
+        self._forget_inherited()
+        with self._lock:
+            clients, self._clients = self._clients, {}
+        for client, _ in clients.values():
+            client.close()
+
+    def __len__(self):
+        return len(self._clients)
+
+
+CLIENTS = ClientRegistry()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=CLIENTS._forget_inherited)
+atexit.register(CLIENTS.close_all)
+
+
+def acquire_client(uri=None, **options):
+    """
+    :param uri: mongodb uri, defaults to NOBEL_MONGO_URI or localhost
+    :param options: MongoClient keyword arguments overriding DEFAULT_OPTIONS
+    :return: the process's shared MongoClient for the uri and options
+    """
+    return CLIENTS.acquire(uri, **options)
+
+
+def release_client(client):
+    """
+    :param client: MongoClient from acquire_client
+    :return: None
+    """
+    CLIENTS.release(client)
+
+
+def close_clients():
+    """
+    Closes every shared client, e.g. from a gunicorn worker_exit hook
+    :return: None
+    """
+    CLIENTS.close_all()
+
+
+@contextmanager
+def mongo_client(uri=None, **options):
+    """
+    Borrows the shared client for the duration of a with block
+    :param uri: mongodb uri, defaults to NOBEL_MONGO_URI or localhost
+    :param options: MongoClient keyword arguments overriding DEFAULT_OPTIONS
+    :return: MongoClient
+    """
+    client = acquire_client(uri, **options)
+    try:
+        yield client
+    finally:
+        release_client(client)
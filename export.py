@@ -0,0 +1,238 @@
+"""
+Exports query results and the unwound prize table as column files that can be loaded without MongoDB or
+parsing json:
+    .arrow / .feather / .ipc  Arrow IPC file, read back memory-mapped and zero-copy
+    .parquet                   Parquet file, smaller on disk but decoded when read
+    any other path             a directory of one .npy file per column, read back with np.load(mmap_mode="r")
+Arrow and Parquet need pyarrow. Columns are NumPy arrays; strings are stored as fixed width unicode so
+every column can be memory-mapped, with "" for a missing string and -1 for a missing int.
+
+    python export.py prizes prizes.arrow
+    python export.py country_decades_winners decades.parquet --backend mongo
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+import pipelines
+from columnar import ColumnarBackend
+
+PRIZE_COLUMNS = ("laureate_id", "gender", "country", "category", "year", "birth_year", "share")
+PRIZE_INT_COLUMNS = ("year", "birth_year", "share")
+
+ARROW_EXTENSIONS = (".arrow", ".feather", ".ipc")
+MANIFEST = "columns.json"
+
+# names of the key and value columns of the dictionaries returned by NobelAPI and nobel_prize_collection.py
+RESULT_COLUMNS = {
+    "top_countries": ("country", "count"),
+    "top_categories": ("category", "count"),
+    "most_prizes_per_year": ("year", "count"),
+    "laureate_gender": ("gender", "count"),
+    "ages_of_laureates": ("age", "count"),
+    "category_introduction_year": ("category", "first_year"),
+    "top_category_per_country": ("country", "category", "count"),
+    "country_decades_winners": ("country", "decade", "count"),
+    "solo_vs_collaborative_prizes": ("decade", "type", "count"),
+    "avg_winners_per_category": ("category", "one_winner", "two_winners", "three_winners", "four_or_more_winners"),
+    "categories_split": ("category", "uneven_count"),
+}
+
+
+def _column(values):
+    """
+    Turns a list of values into a NumPy array, using "" for missing strings and -1 for missing ints
+    """
+    present = [v for v in values if v is not None]
+    if present and all(isinstance(v, str) for v in present):
+        return np.array(["" if v is None else v for v in values], dtype=str)
+    if present and all(isinstance(v, (int, np.integer)) and not isinstance(v, bool) for v in present):
+        return np.array([-1 if v is None else v for v in values], dtype=np.int64)
+    if present and all(isinstance(v, (int, float, np.number)) for v in present):
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    return np.array(values, dtype=object) if any(isinstance(v, (list, dict)) for v in values) else np.array(values)
+
+
+def _flatten(document, prefix=""):
+    for key, value in document.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            # grouped keys like {"_id": {"country": ..., "decade": ...}} become plain columns
+            yield from _flatten(value, "" if name == "_id" else f"{name}.")
+        else:
+            yield name, value
+
+
+def to_columns(rows):
+    """
+    Turns result documents into columns, flattening nested documents into dotted column names and the
+    fields of a compound _id into plain ones
+    :param rows: iterable of dictionaries, such as the output of a pipeline
+    :return: dictionary of column names and NumPy arrays
+    """
+    flat = [dict(_flatten(row)) for row in rows]
+    names = list(dict.fromkeys(name for row in flat for name in row))
+    return {name: _column([row.get(name) for row in flat]) for name in names}
+
+
+def result_columns(result, names=None):
+    """
+    Turns a query result into columns
+    :param result: a list of documents, or a dictionary whose keys may be tuples and whose values may be
+                   dictionaries, as returned by the NobelAPI and nobel_prize_collection.py functions
+    :param names: column names, key parts first, defaults to "key", "key_1", ... and "value" or the names
+                  of the value dictionary
+    :return: dictionary of column names and NumPy arrays
+    """
+    if isinstance(result, list):
+        if names is None and result and isinstance(result[0], tuple):
+            names = [f"column_{i}" for i in range(len(result[0]))]
+        if result and isinstance(result[0], tuple):
+            return {name: _column(list(values)) for name, values in zip(names, zip(*result))}
+        return to_columns(result)
+
+    keys = [key if isinstance(key, tuple) else (key,) for key in result]
+    values = list(result.values())
+    key_width = max((len(key) for key in keys), default=1)
+    value_names = list(values[0]) if values and isinstance(values[0], dict) else ["value"]
+    if names is None:
+        names = ["key"] + [f"key_{i}" for i in range(1, key_width)] + value_names
+    columns = {name: _column([key[i] for key in keys]) for i, name in enumerate(names[:key_width])}
+    if value_names == ["value"]:
+        columns[names[key_width]] = _column(values)
+    else:
+        for name, field in zip(names[key_width:], value_names):
+            columns[name] = _column([value[field] for value in values])
+    return columns
+
+
+def query_columns(collection, name, registry=pipelines.PIPELINES, **params):
+    """
+    Runs a registered pipeline and returns its output as columns
+    :param collection: the collection to aggregate
+    :param name: name of the pipeline
+    :param registry: pipelines.PIPELINES, or FACT_PIPELINES with the prize_facts collection
+    :param params: keyword arguments of the pipeline builder
+    :return: dictionary of column names and NumPy arrays
+    """
+    return to_columns(registry.stream(collection, name, **params))
+
+
+def prize_table(source, chunk_size=100000, registry=pipelines.PIPELINES):
+    """
+    Builds the unwound table of every laureate-prize with the columns in PRIZE_COLUMNS
+    :param source: a ColumnarBackend, or the collection the prize_table pipeline runs against
+    :param chunk_size: rows converted to arrays at a time when reading a collection, defaults to 100000
+    :param registry: registry of the prize_table pipeline, FACT_PIPELINES for the prize_facts collection
+    :return: dictionary of column names and NumPy arrays
+    """
+    if isinstance(source, ColumnarBackend):
+        return source.prize_table()
+
+    chunks = {name: [] for name in PRIZE_COLUMNS}
+    rows = pipelines.stream_rows(registry.stream(source, "prize_table", chunk_size), PRIZE_COLUMNS, chunk_size)
+    for chunk in rows:
+        for name, values in zip(PRIZE_COLUMNS, zip(*chunk)):
+            if name in PRIZE_INT_COLUMNS:
+                chunks[name].append(np.array([-1 if v is None else v for v in values], dtype=np.int64))
+            else:
+                chunks[name].append(np.array(["" if v is None else v for v in values], dtype=str))
+    return {name: np.concatenate(parts) if parts else np.array([], dtype=np.int64 if name in PRIZE_INT_COLUMNS else str)
+            for name, parts in chunks.items()}
+
+
+def _arrow_table(columns):
+    import pyarrow as pa
+
+    return pa.table({name: pa.array(values.tolist() if values.dtype == object else values)
+                     for name, values in columns.items()})
+
+
+def write_table(columns, path):
+    """
+    Writes columns to an Arrow IPC file, a Parquet file or a directory of .npy files, chosen by the
+    extension of path
+    :param columns: dictionary of column names and NumPy arrays of equal length
+    :param path: output path
+    :return: path
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ARROW_EXTENSIONS:
+        import pyarrow as pa
+
+        table = _arrow_table(columns)
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    elif ext == ".parquet":
+        import pyarrow.parquet as pq
+
+        pq.write_table(_arrow_table(columns), path)
+    else:
+        os.makedirs(path, exist_ok=True)
+        for name, values in columns.items():
+            if values.dtype == object:
+                raise ValueError(f"column {name} holds lists or documents and cannot be memory-mapped; "
+                                 f"write it to Arrow or Parquet instead")
+            np.save(os.path.join(path, f"{name}.npy"), values, allow_pickle=False)
+        with open(os.path.join(path, MANIFEST), "w") as f:
+            json.dump(list(columns), f)
+    return path
+
+
+def read_table(path):
+    """
+    Reads back a file written by write_table without copying the data where the format allows it
+    :param path: Arrow IPC file, Parquet file or .npy directory
+    :return: pyarrow.Table for Arrow and Parquet, memory-mapped from the file for Arrow IPC; for a
+             directory a dictionary of column names and read-only memory-mapped NumPy arrays
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ARROW_EXTENSIONS:
+        import pyarrow as pa
+
+        return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    if ext == ".parquet":
+        import pyarrow.parquet as pq
+
+        return pq.read_table(path, memory_map=True)
+    with open(os.path.join(path, MANIFEST)) as f:
+        names = json.load(f)
+    return {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in names}
+
+
+def table_columns(table):
+    """
+    :param table: pyarrow.Table from read_table
+    :return: dictionary of column names and NumPy arrays, sharing the Arrow buffers for numeric columns
+             without nulls
+    """
+    return {name: table.column(name).to_numpy() for name in table.column_names}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the prize table or a query result as columns")
+    parser.add_argument("query", help='"prizes" for the unwound prize table, or a NobelAPI query name')
+    parser.add_argument("output", help=".arrow, .parquet, or a directory for .npy files")
+    parser.add_argument("--backend", choices=["columnar", "mongo"], default="columnar")
+    parser.add_argument("--path", default="laureate.json")
+    parser.add_argument("--uri", default=None, help="mongodb uri, defaults to localhost")
+    args = parser.parse_args(argv)
+
+    if args.backend == "columnar":
+        backend = ColumnarBackend(args.path)
+    else:
+        from backends import MongoBackend
+
+        backend = MongoBackend(path=args.path, use_facts=False, uri=args.uri)
+    if args.query == "prizes":
+        columns = prize_table(backend if args.backend == "columnar" else backend.collection)
+    else:
+        columns = result_columns(getattr(backend, args.query)(), RESULT_COLUMNS.get(args.query))
+    print(write_table(columns, args.output))
+    backend.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import inspect
+
+from pymongo import ASCENDING, IndexModel
+
+import pipelines
+from motivation_search import SOURCE_PROJECTION, MotivationIndex
+
+# KNOWN_BIRTH filters on gender and born; category_winners and minor_winners fetch laureates by id, whose
+# unique index load_laureates creates. The {"bornCountry": {"$exists": true}} matches keep nearly every
+# laureate, and an index on the multikey prizes paths could not cover them, so no index helps there.
+LAUREATE_INDEXES = [
+    IndexModel([("gender", ASCENDING), ("born", ASCENDING)], name="gender_born"),
+]
+
+# the keyword category_winners is explained and benchmarked with
+SAMPLE_KEYWORD = "physics"
+
+
+def ensure_indexes(collection, indexes=None):
+    """
+    Creates the indexes the NobelAPI pipelines filter and group on. Indexes that already exist are
+    left alone, so this is safe to run after every load.
+    :param collection: the laureate collection
+    :param indexes: list of IndexModels, defaults to LAUREATE_INDEXES
+    :return: list of index names
+    """
+    return collection.create_indexes(indexes or LAUREATE_INDEXES)
+
+
+def explain_pipeline(collection, pipeline, verbosity="queryPlanner"):
+    """
+    Runs explain on an aggregation pipeline
+    :param collection: the collection the pipeline runs against
+    :param pipeline: list of aggregation stages
+    :param verbosity: explain verbosity, defaults to "queryPlanner"
+    :return: the explain output
+    """
+    return collection.database.command(
+        "explain", {"aggregate": collection.name, "pipeline": pipeline, "cursor": {}}, verbosity=verbosity
+    )
+
+
+def _winning_plans(explain):
+    if isinstance(explain, dict):
+        for key, value in explain.items():
+            if key == "winningPlan":
+                yield value
+            else:
+                yield from _winning_plans(value)
+    elif isinstance(explain, list):
+        for value in explain:
+            yield from _winning_plans(value)
+
+
+def _plan_stages(plan):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"], plan.get("indexName")
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _plan_stages(value)
+
+
+def plan_summary(explain):
+    """
+    Summarizes the winning query plan of an explain output
+    :param explain: output of explain_pipeline
+    :return: dictionary of the plan stages, the index names used and whether an index was used
+    """
+    stages = [stage for plan in _winning_plans(explain) for stage in _plan_stages(plan)]
+    names = [name for _, name in stages if name]
+    return {
+        "stages": [stage for stage, _ in stages],
+        "indexes": names,
+        "uses_index": bool(names) and "COLLSCAN" not in (stage for stage, _ in stages)
+    }
+
+
+def _execution_stats(explain):
+    if isinstance(explain, dict):
+        for key, value in explain.items():
+            if key == "executionStats" and isinstance(value, dict):
+                yield value
+            else:
+                yield from _execution_stats(value)
+    elif isinstance(explain, list):
+        for value in explain:
+            yield from _execution_stats(value)
+
+
+def execution_summary(explain):
+    """
+    Adds up the work reported by an explain run with "executionStats" verbosity
+    :param explain: output of explain_pipeline
+    :return: dictionary of documents examined, index keys examined, documents returned by the query
+             stage and server execution time in milliseconds
+    """
+    summary = {"docs_examined": 0, "keys_examined": 0, "returned": 0, "execution_ms": 0}
+    for stats in _execution_stats(explain):
+        summary["docs_examined"] += stats.get("totalDocsExamined", 0)
+        summary["keys_examined"] += stats.get("totalKeysExamined", 0)
+        summary["returned"] += stats.get("nReturned", 0)
+        summary["execution_ms"] += stats.get("executionTimeMillis", 0)
+    return summary
+
+
+def sample_parameters(collection):
+    """
+    :param collection: the laureate collection
+    :return: dictionary of pipeline names and the builder arguments they are explained with, for the
+             pipelines that cannot be built without arguments
+    """
+    motivations = MotivationIndex.from_laureates(collection.find({}, SOURCE_PROJECTION))
+    return {"category_winners": {"laureate_ids": motivations.laureate_ids(SAMPLE_KEYWORD)}}
+
+
+def verify_indexes(collection, queries=None):
+    """
+    Explains every NobelAPI pipeline and reports which of them are answered from an index. Pipelines
+    that begin with a $project, or with a $match almost every laureate passes, read every document and
+    report a COLLSCAN.
+    :param collection: the laureate collection
+    :param queries: dictionary of query names and pipelines, defaults to every pipeline in
+                    pipelines.PIPELINES, built with sample_parameters where it needs arguments
+    :return: dictionary of query names and plan summaries
+    """
+    if queries is None:
+        samples = sample_parameters(collection)
+        queries = {}
+        for name, builder in pipelines.PIPELINES.items():
+            params = samples.get(name, {})
+            required = [p.name for p in inspect.signature(builder).parameters.values() if p.default is p.empty]
+            if all(parameter in params for parameter in required):
+                queries[name] = pipelines.PIPELINES.build(name, **params)
+    return {name: plan_summary(explain_pipeline(collection, pipeline)) for name, pipeline in queries.items()}
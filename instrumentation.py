@@ -0,0 +1,219 @@
+"""
+Records every aggregate and find call NobelAPI makes: the query name, its parameters, wall time, number of
+result rows and, from explain, the server execution time and the documents and index keys examined.
+Records go to sinks:
+    LoggingSink       one log line per query, slow ones at WARNING
+    RingBufferSink    the last N records in memory
+    PrometheusSink    counters per query in the Prometheus text format
+A query slower than slow_ms also captures its full pipeline or filter and the explain output.
+
+Explain is an extra round trip, so by default it only runs for slow queries. With no Instrumentation, or
+enabled=False, queries take the same path as before and nothing is recorded.
+
+    stats = PrometheusSink()
+    api = NobelAPI(instrumentation=Instrumentation([LoggingSink(), stats], slow_ms=50))
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+from pymongo.errors import PyMongoError
+
+from indexes import execution_summary, explain_pipeline, plan_summary
+
+
+class LoggingSink:
+
+    def __init__(self, logger=None, level=logging.DEBUG, slow_level=logging.WARNING):
+        """
+        :param logger: logging.Logger, defaults to the "nobel.queries" logger
+        :param level: level of ordinary records, defaults to DEBUG
+        :param slow_level: level of slow queries, defaults to WARNING
+        """
+        self.logger = logger or logging.getLogger("nobel.queries")
+        self.level = level
+        self.slow_level = slow_level
+
+    def record(self, record):
+        level = self.slow_level if record["slow"] else self.level
+        if not self.logger.isEnabledFor(level):
+            return
+        self.logger.log(level, "%s %s %s %.3f ms, %d rows%s", record["operation"], record["name"], record["params"],
+                        record["seconds"] * 1000, record["rows"],
+                        "" if "docs_examined" not in record else
+                        f", {record['docs_examined']} docs and {record['keys_examined']} keys examined")
+        if record["slow"]:
+            self.logger.log(level, "slow %s %s: %s\nplan: %s", record["operation"], record["name"],
+                            record.get("command"), record.get("plan"))
+
+
+class RingBufferSink:
+
+    def __init__(self, size=1000):
+        """
+        :param size: number of most recent records kept, defaults to 1000
+        """
+        self._records = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, record):
+        with self._lock:
+            self._records.append(record)
+
+    def records(self, slow_only=False):
+        """
+        :param slow_only: only return the slow queries, defaults to False
+        :return: list of records, oldest first
+        """
+        with self._lock:
+            return [r for r in self._records if r["slow"] or not slow_only]
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+
+class PrometheusSink:
+
+    METRICS = (
+        ("queries_total", "counter", "Number of queries"),
+        ("query_seconds_total", "counter", "Wall time spent in queries"),
+        ("query_seconds_max", "gauge", "Longest query"),
+        ("query_rows_total", "counter", "Rows returned by queries"),
+        ("slow_queries_total", "counter", "Queries over the slow query threshold"),
+        ("docs_examined_total", "counter", "Documents examined by explained queries"),
+        ("keys_examined_total", "counter", "Index keys examined by explained queries"),
+    )
+
+    def __init__(self, prefix="nobel_"):
+        """
+        :param prefix: prefix of every metric name, defaults to "nobel_"
+        """
+        self.prefix = prefix
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def record(self, record):
+        increments = {
+            "queries_total": 1,
+            "query_seconds_total": record["seconds"],
+            "query_rows_total": record["rows"],
+            "slow_queries_total": int(record["slow"]),
+            "docs_examined_total": record.get("docs_examined", 0),
+            "keys_examined_total": record.get("keys_examined", 0),
+        }
+        with self._lock:
+            values = self._values.setdefault(record["name"], dict.fromkeys((name for name, _, _ in self.METRICS), 0))
+            for metric, increment in increments.items():
+                values[metric] += increment
+            values["query_seconds_max"] = max(values["query_seconds_max"], record["seconds"])
+
+    def text(self):
+        """
+        :return: the metrics in the Prometheus text exposition format
+        """
+        lines = []
+        with self._lock:
+            for metric, kind, description in self.METRICS:
+                lines.append(f"# HELP {self.prefix}{metric} {description}")
+                lines.append(f"# TYPE {self.prefix}{metric} {kind}")
+                for name, values in sorted(self._values.items()):
+                    lines.append(f'{self.prefix}{metric}{{query="{name}"}} {values[metric]:g}')
+        return "\n".join(lines) + "\n"
+
+
+class Instrumentation:
+
+    def __init__(self, sinks=None, slow_ms=None, explain="slow", enabled=True):
+        """
+        :param sinks: list of sinks, objects with a record(record) method, defaults to a RingBufferSink
+        :param slow_ms: queries taking at least this many milliseconds are slow, None for no threshold
+        :param explain: "slow" to explain slow queries only (the default), "all" for every query, or None
+        :param enabled: record queries, defaults to True
+        """
+        self.sinks = sinks if sinks is not None else [RingBufferSink()]
+        self.slow_ms = slow_ms
+        self.explain = explain
+        self.enabled = enabled
+
+    def _finish(self, collection, operation, name, params, command, explain_command, start, rows):
+        seconds = time.perf_counter() - start
+        slow = self.slow_ms is not None and seconds * 1000 >= self.slow_ms
+        record = {"operation": operation, "name": name, "params": params, "collection": collection.name,
+                  "seconds": seconds, "rows": rows, "slow": slow, "time": time.time()}
+        if self.explain == "all" or (slow and self.explain == "slow"):
+            try:
+                explain = explain_command("executionStats")
+            except PyMongoError as e:
+                # a query that ran should still be recorded when explain is not allowed
+                record["explain_error"] = str(e)
+            else:
+                record.update(execution_summary(explain))
+                if slow:
+                    record["plan"] = plan_summary(explain)
+                    record["explain"] = explain
+        if slow:
+            record["command"] = command
+        for sink in self.sinks:
+            sink.record(record)
+
+    def aggregate(self, collection, name, pipeline, params=None, shape=list, batch_size=None):
+        """
+        Runs an aggregation and records it
+        :param collection: the collection to aggregate
+        :param name: query name the record is filed under
+        :param pipeline: list of aggregation stages
+        :param params: dictionary of the query's parameters
+        :param shape: function turning the result documents into the result, defaults to list
+        :param batch_size: documents per cursor batch, defaults to the server's
+        :return: the shaped result
+        """
+        start = time.perf_counter()
+        options = {} if batch_size is None else {"batchSize": batch_size}
+        docs = list(collection.aggregate(pipeline, **options))
+        self._finish(collection, "aggregate", name, params or {}, pipeline,
+                     lambda verbosity: explain_pipeline(collection, pipeline, verbosity), start, len(docs))
+        return shape(docs)
+
+    def stream(self, collection, name, pipeline, params=None, batch_size=None):
+        """
+        Like aggregate, but yields the documents as the cursor returns them; the record is written when
+        the stream ends
+        :return: generator of documents
+        """
+        start = time.perf_counter()
+        options = {} if batch_size is None else {"batchSize": batch_size}
+        rows = 0
+        cursor = collection.aggregate(pipeline, **options)
+        try:
+            for doc in cursor:
+                rows += 1
+                yield doc
+        finally:
+            cursor.close()
+            self._finish(collection, "aggregate", name, params or {}, pipeline,
+                         lambda verbosity: explain_pipeline(collection, pipeline, verbosity), start, rows)
+
+    def find(self, collection, name, filter=None, projection=None, params=None, batch_size=0):
+        """
+        Runs a find and records it
+        :param collection: the collection to query
+        :param name: query name the record is filed under
+        :param filter: query filter
+        :param projection: projection of the returned fields
+        :param params: dictionary of the query's parameters
+        :param batch_size: documents per cursor batch, 0 for the server's default
+        :return: list of documents
+        """
+        start = time.perf_counter()
+        docs = list(collection.find(filter, projection, batch_size=batch_size))
+        command = {"find": collection.name, "filter": filter or {}}
+        if projection is not None:
+            command["projection"] = projection
+
+        def explain(verbosity):
+            return collection.database.command("explain", command, verbosity=verbosity)
+
+        self._finish(collection, "find", name, params or {}, command, explain, start, len(docs))
+        return docs
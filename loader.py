@@ -0,0 +1,227 @@
+import hashlib
+import itertools
+import json
+
+from pymongo import DeleteMany, ReplaceOne
+
+METADATA_COLLECTION = "metadata"
+HASH_FIELD = "_hash"
+
+_NUMBER_CHARS = frozenset("0123456789+-.eE")
+
+
+def file_checksum(path, chunk_size=1 << 16):
+    """
+    Computes the sha256 checksum of a file without reading it into memory all at once
+    :param path: path to the file
+    :param chunk_size: number of bytes read at a time, defaults to 64 KB
+    :return: hex digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def laureate_hash(laureate):
+    """
+    Computes a content hash for a single laureate that does not depend on key order
+    :param laureate: laureate dictionary as it appears in laureate.json
+    :return: hex digest of the laureate's contents
+    """
+    encoded = json.dumps(laureate, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+class _JSONStream:
+    """
+    Reads JSON values one at a time from a text file, keeping only a small window of it in memory
+    """
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        if self.pos > self.chunk_size:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        chunk = self.f.read(self.chunk_size)
+        self.buf += chunk
+        self.eof = not chunk
+
+    def peek(self):
+        """
+        Skips whitespace and returns the next character, or "" at the end of the file
+        """
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buf) or self.eof:
+                return self.buf[self.pos:self.pos + 1]
+            self._fill()
+
+    def expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"expected one of {chars!r} at offset {self.pos}, found {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        """
+        Decodes the next complete JSON value, reading more of the file until it fits in the buffer
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            else:
+                # a number cut by the end of the buffer, as in "1." or "2e", may continue in the next chunk;
+                # no other JSON value is followed directly by one of these characters
+                if self.eof or (end < len(self.buf) and self.buf[end] not in _NUMBER_CHARS):
+                    self.pos = end
+                    return value
+            self._fill()
+
+    def array(self):
+        """
+        Yields the elements of the JSON array starting at the current position
+        """
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(",]") == "]":
+                return
+
+
+def iter_laureates(path, key="laureates", chunk_size=1 << 16):
+    """
+    Streams laureate dictionaries one at a time from either the wrapped {"laureates": [...]} format
+    (laureate.json) or a bare array (laureates_array.json)
+    :param path: path to the json file
+    :param key: key of the laureate array in the wrapped format, defaults to "laureates"
+    :param chunk_size: number of characters read from the file at a time, defaults to 64K
+    :return: generator of laureate dictionaries
+    """
+    with open(path, encoding="utf-8") as json_file:
+        stream = _JSONStream(json_file, chunk_size)
+        if stream.peek() == "[":
+            yield from stream.array()
+            return
+
+        stream.expect("{")
+        if stream.peek() == "}":
+            return
+        while True:
+            name = stream.value()
+            stream.expect(":")
+            if name == key:
+                yield from stream.array()
+            else:
+                stream.value()
+            if stream.expect(",}") == "}":
+                return
+
+
+def batched(iterable, batch_size):
+    """
+    Splits an iterable into lists of at most batch_size items
+    :param iterable: any iterable
+    :param batch_size: the largest number of items in a batch
+    :return: generator of lists
+    """
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, batch_size)):
+        yield batch
+
+
+def insert_laureates(collection, path="laureate.json", batch_size=500):
+    """
+    Inserts laureates into a collection in fixed-size batches while streaming them from the file, so
+    memory use does not grow with the size of the file
+    :param collection: the mongo collection to insert into
+    :param path: path to laureate.json or laureates_array.json, defaults to "laureate.json"
+    :param batch_size: number of laureates per insert_many, defaults to 500
+    :return: the number of laureates inserted
+    """
+    count = 0
+    for batch in batched(iter_laureates(path), batch_size):
+        collection.insert_many(batch, ordered=False)
+        count += len(batch)
+    return count
+
+
+def dataset_version(db, collection_name="collection"):
+    """
+    Looks up the checksum of the source file the collection was last loaded from
+    :param db: the mongo database
+    :param collection_name: name of the laureate collection, defaults to "collection"
+    :return: the checksum string, or None if the collection was never loaded
+    """
+    meta = db[METADATA_COLLECTION].find_one({"_id": collection_name}, {"checksum": 1})
+    return meta["checksum"] if meta else None
+
+
+def _flush(collection, ops):
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+        ops.clear()
+
+
+def load_laureates(db, path="laureate.json", collection_name="collection", batch_size=500):
+    """
+    Brings the laureate collection in line with a laureate.json file. Only laureates whose contents
+    changed are rewritten and laureates that disappeared from the file are deleted, so the collection
+    is never empty while loading. An unchanged file costs a single metadata lookup.
+    :param db: the mongo database
+    :param path: path to laureate.json or laureates_array.json, defaults to "laureate.json"
+    :param collection_name: name of the laureate collection, defaults to "collection"
+    :param batch_size: number of write operations sent per bulk_write, defaults to 500
+    :return: dictionary with the number of upserted, deleted and unchanged laureates
+    """
+    collection = db[collection_name]
+    checksum = file_checksum(path)
+    if dataset_version(db, collection_name) == checksum:
+        return {"upserted": 0, "deleted": 0, "unchanged": collection.estimated_document_count()}
+
+    collection.create_index("id", unique=True)
+    existing = {doc["id"]: doc.get(HASH_FIELD)
+                for doc in collection.find({}, {"_id": 0, "id": 1, HASH_FIELD: 1})}
+
+    counts = {"upserted": 0, "deleted": 0, "unchanged": 0}
+    ops = []
+    for laureate in iter_laureates(path):
+        content_hash = laureate_hash(laureate)
+        if existing.pop(laureate["id"], None) == content_hash:
+            counts["unchanged"] += 1
+            continue
+        ops.append(ReplaceOne({"id": laureate["id"]}, {**laureate, HASH_FIELD: content_hash}, upsert=True))
+        counts["upserted"] += 1
+        if len(ops) >= batch_size:
+            _flush(collection, ops)
+
+    # whatever is left in existing is no longer in the file
+    stale = list(existing)
+    for i in range(0, len(stale), batch_size):
+        ops.append(DeleteMany({"id": {"$in": stale[i:i + batch_size]}}))
+    counts["deleted"] = len(stale)
+    _flush(collection, ops)
+
+    db[METADATA_COLLECTION].update_one(
+        {"_id": collection_name},
+        {"$set": {"source": path, "checksum": checksum, "count": counts["upserted"] + counts["unchanged"]}},
+        upsert=True
+    )
+    return counts
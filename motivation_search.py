@@ -0,0 +1,373 @@
+"""
+Full-text search over prize motivations with an inverted index, so keyword search does not scan every
+motivation with an unanchored $regex.
+
+Motivations are accent-folded, lowercased and split into word tokens, and every token's positions are
+kept per prize, which allows:
+    physics            prizes whose motivation has the word
+    phys*              any word starting with the prefix
+    "nuclear fission"  the words next to each other in this order
+Every term of a query has to match, and results are ranked with BM25.
+
+The index lives in memory. It can be built from laureate.json, or persisted in the motivation_docs and
+motivation_postings collections and updated there incrementally: only laureates whose content hash
+changed are re-indexed.
+
+    index = MotivationIndex.from_file("laureate.json")
+    index.search('"peace conferences" arbitr*', limit=5)
+"""
+import math
+import re
+import unicodedata
+from bisect import bisect_left
+
+from pymongo import ASCENDING, IndexModel
+
+from loader import HASH_FIELD, METADATA_COLLECTION, dataset_version, iter_laureates, laureate_hash
+
+MOTIVATION_DOCS = "motivation_docs"
+MOTIVATION_POSTINGS = "motivation_postings"
+
+POSTING_INDEXES = [
+    IndexModel([("term", ASCENDING), ("doc", ASCENDING)], name="term_doc"),
+    IndexModel([("laureate_id", ASCENDING)], name="laureate_id"),
+]
+
+SOURCE_PROJECTION = {"_id": 0, "id": 1, "firstname": 1, "surname": 1, "prizes.year": 1, "prizes.category": 1,
+                     "prizes.motivation": 1, HASH_FIELD: 1}
+
+TOKEN = re.compile(r"\w+")
+QUERY_CLAUSE = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def fold(text):
+    """
+    :param text: any string
+    :return: the string lowercased with accents removed, so "École" and "ecole" match
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text):
+    """
+    :param text: any string
+    :return: list of folded word tokens in order
+    """
+    return TOKEN.findall(fold(text or ""))
+
+
+def parse_query(query):
+    """
+    Splits a query into clauses
+    :param query: words, prefixes ending in * and "quoted phrases"
+    :return: list of ("term", token), ("prefix", token) and ("phrase", [tokens]) clauses
+    """
+    clauses = []
+    for phrase, word in QUERY_CLAUSE.findall(query):
+        if word.endswith("*") and len(tokenize(word)) == 1:
+            clauses.append(("prefix", tokenize(word)[0]))
+            continue
+        tokens = tokenize(phrase or word)
+        if len(tokens) == 1:
+            clauses.append(("term", tokens[0]))
+        elif tokens:
+            # a word like "x-ray" tokenizes into several tokens and is searched as a phrase
+            clauses.append(("phrase", tokens))
+    return clauses
+
+
+def prefix_query(text):
+    """
+    Reads typed text the way a case-insensitive $regex read it, as far as an index of whole words can: the
+    last word may be cut short, so "physic" finds physics and "radio" radioactivity. Words are matched from
+    their start, so "ysics" finds nothing, and the words do not have to be adjacent.
+    :param text: words as typed
+    :return: query for MotivationIndex.search with the last word as a prefix, or text unchanged if it
+             already has a prefix or a quoted phrase
+    """
+    words = text.split()
+    if not words or '"' in text or words[-1].endswith("*"):
+        return text
+    return " ".join(words[:-1] + [words[-1] + "*"])
+
+
+class MotivationIndex:
+
+    def __init__(self, k1=1.2, b=0.75):
+        """
+        Creates an empty index
+        :param k1: BM25 term frequency saturation, defaults to 1.2
+        :param b: BM25 document length normalization, defaults to 0.75
+        """
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.docs = {}
+        self.laureates = {}
+        self.total_length = 0
+        self._vocabulary = None
+        self._dirty = set()
+
+    def __len__(self):
+        return len(self.docs)
+
+    @classmethod
+    def from_laureates(cls, laureates, **kwargs):
+        """
+        :param laureates: iterable of laureate documents
+        :param kwargs: BM25 parameters of MotivationIndex
+        :return: MotivationIndex of their prizes
+        """
+        index = cls(**kwargs)
+        index.update(laureates)
+        return index
+
+    @classmethod
+    def from_file(cls, path="laureate.json", **kwargs):
+        """
+        :param path: laureate.json or laureates_array.json
+        :param kwargs: BM25 parameters of MotivationIndex
+        :return: MotivationIndex of the prizes in the file
+        """
+        return cls.from_laureates(iter_laureates(path), **kwargs)
+
+    def _add_doc(self, key, doc, positions):
+        self.docs[key] = doc
+        self.total_length += doc["length"]
+        for term, term_positions in positions.items():
+            self.postings.setdefault(term, {})[key] = term_positions
+        self._vocabulary = None
+
+    def _remove_laureate(self, laureate_id):
+        _, keys = self.laureates.pop(laureate_id, (None, []))
+        for key in keys:
+            doc = self.docs.pop(key)
+            self.total_length -= doc["length"]
+            for term in set(doc["terms"]):
+                postings = self.postings[term]
+                del postings[key]
+                if not postings:
+                    del self.postings[term]
+        self._vocabulary = None
+
+    def add(self, laureate):
+        """
+        Indexes the prizes of one laureate, replacing any earlier version of it
+        :param laureate: laureate document
+        :return: None
+        """
+        laureate_id = laureate["id"]
+        self._remove_laureate(laureate_id)
+        keys = []
+        for prize_index, prize in enumerate(laureate.get("prizes", [])):
+            tokens = tokenize(prize.get("motivation"))
+            positions = {}
+            for position, token in enumerate(tokens):
+                positions.setdefault(token, []).append(position)
+            key = f"{laureate_id}:{prize_index}"
+            self._add_doc(key, {
+                "laureate_id": laureate_id,
+                "prize_index": prize_index,
+                "firstname": laureate.get("firstname"),
+                "surname": laureate.get("surname"),
+                "year": prize.get("year"),
+                "category": prize.get("category"),
+                "motivation": prize.get("motivation"),
+                "length": len(tokens),
+                "terms": list(positions),
+            }, positions)
+            keys.append(key)
+        self.laureates[laureate_id] = (laureate.get(HASH_FIELD) or laureate_hash(laureate), keys)
+        self._dirty.add(laureate_id)
+
+    def remove(self, laureate_id):
+        """
+        Drops a laureate's prizes from the index
+        :param laureate_id: id of the laureate
+        :return: None
+        """
+        if laureate_id in self.laureates:
+            self._remove_laureate(laureate_id)
+            self._dirty.add(laureate_id)
+
+    def update(self, laureates, remove_missing=False):
+        """
+        Re-indexes the laureates whose content hash changed and adds new ones
+        :param laureates: iterable of laureate documents
+        :param remove_missing: also drop indexed laureates that are not in laureates, for a full sync,
+                               defaults to False
+        :return: number of laureates added, changed or removed
+        """
+        seen = set()
+        changed = 0
+        for laureate in laureates:
+            laureate_id = laureate["id"]
+            seen.add(laureate_id)
+            current = self.laureates.get(laureate_id)
+            if current is None or current[0] != (laureate.get(HASH_FIELD) or laureate_hash(laureate)):
+                self.add(laureate)
+                changed += 1
+        if remove_missing:
+            for laureate_id in [i for i in self.laureates if i not in seen]:
+                self.remove(laureate_id)
+                changed += 1
+        return changed
+
+    def _idf(self, df):
+        n = len(self.docs)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def _bm25(self, idf, tf, key):
+        average = self.total_length / len(self.docs) if self.docs else 0
+        norm = 1 - self.b + self.b * (self.docs[key]["length"] / average if average else 0)
+        return idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+
+    def _term_scores(self, term):
+        postings = self.postings.get(term, {})
+        idf = self._idf(len(postings))
+        return {key: self._bm25(idf, len(positions), key) for key, positions in postings.items()}
+
+    def _prefix_scores(self, prefix):
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        scores = {}
+        i = bisect_left(self._vocabulary, prefix)
+        while i < len(self._vocabulary) and self._vocabulary[i].startswith(prefix):
+            for key, score in self._term_scores(self._vocabulary[i]).items():
+                scores[key] = scores.get(key, 0.0) + score
+            i += 1
+        return scores
+
+    def _phrase_scores(self, tokens):
+        lists = [self.postings.get(token, {}) for token in tokens]
+        if not all(lists):
+            return {}
+        keys = set.intersection(*(set(postings) for postings in sorted(lists, key=len)))
+        idf = sum(self._idf(len(postings)) for postings in lists)
+        scores = {}
+        for key in keys:
+            later = [set(postings[key]) for postings in lists[1:]]
+            tf = sum(1 for start in lists[0][key]
+                     if all(start + offset + 1 in positions for offset, positions in enumerate(later)))
+            if tf:
+                scores[key] = self._bm25(idf, tf, key)
+        return scores
+
+    def search(self, query, limit=10, category=None):
+        """
+        Finds the prizes whose motivation matches every clause of a query, best match first
+        :param query: words, prefixes ending in * and "quoted phrases"
+        :param limit: the most results returned, None for all, defaults to 10
+        :param category: only return prizes in this category, defaults to every category
+        :return: list of dictionaries of laureate_id, prize_index, firstname, surname, year, category,
+                 motivation and score
+        """
+        scores = None
+        for kind, value in parse_query(query):
+            if kind == "term":
+                clause = self._term_scores(value)
+            elif kind == "prefix":
+                clause = self._prefix_scores(value)
+            else:
+                clause = self._phrase_scores(value)
+            if scores is None:
+                scores = clause
+            else:
+                scores = {key: score + clause[key] for key, score in scores.items() if key in clause}
+            if not scores:
+                return []
+        if not scores:
+            return []
+        if category is not None:
+            scores = {key: score for key, score in scores.items() if self.docs[key]["category"] == category}
+        ranked = sorted(scores.items(), key=lambda item: -item[1])[:limit]
+        results = []
+        for key, score in ranked:
+            doc = self.docs[key]
+            results.append({field: doc[field] for field in ("laureate_id", "prize_index", "firstname", "surname",
+                                                            "year", "category", "motivation")
+                            if doc[field] is not None} | {"score": score})
+        return results
+
+    def laureate_ids(self, query, category=None):
+        """
+        :param query: words, prefixes ending in * and "quoted phrases"
+        :param category: only count prizes in this category, defaults to every category
+        :return: sorted list of the ids of laureates with at least one prize matching the query
+        """
+        return sorted({result["laureate_id"] for result in self.search(query, None, category)})
+
+    @classmethod
+    def load(cls, db, **kwargs):
+        """
+        Reads an index persisted with save
+        :param db: the mongo database
+        :param kwargs: BM25 parameters of MotivationIndex
+        :return: MotivationIndex, empty if nothing was saved
+        """
+        index = cls(**kwargs)
+        positions = {}
+        for posting in db[MOTIVATION_POSTINGS].find({}, {"_id": 0, "term": 1, "doc": 1, "positions": 1}):
+            positions.setdefault(posting["doc"], {})[posting["term"]] = posting["positions"]
+        keys_by_laureate = {}
+        for doc in db[MOTIVATION_DOCS].find():
+            key = doc.pop("_id")
+            laureate_hash_value = doc.pop("hash")
+            index._add_doc(key, doc, positions.get(key, {}))
+            keys_by_laureate.setdefault(doc["laureate_id"], (laureate_hash_value, []))[1].append(key)
+        index.laureates = keys_by_laureate
+        return index
+
+    def save(self, db):
+        """
+        Writes the laureates changed since the last load or save to the motivation_docs and
+        motivation_postings collections
+        :param db: the mongo database
+        :return: number of laureates written
+        """
+        dirty = list(self._dirty)
+        if not dirty:
+            return 0
+        docs, postings = db[MOTIVATION_DOCS], db[MOTIVATION_POSTINGS]
+        postings.create_indexes(POSTING_INDEXES)
+        docs.delete_many({"laureate_id": {"$in": dirty}})
+        postings.delete_many({"laureate_id": {"$in": dirty}})
+        new_docs, new_postings = [], []
+        for laureate_id in dirty:
+            if laureate_id not in self.laureates:
+                continue
+            hash_value, keys = self.laureates[laureate_id]
+            for key in keys:
+                doc = self.docs[key]
+                new_docs.append({"_id": key, "hash": hash_value, **doc})
+                new_postings.extend({"term": term, "doc": key, "laureate_id": laureate_id,
+                                     "positions": self.postings[term][key]} for term in doc["terms"])
+        if new_docs:
+            docs.insert_many(new_docs, ordered=False)
+        if new_postings:
+            postings.insert_many(new_postings, ordered=False)
+        self._dirty.clear()
+        return len(dirty)
+
+
+def build_motivation_index(db, collection_name="collection", force=False):
+    """
+    Loads the persisted motivation index and brings it up to date with the laureate collection,
+    re-indexing only the laureates that changed since it was saved
+    :param db: the mongo database
+    :param collection_name: name of the laureate collection, defaults to "collection"
+    :param force: re-check every laureate even if the index matches the loaded data, defaults to False
+    :return: MotivationIndex
+    """
+    index = MotivationIndex.load(db)
+    version = dataset_version(db, collection_name)
+    if force or version is None or dataset_version(db, MOTIVATION_DOCS) != version:
+        index.update(db[collection_name].find({}, SOURCE_PROJECTION), remove_missing=True)
+        index.save(db)
+        db[METADATA_COLLECTION].update_one(
+            {"_id": MOTIVATION_DOCS},
+            {"$set": {"source": collection_name, "checksum": version}},
+            upsert=True
+        )
+    return index
@@ -1,168 +1,194 @@
+import inspect
+import os
+import time
 
-from pymongo import MongoClient
-import json
-import matplotlib.pyplot as plt
-from scipy import stats
+import numpy as np
 
-client = MongoClient()
-db = client.prize
+import charts
+from ages import AgeDensity
+from backends import RESULT_SHAPES, MongoBackend
+from cache import UNKEYED_ARGUMENTS, ResultCache, cached
+from pipelines import stream_rows
 
-with open('laureate.json') as json_file:
-    data = json.load(json_file)
-
-prize_data = data["laureates"]
-db.collection.delete_many({})
-result = db.collection.insert_many(prize_data)
+AGE_COLUMNS = ("year", "age")
+MINOR_WINNER_COLUMNS = ("id", "firstname", "surname", "prizes.year", "prizes.category", "age")
 
 
 class NobelAPI:
 
-    def __init__(self, db):
-        self.collection = db.collection
+    def __init__(self, db=None, path="laureate.json", use_facts=True, cache=True, version_ttl=5, backend=None,
+                 instrumentation=None, uri=None, client_options=None):
+        """
+        Nothing is connected or loaded until the first query
+        :param db: the mongo database to query, defaults to the prize database of the process's shared
+                   MongoClient, see connection.py
+        :param path: laureate.json to load into the collection before the first query, None to skip loading
+        :param use_facts: answer the per-prize queries from the prize_facts collection and the co-winner
+                          queries from prize_groups, defaults to True
+        :param cache: ResultCache for query results, True for an in-process one (the default) or
+                      False to always query the backend
+        :param version_ttl: seconds the dataset version is trusted before it is looked up again, defaults to 5
+        :param backend: object answering the queries, such as columnar.ColumnarBackend, defaults to a
+                        MongoBackend built from db, path and use_facts
+        :param instrumentation: instrumentation.Instrumentation recording every database call of the backend,
+                                defaults to None
+        :param uri: mongodb uri of the shared client when db is None, defaults to NOBEL_MONGO_URI or localhost
+        :param client_options: dictionary of MongoClient options of the shared client, such as maxPoolSize
+                               or readPreference
+        """
+        if backend is None:
+            backend = MongoBackend(db, path, use_facts, uri=uri, client_options=client_options)
+        if instrumentation is not None:
+            backend.instrumentation = instrumentation
+        self.backend = backend
+        if cache is True:
+            cache = ResultCache()
+        self.cache = cache or None
+        self.version_ttl = version_ttl
+        self._version = None
+        self._version_checked = None
+
+    @property
+    def collection(self):
+        """
+        The laureate collection of a MongoBackend, connecting and loading the data on first access
+        """
+        return self.backend.collection
+
+    def __enter__(self):
+        return self
 
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Releases the backend's connection, if it has one
+        :return: None
+        """
+        self.backend.close()
+
+    def dataset_version(self):
+        """
+        The version stamp of the backend's data, looked up at most once every version_ttl seconds so
+        cached results are invalidated soon after another process reloads the data
+        :return: the dataset version string, or None if it is unknown
+        """
+        now = time.monotonic()
+        if self._version_checked is None or now - self._version_checked > self.version_ttl:
+            self._version = self.backend.dataset_version()
+            self._version_checked = now
+        return self._version
+
+    @cached
     def top_countries(self, limit=10):
         """
         Creates a dictionary of how many Nobel Prize winners are from each country, from most to least
         :param limit: the number of countries added, defaults to 10
         :return: dictionary of countries and number of Nobel Prize winners from that country
         """
-        pipeline = [
-            {"$match": {"bornCountry": {"$exists": True}}},
-            {"$group": {"_id": "$bornCountry", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}},
-            {"$limit": limit}
-        ]
-        results = self.collection.aggregate(pipeline)
-        return {doc["_id"]: doc["count"] for doc in results}
-
+        return self.backend.top_countries(limit)
 
+    @cached
     def top_categories(self):
         """
         Creates a dictionary of the Nobel Prize categories and the number of prizes won for each
         category from most to least
         :return: dictionary of categories and number of Nobel Prize winners from that category
         """
-        pipeline = [
-            {"$unwind": "$prizes"},
-            {"$group": {"_id": "$prizes.category", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}}
-        ]
-        results = self.collection.aggregate(pipeline)
-        return {doc["_id"]: doc["count"] for doc in results}
-
+        return self.backend.top_categories()
 
+    @cached
     def most_prizes_per_year(self, limit=10):
         """
         Creates a dictionary of how many prizes won for each year from most to least
         :param limit: the number of years added, defaults to 10
         :return: a dictionary of years and number of prizes won for each year
         """
-        pipeline = [
-            {"$unwind": "$prizes"},
-            {"$group": {"_id": "$prizes.year", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}},
-            {"$limit": limit}
-        ]
-        results = self.collection.aggregate(pipeline)
-        return {doc["_id"]: doc["count"] for doc in results}
-
+        return self.backend.most_prizes_per_year(limit)
 
+    @cached
     def laureate_gender(self):
         """
         Creates a dictionary of genders and how many winners are male or female
         :return: dictionary of genders and number of winners in each category
         """
-        pipeline = [
-            {"$group": {"_id": "$gender", "count": {"$sum": 1}}}
-        ]
-        results = self.collection.aggregate(pipeline)
-        return {doc["_id"]: doc["count"] for doc in results}
-
+        return self.backend.laureate_gender()
 
-    def laureate_ages_yearly(self):
+    @cached
+    def laureate_ages_yearly(self, batch_size=None):
         """
         Creates a list of dictionaries of the year winners won and ages of the winners
+        :param batch_size: documents per cursor batch, defaults to the backend's
         :return: a list of dictionaries of years and ages of winners
         """
-        pipeline = [
-            {"$unwind": "$prizes"},
-            {"$match": {"born": {"$exists": True, "$ne": "0000-00-00"},
-                        "gender": {"$ne": "org"}}},
-            {"$project": {
-                "_id": 0,
-                "year": {"$toInt": "$prizes.year"},
-                "age": {"$subtract": [
-                    {"$toInt": {"$substr": ["$prizes.year", 0, 4]}},
-                    {"$toInt": {"$substr": ["$born", 0, 4]}}
-                ]}
-            }}
-        ]
-        return list(self.collection.aggregate(pipeline))
+        return self.backend.laureate_ages_yearly(batch_size=batch_size)
 
+    def iter_laureate_ages_yearly(self, chunk_size=None, arrays=False, batch_size=None):
+        """
+        Streams the rows of laureate_ages_yearly from the cursor instead of building the list. Results are
+        not cached.
+        :param chunk_size: yield lists of up to chunk_size (year, age) tuples instead of single dictionaries
+        :param arrays: with chunk_size, yield (years, ages) NumPy arrays instead, defaults to False
+        :param batch_size: documents per cursor batch, defaults to the backend's
+        :return: generator of dictionaries of years and ages of winners, or of chunks
+        """
+        rows = self.backend.iter_laureate_ages_yearly(batch_size=batch_size)
+        return stream_rows(rows, AGE_COLUMNS if chunk_size else None, chunk_size, arrays)
 
+    @cached
     def ages_of_laureates(self):
         """
         Creates a dictionary of ages and the number of winners who won at that age
         :return: dictionary of ages and count of winners
         """
-        pipeline = [
-            {"$unwind": "$prizes"},
-            {"$match": {"born": {"$exists": True, "$ne": "0000-00-00"},
-                        "gender": {"$ne": "org"}}},
-            {"$addFields": {
-                "age": {"$subtract": [
-                    {"$toInt": {"$substr": ["$prizes.year", 0, 4]}},
-                    {"$toInt": {"$substr": ["$born", 0, 4]}}
-                ]}
-            }},
-            {"$bucket": {
-                "groupBy": "$age",
-                "boundaries": list(range(0, 105, 5)),
-                "default": "other",
-                "output": {"count": {"$sum": 1}}
-            }}
-        ]
-        results = self.collection.aggregate(pipeline)
-        return {doc["_id"]: doc["count"] for doc in results}
-
-
-    def minor_winners(self):
+        return self.backend.ages_of_laureates()
+
+    def age_table(self):
+        """
+        Parses the birth years and prize years of every prize won by a person into NumPy arrays. The
+        backend keeps the table per dataset version, so it is not pickled into the result cache.
+        :return: ages.AgeTable with the yearly ages, age buckets, minors and regression
+        """
+        return self.backend.age_table()
+
+    @cached
+    def minor_winners(self, fields=None, batch_size=None):
         """
         Creates a list of dictionaries of the winners who were under the age of 18 when they won
-        :return: list of dictionaries of minor winners
-        """
-        pipeline = [
-            {"$unwind": "$prizes"},
-            {"$match": {"born": {"$exists": True, "$ne": "0000-00-00"},
-                        "gender": {"$ne": "org"}}},
-            {"$addFields": {
-                "age": {"$subtract": [
-                    {"$toInt": {"$substr": ["$prizes.year", 0, 4]}},
-                    {"$toInt": {"$substr": ["$born", 0, 4]}}
-                ]}
-            }},
-            {"$match": {"age": {"$lt": 18}}}
-        ]
-        return list(self.collection.aggregate(pipeline))
+        :param fields: laureate fields or dotted paths such as "prizes.year" to return, defaults to the
+                       whole document. Only the listed fields are sent by the database.
+        :param batch_size: documents per cursor batch, defaults to the backend's
+        :return: list of dictionaries of minor winners, each with the prize won as a minor and the age
+        """
+        return self.backend.minor_winners(fields=fields, batch_size=batch_size)
 
+    def iter_minor_winners(self, fields=None, columns=None, chunk_size=None, arrays=False, batch_size=None):
+        """
+        Streams the rows of minor_winners from the cursor instead of building the list. Results are not
+        cached.
+        :param fields: laureate fields or dotted paths to return, defaults to the whole document
+        :param columns: fields or dotted paths of the tuples in a chunk, defaults to fields and the age,
+                        or to MINOR_WINNER_COLUMNS
+        :param chunk_size: yield lists of up to chunk_size tuples instead of single dictionaries
+        :param arrays: with chunk_size, yield a NumPy array per column instead, defaults to False
+        :param batch_size: documents per cursor batch, defaults to the backend's
+        :return: generator of dictionaries of minor winners, or of chunks
+        """
+        rows = self.backend.iter_minor_winners(fields=fields, batch_size=batch_size)
+        if chunk_size and columns is None:
+            columns = MINOR_WINNER_COLUMNS if fields is None else (*fields, "age")
+        return stream_rows(rows, columns if chunk_size else None, chunk_size, arrays)
 
+    @cached
     def category_introduction_year(self):
         """
         Creates a dictionary of the different prize categories and the year they were added
         :return: dictionary of prize categories and year they were made
         """
-        pipeline = [
-            {"$unwind": "$prizes"},
-            {"$group": {
-                "_id": "$prizes.category",
-                "firstYear": {"$min": "$prizes.year"}
-            }},
-            {"$sort": {"firstYear": 1}}
-        ]
-        results = self.collection.aggregate(pipeline)
-        return {doc["_id"]: doc["firstYear"] for doc in results}
-
+        return self.backend.category_introduction_year()
 
+    @cached
     def top_category_per_country(self, limit=10):
         """
         Creates a dictionary of dictionaries of each country and the prize category that is highest for that
@@ -170,110 +196,195 @@ class NobelAPI:
         :param limit: the number of countries to return, defaults to 10
         :return: dictionary of country and prize categories
         """
-        pipeline = [
-            {"$match": {"bornCountry": {"$exists": True}}},
-            {"$unwind": "$prizes"},
-            {"$group": {
-                "_id": {"country": "$bornCountry", "category": "$prizes.category"},
-                "count": {"$sum": 1}
-            }},
-            {"$sort": {"_id.country": 1, "count": -1}},
-            {"$group": {
-                "_id": "$_id.country",
-                "topCategory": {"$first": "$_id.category"},
-                "count": {"$first": "$count"}
-            }},
-            {"$sort": {"count": -1}},
-            {"$limit": limit}
-        ]
-        results = self.collection.aggregate(pipeline)
-        return {doc["_id"]: {"category": doc["topCategory"], "count": doc["count"]} for doc in results}
+        return self.backend.top_category_per_country(limit)
 
+    @cached
+    def category_winner_counts(self):
+        """
+        Creates a list of dictionaries of each prize category and how many of its prizes had one, two,
+        three and four or more winners
+        :return: list of dictionaries sorted by category
+        """
+        return self.backend.category_winner_counts()
+
+    @cached
+    def avg_winners_per_category(self):
+        """
+        Creates a dictionary of each prize category and how many of its prizes had one, two, three and four
+        or more winners
+        :return: dictionary of categories and dictionaries of the four counts
+        """
+        return self.backend.avg_winners_per_category()
+
+    @cached
+    def solo_vs_collaborative_prizes(self):
+        """
+        Counts the prizes won alone and the prizes shared per decade
+        :return: dictionary of (decade, "solo" or "collaborative") and number of prizes
+        """
+        return self.backend.solo_vs_collaborative_prizes()
+
+    @cached
+    def categories_split(self):
+        """
+        Counts the prizes in each category whose winners got different shares
+        :return: dictionary of categories and number of unevenly split prizes, most first
+        """
+        return self.backend.categories_split()
+
+    @cached
+    def country_decades_winners(self):
+        """
+        Counts the prizes won per birth country and decade
+        :return: dictionary of (country, decade) and number of prizes
+        """
+        return self.backend.country_decades_winners()
+
+    @cached
+    def search_motivations(self, query, limit=10, category=None):
+        """
+        Searches the prize motivations with the inverted index in motivation_search.py
+        :param query: words, prefixes ending in * and "quoted phrases", all of which have to match
+        :param limit: the most results returned, defaults to 10
+        :param category: only return prizes in this category, defaults to every category
+        :return: list of dictionaries of the matching prizes ranked by BM25 score, best first
+        """
+        return self.backend.search_motivations(query, limit, category)
+
+    def batch(self, queries):
+        """
+        Runs several queries at once. On a MongoBackend the queries that are not cached share one $unwind
+        and run as branches of a single $facet aggregation, so the whole batch is one round trip.
+        :param queries: list of query method names, or (name, dictionary of arguments) pairs,
+                        e.g. ["top_categories", ("top_countries", {"limit": 5})]
+        :return: dictionary of query names and results, shaped like the individual methods' results
+        :raises ValueError: for a name that is not a query or appears more than once, as the results are
+                            keyed by name
+        """
+        requests = {}
+        for query in queries:
+            name, kwargs = (query, {}) if isinstance(query, str) else query
+            if name not in RESULT_SHAPES:
+                raise ValueError(f"{name} is not a NobelAPI query")
+            if name in requests:
+                raise ValueError(f"{name} is requested more than once")
+            bound = inspect.signature(getattr(self, name)).bind(**kwargs)
+            bound.apply_defaults()
+            requests[name] = {k: v for k, v in bound.arguments.items() if k not in UNKEYED_ARGUMENTS}
+
+        results = {}
+        version = self.dataset_version() if self.cache is not None else None
+        if self.cache is not None:
+            for name, arguments in requests.items():
+                hit, result = self.cache.get(name, arguments, version)
+                if hit:
+                    results[name] = result
+        missing = [(name, arguments) for name, arguments in requests.items() if name not in results]
+        if missing:
+            if hasattr(self.backend, "batch"):
+                computed = self.backend.batch(missing)
+            else:
+                computed = {name: getattr(self.backend, name)(**arguments) for name, arguments in missing}
+            for name, arguments in missing:
+                if self.cache is not None:
+                    self.cache.set(name, arguments, version, computed[name])
+                results[name] = computed[name]
+        return {name: results[name] for name in requests}
+
+    def chart_data(self, chart):
+        """
+        :param chart: name of a chart in charts.CHARTS
+        :return: the query result the chart is drawn from
+        """
+        if chart == "age_histogram":
+            return self.ages_of_laureates()
+        if chart == "category_winners":
+            return self.category_winner_counts()
+        if chart == "age_over_time":
+            return self._age_over_time()
+        raise ValueError(f"{chart} is not a chart")
+
+    def _age_over_time(self, mode="auto", chunk_size=100000):
+        # scatter and hexbin draw every prize; otherwise the rows are binned as they stream and at most
+        # charts.SCATTER_LIMIT of them are held, so auto mode decides without building the whole table
+        if mode in ("scatter", "hexbin"):
+            return self.age_table().yearly()
+        density = AgeDensity()
+        kept = [] if mode == "auto" else None
+        for years, ages in self.iter_laureate_ages_yearly(chunk_size, arrays=True):
+            density.update(years, ages)
+            if kept is not None:
+                kept.append((years, ages))
+                if len(density) > charts.SCATTER_LIMIT:
+                    kept = None
+        if kept is None:
+            # past the scatter limit only the fixed size grid is pickled to the renderer and hashed
+            return density
+        if not kept:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+        return tuple(np.concatenate(values) for values in zip(*kept))
+
+    def render_charts(self, jobs, directory=None, fmt="png", renderer=None):
+        """
+        Renders charts headless, in parallel, without pyplot
+        :param jobs: list of chart names in charts.CHARTS
+        :param directory: directory the images are written to as <chart>.<fmt>, None to return bytes
+        :param fmt: "png" or "svg", defaults to "png"
+        :param renderer: charts.ReportRenderer, defaults to one without a cache
+        :return: list of paths, or of image bytes when directory is None
+        """
+        from charts import ChartJob, ReportRenderer
+
+        renderer = renderer or ReportRenderer()
+        return renderer.render_many(
+            ChartJob(chart, self.chart_data(chart),
+                     None if directory is None else os.path.join(directory, f"{chart}.{fmt}"), fmt)
+            for chart in jobs)
 
     def plot_age_histogram(self):
         """
         Creates a histogram of the age distribution of prizes
         :return: None, creates visualization
         """
-        data = self.ages_of_laureates()
-        labels = list(data.keys())
-        counts = list(data.values())
-
-        plt.bar(labels, counts)
-        plt.xticks(rotation=45)
-        plt.title("Nobel Prize Laureates by Age")
-        plt.show()
+        charts.show("age_histogram", self.chart_data("age_histogram"))
 
     def plot_category_winners(self):
         """
         Creates a stacked histogram of the prize categories and the number of collaborators for that prize
         :return: None, creates visualization
         """
-        pipeline = [
-            {"$unwind": "$prizes"},
-            {"$group": {
-                "_id": {"year": "$prizes.year", "category": "$prizes.category"},
-                "winnersCount": {"$sum": 1}
-            }},
-            {"$group": {
-                "_id": "$_id.category",
-                "one_winner": {"$sum": {"$cond": [{"$eq": ["$winnersCount", 1]}, 1, 0]}},
-                "two_winners": {"$sum": {"$cond": [{"$eq": ["$winnersCount", 2]}, 1, 0]}},
-                "three_winners": {"$sum": {"$cond": [{"$eq": ["$winnersCount", 3]}, 1, 0]}}
-            }},
-            {"$sort": {"_id": 1}}
-        ]
-
-        data = list(self.collection.aggregate(pipeline))
-
-        categories = [doc["_id"] for doc in data]
-        one = [doc["one_winner"] for doc in data]
-        two = [doc["two_winners"] for doc in data]
-        three = [doc["three_winners"] for doc in data]
-
-        x = range(len(categories))
-
-        plt.figure(figsize=(14, 6))
-        plt.bar(x, one, label="1 Winner", color="steelblue")
-        plt.bar(x, two, label="2 Winners", color="orange", bottom=one)
-        plt.bar(x, three, label="3 Winners", color="green",
-                bottom=[o + t for o, t in zip(one, two)])
-
-        plt.xticks(x, categories, rotation=45, ha="right")
-        plt.xlabel("Category")
-        plt.ylabel("Number of Prizes")
-        plt.title("Nobel Prize Winners per Prize by Category")
-        plt.legend()
-        plt.tight_layout()
-        plt.show()
-
-    def plot_age_over_time(self):
-        """
-        Creates a scatter plot of the age distribution of prizes over the years with a line of best fit
-        :return: None, creates visualization
+        charts.show("category_winners", self.chart_data("category_winners"))
+
+    def age_density(self, chunk_size=100000, **kwargs):
+        """
+        Bins the (year, age) rows of laureate_ages_yearly as they stream from the backend, so memory stays
+        bounded by the grid at any number of prizes. Results are not cached.
+        :param chunk_size: rows binned at a time, defaults to 100000
+        :param kwargs: grid edges of ages.AgeDensity
+        :return: ages.AgeDensity with the age-over-time regression
         """
-        data = self.laureate_ages_yearly()
+        return AgeDensity.from_chunks(self.iter_laureate_ages_yearly(chunk_size, arrays=True), **kwargs)
 
-        years = [d["year"] for d in data]
-        ages = [d["age"] for d in data]
+    def plot_age_over_time(self, mode="auto"):
+        """
+        Creates a scatter plot of the age distribution of prizes over the years with a line of best fit,
+        or a density grid of it for large datasets
+        :param mode: "auto", "scatter", "hexbin" or "density", see charts.draw_age_over_time
+        :return: None, creates visualization
+        """
+        charts.show("age_over_time", self._age_over_time(mode), mode=mode)
 
-        slope, intercept, r, _, _ = stats.linregress(years, ages)
-        line = [slope * y + intercept for y in sorted(years)]
-        plt.scatter(years, ages, alpha=0.4, color="steelblue")
-        plt.plot(sorted(years), line, color="red", label=f"Best fit (r={r:.2f})")
-        plt.xlabel("Year")
-        plt.ylabel("Age at Time of Winning")
-        plt.title("Nobel Prize Winner Age Over Time")
-        plt.legend()
-        plt.show()
+def main():
+    with NobelAPI() as api:
+        # print(api.top_categories())
+        # print(api.top_countries())
+        # print(api.top_category_per_country())
+        # print(api.most_prizes_per_year())
 
-api = NobelAPI(db)
+        # api.plot_age_histogram()
+        # api.plot_category_winners()
+        api.plot_age_over_time()
 
-# print(api.top_categories())
-# print(api.top_countries())
-# print(api.top_category_per_country())
-# print(api.most_prizes_per_year())
 
-# api.plot_age_histogram()
-# api.plot_category_winners()
-api.plot_age_over_time()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
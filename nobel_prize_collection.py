@@ -1,20 +1,43 @@
 
-from pymongo import MongoClient
-import json
+from connection import acquire_client
+from loader import load_laureates
+from backends import RESULT_SHAPES
+from indexes import ensure_indexes
+from prize_facts import GROUPS_COLLECTION, build_prize_facts, build_prize_groups
+from pipelines import CATEGORY_WINNER_FIELDS, GROUP_PIPELINES, PIPELINES, stream_rows
+from motivation_search import build_motivation_index, prefix_query
+from ages import AgeDensity
 import pprint
-import matplotlib.pyplot as plt
-from scipy import stats
-from sklearn import pipeline
+import charts
+from charts import ChartJob, ReportRenderer
 
-client = MongoClient()
+# the process's shared client, closed at exit; a forked worker opens its own
+client = acquire_client()
 db = client.prize
 
-with open('laureate.json') as json_file:
-    data = json.load(json_file)
+load_laureates(db)
+ensure_indexes(db.collection)
+build_prize_facts(db)
+build_prize_groups(db)
 
-prize_data = data["laureates"]
-db.collection.delete_many({})
-result = db.collection.insert_many(prize_data)
+
+# set to an instrumentation.Instrumentation to record every query
+instrumentation = None
+
+
+def _run(name, shape=list, batch_size=None, **params):
+    # every query goes through the shared pipeline registry, which also times it
+    return PIPELINES.run(db.collection, name, shape, batch_size, instrumentation, **params)
+
+
+def _run_groups(name, shape=list):
+    # the co-winner and share analyses read the (year, category) rows of prize_groups
+    return GROUP_PIPELINES.run(db[GROUPS_COLLECTION], name, shape, None, instrumentation)
+
+
+def _stream(name, batch_size=None, **params):
+    # the iter_ functions read the cursor lazily so export jobs do not hold the whole result
+    return PIPELINES.stream(db.collection, name, batch_size, instrumentation, **params)
 
 
 # chemistry_prizes = db.collection.find({"category": "chemistry"})
@@ -26,35 +49,13 @@ result = db.collection.insert_many(prize_data)
 # print(countries)
 
 def top_countries(limit=10):
-    pipeline = [
-        {"$match": {"bornCountry": {"$exists": True}}},
-        {"$group": {
-            "_id": "$bornCountry",
-            "count": {"$sum": 1}
-        }},
-        {"$sort": {"count": -1}},
-        {"$limit": limit}
-    ]
-
-    results = db.collection.aggregate(pipeline)
-    return {doc["_id"]: doc["count"] for doc in results}
+    return _run("top_countries", RESULT_SHAPES["top_countries"], limit=limit)
 
 # top_countries()
 
 
 def top_categories():
-    pipeline = [
-        {"$unwind": "$prizes"},  # Break out each prize into its own document
-        {"$group": {
-            "_id": "$prizes.category",  # Group by category
-            "count": {"$sum": 1}
-        }},
-        {"$sort": {"count": -1}}  # Sort descending
-    ]
-
-    results = db.collection.aggregate(pipeline)
-
-    for doc in results:
+    for doc in _run("top_categories"):
         print(doc["_id"], doc["count"])
 
 # top_categories()
@@ -71,267 +72,117 @@ def top_categories():
 # laureate_ages()
 
 def ages_of_laureates():
-    pipeline = [
-    {"$unwind": "$prizes"},
-    {"$match": {"born": {"$exists": True, "$ne": "0000-00-00"}, "gender": {"$ne": "org"}}},
-    {"$addFields": {"age": {"$subtract": [
-        {"$toInt": {"$substr": ["$prizes.year", 0, 4]}},
-        {"$toInt": {"$substr": ["$born", 0, 4]}}
-    ]}}},
-    {"$bucket": {
-        "groupBy": "$age",
-        "boundaries": [0, 5, 10, 15, 20, 25, 30, 35, 40, 45, 50, 55, 60, 65, 70, 75, 80, 85, 90, 95, 100],
-        "default": "other",
-        "output": {"count": {"$sum": 1}}
-    }},
-    {"$project": {
-        "age_range": {"$concat": [{"$toString": "$_id"}, "-", {"$toString": {"$add": ["$_id", 4]}}]},
-        "count": 1,
-        "_id": 0
-    }}
-]
-
-    results = db.collection.aggregate(pipeline)
-    return {doc["age_range"]: doc["count"] for doc in results}
-
-def laureate_ages_yearly():
-    pipeline = [
-        {"$unwind": "$prizes"},
-        {"$match": {"born": {"$exists": True, "$ne": "0000-00-00"}, "gender": {"$ne": "org"}}},
-        {"$project": {
-            "_id": 0,
-            "year": {"$toInt": "$prizes.year"},
-            "age": {"$subtract": [
-                {"$toInt": {"$substr": ["$prizes.year", 0, 4]}},
-                {"$toInt": {"$substr": ["$born", 0, 4]}}
-            ]}
-        }}
-    ]
+    return _run("age_ranges", lambda results: {doc["age_range"]: doc["count"] for doc in results})
 
-    results = db.collection.aggregate(pipeline)
-    return [(doc["year"], doc["age"]) for doc in results]
+def laureate_ages_yearly(batch_size=None):
+    return _run("laureate_ages_yearly", lambda results: [(doc["year"], doc["age"]) for doc in results], batch_size)
 
 def top_category_per_country(limit=10):
-    pipeline = [
-    {"$match": {"bornCountry": {"$exists": True}}},
-    {"$unwind": "$prizes"},
-    {"$group": {
-        "_id": {"country": "$bornCountry", "category": "$prizes.category"},
-        "count": {"$sum": 1}
-    }},
-    {"$sort": {"_id.country": 1, "count": -1}},
-    {"$group": {
-        "_id": "$_id.country",
-        "topCategory": {"$first": "$_id.category"},
-        "count": {"$first": "$count"}
-    }},
-    {"$sort": {"count": -1}},
-    {"$limit": 10}
-]
-
-    results = db.collection.aggregate(pipeline)
-    return {doc["_id"]: {"category": doc["topCategory"], "count": doc["count"]} for doc in results}
+    return _run("top_category_per_country", RESULT_SHAPES["top_category_per_country"], limit=limit)
 
 # top_category_per_country()
 
 def most_prizes_per_year(limit=10):
-    pipeline = [
-        {"$unwind": "$prizes"},
-
-        {"$group": {
-            "_id": "$prizes.year",
-            "count": {"$sum": 1}
-        }},
-
-        {"$sort": {"count": -1}},
-        {"$limit" : limit}
-    ]
-
-    results = db.collection.aggregate(pipeline)
-
-    for doc in results:
+    for doc in _run("most_prizes_per_year", limit=limit):
         print("Year:", doc["_id"], "Prizes won:", doc["count"])
 
 most_prizes_per_year()
 
 def laureate_gender_breakdown():
-    pipeline = [
-        {"$group": {
-            "_id": "$gender",
-            "count": {"$sum": 1}
-        }}
-    ]
-    results = db.collection.aggregate(pipeline)
-    return {doc["_id"]: doc["count"] for doc in results}
-
-def minor_winners():
-    pipeline = [
-    {"$unwind": "$prizes"},
-    {"$match": {
-        "born": {"$exists": True, "$ne": "0000-00-00"},
-        "gender": {"$ne": "org"}
-    }},
-    {"$addFields": {
-        "age": {"$subtract": [
-            {"$toInt": {"$substr": ["$prizes.year", 0, 4]}},
-            {"$toInt": {"$substr": ["$born", 0, 4]}}
-        ]}
-    }},
-    {"$match": {"age": {"$lt": 18}}}
-]
-
-    results = db.collection.aggregate(pipeline)
-    return [doc for doc in results]
+    return _run("laureate_gender", RESULT_SHAPES["laureate_gender"])
+
+def minor_winners(fields=None, batch_size=None):
+    return _run("minor_winners", batch_size=batch_size, fields=fields)
+
+def iter_minor_winners(fields=None, columns=None, chunk_size=None, arrays=False, batch_size=None):
+    # chunks hold tuples of columns, by default the requested fields and the age
+    if chunk_size and columns is None:
+        columns = ("id", "firstname", "surname", "prizes.year", "prizes.category", "age") if fields is None \
+            else (*fields, "age")
+    return stream_rows(_stream("minor_winners", batch_size, fields=fields),
+                       columns if chunk_size else None, chunk_size, arrays)
 
 def category_introduction_year():
-    pipeline = [
-    {"$unwind": "$prizes"},
-    {"$group": {
-        "_id": "$prizes.category",
-        "firstYear": {"$min": "$prizes.year"}
-    }},
-    {"$sort": {"firstYear": 1}}
-]
-
-    results = db.collection.aggregate(pipeline)
-    return {doc["_id"]: doc["firstYear"] for doc in results}
+    return _run("category_introduction_year", RESULT_SHAPES["category_introduction_year"])
 
 def solo_vs_collaborative_prizes():
-    pipeline = [
-    {"$unwind": "$prizes"},
-    {"$group": {
-        "_id": {"year": "$prizes.year", "category": "$prizes.category"},
-        "winners": {"$sum": 1}
-    }},
-    {"$addFields": {
-        "type": {"$cond": [{"$eq": ["$winners", 1]}, "solo", "collaborative"]}
-    }},
-    {"$group": {
-        "_id": {
-            "decade": {"$subtract": [{"$toInt": "$_id.year"}, {"$mod": [{"$toInt": "$_id.year"}, 10]}]},
-            "type": "$type"
-        },
-        "count": {"$sum": 1}
-    }},
-    {"$sort": {"_id.decade": 1, "_id.type": 1}}
-]
-
-    results = db.collection.aggregate(pipeline)
-    return {(doc["_id"]["decade"], doc["_id"]["type"]): doc["count"] for doc in results}
+    return _run_groups("solo_vs_collaborative_prizes",
+                lambda results: {(doc["_id"]["decade"], doc["_id"]["type"]): doc["count"] for doc in results})
 
 def avg_winners_per_category():
-    pipeline = [
-    {"$unwind": "$prizes"},
-    {"$group": {
-        "_id": {"year": "$prizes.year", "category": "$prizes.category"},
-        "winnersCount": {"$sum": 1}
-    }},
-    {"$group": {
-        "_id": "$_id.category",
-        "one_winner":    {"$sum": {"$cond": [{"$eq": ["$winnersCount", 1]}, 1, 0]}},
-        "two_winners":   {"$sum": {"$cond": [{"$eq": ["$winnersCount", 2]}, 1, 0]}},
-        "three_winners": {"$sum": {"$cond": [{"$eq": ["$winnersCount", 3]}, 1, 0]}}
-    }},
-    {"$sort": {"_id": 1}}
-]
-
-    results = db.collection.aggregate(pipeline)
-    return {doc["_id"]: {"one_winner": doc["one_winner"], "two_winners": doc["two_winners"], "three_winners": doc["three_winners"]} for doc in results}
+    return _run_groups("category_winner_counts",
+                       lambda results: {doc["_id"]: {"one_winner": doc["one_winner"], "two_winners": doc["two_winners"],
+                                                     "three_winners": doc["three_winners"],
+                                                     "four_or_more_winners": doc["four_or_more_winners"]}
+                                        for doc in results})
 
 def categories_split():
-    pipeline = [
-    {"$unwind": "$prizes"},
-    {"$group": {
-        "_id": {"year": "$prizes.year", "category": "$prizes.category"},
-        "shares": {"$push": "$prizes.share"},
-        "category": {"$first": "$prizes.category"}
-    }},
-    {"$addFields": {
-        "isUneven": {"$gt": [{"$size": {"$setUnion": ["$shares", []]}}, 1]}
-    }},
-    {"$match": {"isUneven": True}},
-    {"$group": {
-        "_id": "$category",
-        "unevenCount": {"$sum": 1}
-    }},
-    {"$sort": {"unevenCount": -1}}
-]
-
-    results = db.collection.aggregate(pipeline)
-    return {doc["_id"]: doc["unevenCount"] for doc in results}
-
-def category_winners(category):
-    results = db.collection.find(
-    {"prizes.motivation": {"$regex": category, "$options": "i"}},
-    {"firstname": 1, "surname": 1, "prizes.year": 1, "prizes.category": 1, "prizes.motivation": 1}
-    )
-
-    return [doc for doc in results]
+    return _run_groups("categories_split", lambda results: {doc["_id"]: doc["unevenCount"] for doc in results})
+
+_motivation_index = None
+
+def motivation_index():
+    # the persisted inverted index, so keyword searches do not scan every motivation with $regex
+    global _motivation_index
+    if _motivation_index is None:
+        _motivation_index = build_motivation_index(db)
+    return _motivation_index
+
+def category_winners(category, fields=CATEGORY_WINNER_FIELDS, batch_size=None):
+    # category is a search_motivations query whose last word is a prefix, like the $regex this replaces,
+    # so "physic" still finds physics; the pipeline fetches the matching laureates by id
+    laureate_ids = motivation_index().laureate_ids(prefix_query(category))
+    return _run("category_winners", batch_size=batch_size, laureate_ids=laureate_ids, fields=fields)
+
+def iter_category_winners(category, fields=CATEGORY_WINNER_FIELDS, columns=None, chunk_size=None, arrays=False,
+                          batch_size=None):
+    # prizes.* columns hold the list of values of all of a laureate's prizes
+    laureate_ids = motivation_index().laureate_ids(prefix_query(category))
+    return stream_rows(_stream("category_winners", batch_size, laureate_ids=laureate_ids, fields=fields),
+                       (columns or fields) if chunk_size else None, chunk_size, arrays)
+
+def search_motivations(query, limit=10, category=None):
+    return motivation_index().search(query, limit, category)
 
 def country_decades_winners():
-    pipeline = [
-    {"$match": {"bornCountry": {"$exists": True}}},
-    {"$unwind": "$prizes"},
-    {"$group": {
-        "_id": {
-            "country": "$bornCountry",
-            "decade": {
-                "$subtract": [{"$toInt": "$prizes.year"}, {"$mod": [{"$toInt": "$prizes.year"}, 10]}]
-            }
-        },
-        "count": {"$sum": 1}
-    }},
-    {"$sort": {"_id.decade": 1}}
-]
-
-    results = list(db.collection.aggregate(pipeline))
-    return {(doc["_id"]["country"], doc["_id"]["decade"]): doc["count"] for doc in results}
+    return _run("country_decades_winners",
+                lambda results: {(doc["_id"]["country"], doc["_id"]["decade"]): doc["count"] for doc in results})
+
+def iter_country_decades_winners(chunk_size=None, arrays=False, batch_size=None):
+    # yields (country, decade, count) tuples
+    rows = ((doc["_id"]["country"], doc["_id"]["decade"], doc["count"])
+            for doc in _stream("country_decades_winners", batch_size))
+    return stream_rows(rows, None, chunk_size, arrays)
 
 
 def age_histogram(data):
     # data is the dictionary from ages_of_laureates()
-    labels = list(data.keys())
-    counts = list(data.values())
-
-    plt.bar(labels, counts, color="steelblue", edgecolor="black")
-    plt.xlabel("Age of Winners")
-    plt.ylabel("Number of Winners")
-    plt.title("Nobel Prize Laureates by Age")
-    plt.show()
-
-# stacked bar chart for each category showing proportions of prizes with one, two, and three winners
-def category_winners(data):
-    categories = [doc["_id"] for doc in data]
-    one =   [doc["one_winner"] for doc in data]
-    two =   [doc["two_winners"] for doc in data]
-    three = [doc["three_winners"] for doc in data]
-
-    x = range(len(categories))
-
-    plt.figure(figsize=(14, 6))
-    plt.bar(x, one,   label="1 Winner", color="steelblue")
-    plt.bar(x, two,   label="2 Winners", color="orange",   bottom=one)
-    plt.bar(x, three, label="3 Winners", color="green",    bottom=[o + t for o, t in zip(one, two)])
-    plt.xticks(x, categories, rotation=45, ha="right")
-    plt.xlabel("Category")
-    plt.ylabel("Number of Prizes")
-    plt.title("Nobel Prize Winners per Prize by Category")
-    plt.legend()
-    plt.show()
-
-# scatterplot with year on x axis and age on y axis, could plot linreg line of best fit
-def age_over_time(data):
-    years = [doc["year"] for doc in data]
-    ages = [doc["age"] for doc in data]
-    slope, intercept, r, p, se = stats.linregress(years, ages)
-    line = [slope * y + intercept for y in sorted(years)]
-
-    plt.figure(figsize=(14, 6))
-    plt.scatter(years, ages, alpha=0.4, color="steelblue", label="Winners")
-    plt.plot(sorted(years), line, color="red", label=f"Best fit (r={r:.2f})")
-    plt.xlabel("Year")
-    plt.ylabel("Age at Time of Winning")
-    plt.title("Nobel Prize Winner Age Over Time")
-    plt.legend()
-    plt.show()
-
+    charts.show("age_histogram", data)
+
+# stacked bar chart for each category showing proportions of prizes with one, two, three and four or more winners
+def category_winners_plot(data):
+    charts.show("category_winners", data)
+
+# scatterplot with year on x axis and age on y axis and the linreg line of best fit;
+# mode "hexbin" or "density" bins the points for large datasets, "auto" picks by size
+def age_over_time(data, mode="auto"):
+    # data is the list of (year, age) tuples from laureate_ages_yearly()
+    charts.show("age_over_time", ([year for year, _ in data], [age for _, age in data]), mode=mode)
+
+# the (year, age) rows binned as they are read in chunks, so memory does not grow with the number of prizes
+def age_density(chunk_size=100000, batch_size=None):
+    rows = stream_rows(_stream("laureate_ages_yearly", batch_size), ("year", "age"), chunk_size, arrays=True)
+    return AgeDensity.from_chunks(rows)
+
+# binned age over time, for datasets too large to hold every (year, age) pair
+def age_over_time_density(chunk_size=100000, batch_size=None):
+    charts.show("age_over_time", age_density(chunk_size, batch_size))
+
+# writes the charts as png files without opening a window, rendering them in parallel
+def render_report(directory="report", cache="chart_cache"):
+    jobs = [
+        ChartJob("age_histogram", ages_of_laureates(), f"{directory}/age_histogram.png"),
+        ChartJob("category_winners", _run_groups("category_winner_counts"), f"{directory}/category_winners.png"),
+        ChartJob("age_over_time", age_density(), f"{directory}/age_over_time.png"),
+    ]
+    return ReportRenderer(cache).render_many(jobs)
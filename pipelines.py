@@ -0,0 +1,772 @@
+"""
+Registry of the aggregation pipelines behind NobelAPI and nobel_prize_collection.py. Filters on top-level
+laureate fields come before $unwind so the planner can answer them from the indexes in indexes.py, and a
+$project keeping only the fields a pipeline reads follows right after, so $unwind copies small documents
+instead of whole laureates with every prize and affiliation.
+
+PIPELINES holds the pipelines over the laureate collection. FACT_PIPELINES computes the same results from
+the prize_facts collection (see prize_facts.py), which already holds one typed row per prize, and
+GROUP_PIPELINES computes the co-winner and share analyses from the prize_groups collection, which holds
+one row per (year, category) prize.
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from loader import HASH_FIELD
+
+# the most built pipelines kept per registry; parameters such as limit come from callers, so every
+# distinct value would otherwise stay in memory for good
+BUILD_CACHE_SIZE = 256
+
+
+class PipelineRegistry(dict):
+    """
+    Dictionary of pipeline names and builder functions. Built pipelines are kept for the BUILD_CACHE_SIZE
+    most recently used sets of parameters, and the time spent running each one is recorded.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._built = OrderedDict()
+        self._timings = {}
+        self._lock = threading.Lock()
+
+    def register(self, name=None):
+        """
+        Decorator adding a builder to the registry
+        :param name: name of the pipeline, defaults to the builder's name
+        """
+        def decorator(builder):
+            self[name or builder.__name__] = builder
+            return builder
+        return decorator
+
+    def build(self, name, **params):
+        """
+        Returns the pipeline for a set of parameters, building it on first use. The same list is handed
+        out on every call, so callers must not modify it.
+        :param name: name of the pipeline
+        :param params: keyword arguments of the builder
+        :return: list of aggregation stages
+        """
+        key = (name, tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in params.items())))
+        with self._lock:
+            pipeline = self._built.get(key)
+            if pipeline is not None:
+                self._built.move_to_end(key)
+                return pipeline
+        pipeline = self[name](**params)
+        with self._lock:
+            self._built[key] = pipeline
+            while len(self._built) > BUILD_CACHE_SIZE:
+                self._built.popitem(last=False)
+        return pipeline
+
+    def record(self, name, seconds):
+        """
+        Adds one run of a pipeline to its timings
+        :param name: name of the pipeline
+        :param seconds: wall time of the run
+        :return: None
+        """
+        with self._lock:
+            calls, total, longest = self._timings.get(name, (0, 0.0, 0.0))
+            self._timings[name] = (calls + 1, total + seconds, max(longest, seconds))
+
+    @contextmanager
+    def timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def run(self, collection, name, shape=list, batch_size=None, instrumentation=None, **params):
+        """
+        Runs a pipeline and shapes its results, recording the time taken including reading the cursor
+        :param collection: the collection to aggregate
+        :param name: name of the pipeline
+        :param shape: function turning the cursor into the result, defaults to list
+        :param batch_size: documents per cursor batch, defaults to the server's
+        :param instrumentation: instrumentation.Instrumentation that also records the call, defaults to None
+        :param params: keyword arguments of the builder
+        :return: the shaped result
+        """
+        with self.timed(name):
+            if instrumentation is not None and instrumentation.enabled:
+                return instrumentation.aggregate(collection, name, self.build(name, **params), params, shape, batch_size)
+            options = {} if batch_size is None else {"batchSize": batch_size}
+            return shape(collection.aggregate(self.build(name, **params), **options))
+
+    def stream(self, collection, name, batch_size=None, instrumentation=None, **params):
+        """
+        Runs a pipeline and yields its documents as the cursor returns them. The time is recorded when the
+        generator is exhausted or closed.
+        :param collection: the collection to aggregate
+        :param name: name of the pipeline
+        :param batch_size: documents per cursor batch, defaults to the server's
+        :param instrumentation: instrumentation.Instrumentation that also records the call, defaults to None
+        :param params: keyword arguments of the builder
+        :return: generator of documents
+        """
+        if instrumentation is not None and instrumentation.enabled:
+            with self.timed(name):
+                yield from instrumentation.stream(collection, name, self.build(name, **params), params, batch_size)
+            return
+        options = {} if batch_size is None else {"batchSize": batch_size}
+        with self.timed(name):
+            cursor = collection.aggregate(self.build(name, **params), **options)
+            try:
+                yield from cursor
+            finally:
+                cursor.close()
+
+    def timings(self):
+        """
+        :return: dictionary of pipeline names and their number of calls, total, mean and max seconds
+        """
+        with self._lock:
+            return {name: {"calls": calls, "total": total, "mean": total / calls, "max": longest}
+                    for name, (calls, total, longest) in self._timings.items()}
+
+    def reset_timings(self):
+        with self._lock:
+            self._timings.clear()
+
+
+PIPELINES = PipelineRegistry()
+FACT_PIPELINES = PipelineRegistry()
+GROUP_PIPELINES = PipelineRegistry()
+
+KNOWN_BIRTH = {"born": {"$exists": True, "$ne": "0000-00-00"}, "gender": {"$ne": "org"}}
+
+def projection(fields, *required):
+    """
+    :param fields: field names or dotted paths to keep, None for every field
+    :param required: fields kept as well because a later stage reads them
+    :return: $project specification. _id is left out unless it is listed, and the content hash the loader
+             stores is never returned. A path under another listed field, such as "prizes.year" with
+             "prizes", is dropped, as MongoDB rejects the pair as a path collision.
+    """
+    if fields is None:
+        return {HASH_FIELD: 0}
+    paths = dict.fromkeys((*fields, *required))
+    spec = {"_id": 0}
+    spec.update((path, 1) for path in paths if not any(path.startswith(f"{parent}.") for parent in paths))
+    return spec
+
+
+def project(*fields):
+    """
+    :param fields: field names or dotted paths the rest of a pipeline reads
+    :return: $project stage keeping only those fields
+    """
+    return {"$project": projection(fields)}
+
+
+def select_fields(document, fields):
+    """
+    Applies an inclusion projection to a document in Python, the way $project would
+    :param document: dictionary
+    :param fields: field names or dotted paths to keep, None for every field
+    :return: new dictionary with only the listed fields
+    """
+    if fields is None:
+        return document
+    paths = {}
+    for field in fields:
+        head, _, rest = field.partition(".")
+        paths.setdefault(head, []).append(rest)
+    result = {}
+    for head, rests in paths.items():
+        if head not in document:
+            continue
+        value = document[head]
+        nested = [rest for rest in rests if rest]
+        if nested and len(nested) == len(rests):
+            if isinstance(value, list):
+                value = [select_fields(v, nested) for v in value if isinstance(v, dict)]
+            elif isinstance(value, dict):
+                value = select_fields(value, nested)
+            else:
+                continue
+        result[head] = value
+    return result
+
+
+def field_value(document, path):
+    """
+    :param document: dictionary
+    :param path: field name or dotted path such as "prizes.year"
+    :return: the value at the path, None if any part is missing. A path through an array gives the list
+             of values of its elements, the way $project does.
+    """
+    head, _, rest = path.partition(".")
+    if isinstance(document, list):
+        return [field_value(item, path) for item in document]
+    if not isinstance(document, dict):
+        return None
+    value = document.get(head)
+    return field_value(value, rest) if rest and value is not None else value
+
+
+def stream_rows(rows, columns=None, chunk_size=None, arrays=False):
+    """
+    Lazily reshapes a stream of result rows
+    :param rows: iterable of documents, or of tuples when columns is None
+    :param columns: field names or dotted paths taken from each document, in order; None when the rows
+                    are tuples already
+    :param chunk_size: yield lists of up to chunk_size rows instead of single rows, defaults to None
+    :param arrays: with chunk_size, yield each chunk as a tuple of NumPy arrays, one per column,
+                   instead of a list of tuples, defaults to False
+    :return: generator of rows, or of chunks
+    """
+    if columns is not None:
+        rows = (tuple(field_value(row, column) for column in columns) for row in rows)
+    if chunk_size is None:
+        yield from rows
+        return
+    if arrays:
+        import numpy as np
+    iterator = iter(rows)
+    while chunk := list(itertools.islice(iterator, chunk_size)):
+        yield tuple(np.array(column) for column in zip(*chunk)) if arrays else chunk
+
+
+AGE = {"$subtract": [
+    {"$toInt": {"$substr": ["$prizes.year", 0, 4]}},
+    {"$toInt": {"$substr": ["$born", 0, 4]}}
+]}
+
+
+@PIPELINES.register()
+def top_countries(limit=10):
+    """
+    :param limit: the number of countries returned, defaults to 10
+    :return: pipeline counting laureates per birth country
+    """
+    return [
+        {"$match": {"bornCountry": {"$exists": True}}},
+        project("bornCountry"),
+        {"$group": {"_id": "$bornCountry", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}},
+        {"$limit": limit}
+    ]
+
+
+@PIPELINES.register()
+def top_categories():
+    """
+    :return: pipeline counting prizes per category
+    """
+    return [
+        project("prizes.category"),
+        {"$unwind": "$prizes"},
+        {"$group": {"_id": "$prizes.category", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}}
+    ]
+
+
+@PIPELINES.register()
+def most_prizes_per_year(limit=10):
+    """
+    :param limit: the number of years returned, defaults to 10
+    :return: pipeline counting prizes per year
+    """
+    return [
+        project("prizes.year"),
+        {"$unwind": "$prizes"},
+        {"$group": {"_id": "$prizes.year", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}},
+        {"$limit": limit}
+    ]
+
+
+@PIPELINES.register()
+def laureate_gender():
+    """
+    :return: pipeline counting laureates per gender
+    """
+    return [
+        project("gender"),
+        {"$group": {"_id": "$gender", "count": {"$sum": 1}}}
+    ]
+
+
+@PIPELINES.register()
+def laureate_ages_yearly():
+    """
+    :return: pipeline projecting the prize year and the laureate's age for every prize
+    """
+    return [
+        {"$match": KNOWN_BIRTH},
+        project("born", "prizes.year"),
+        {"$unwind": "$prizes"},
+        {"$project": {
+            "_id": 0,
+            "year": {"$toInt": "$prizes.year"},
+            "age": AGE
+        }}
+    ]
+
+
+@PIPELINES.register()
+def ages_of_laureates():
+    """
+    :return: pipeline counting prizes per 5 year age bucket
+    """
+    return [
+        {"$match": KNOWN_BIRTH},
+        project("born", "prizes.year"),
+        {"$unwind": "$prizes"},
+        {"$addFields": {"age": AGE}},
+        {"$bucket": {
+            "groupBy": "$age",
+            "boundaries": list(range(0, 105, 5)),
+            "default": "other",
+            "output": {"count": {"$sum": 1}}
+        }}
+    ]
+
+
+@PIPELINES.register()
+def minor_winners(fields=None):
+    """
+    :param fields: laureate fields or dotted paths such as "prizes.year" to return, defaults to the whole
+                   document. The age is always added.
+    :return: pipeline selecting the prizes won by laureates under 18
+    """
+    if fields is None:
+        return [
+            {"$match": KNOWN_BIRTH},
+            {"$unwind": "$prizes"},
+            {"$addFields": {"age": AGE}},
+            {"$match": {"age": {"$lt": 18}}},
+            {"$project": projection(None)}
+        ]
+    return [
+        {"$match": KNOWN_BIRTH},
+        {"$project": projection(fields, "born", "prizes.year")},
+        {"$unwind": "$prizes"},
+        {"$addFields": {"age": AGE}},
+        {"$match": {"age": {"$lt": 18}}},
+        {"$project": projection(fields, "age")}
+    ]
+
+
+@PIPELINES.register()
+def category_introduction_year():
+    """
+    :return: pipeline finding the first year each category was awarded
+    """
+    return [
+        project("prizes.category", "prizes.year"),
+        {"$unwind": "$prizes"},
+        {"$group": {
+            "_id": "$prizes.category",
+            "firstYear": {"$min": "$prizes.year"}
+        }},
+        {"$sort": {"firstYear": 1}}
+    ]
+
+
+@PIPELINES.register()
+def top_category_per_country(limit=10):
+    """
+    :param limit: the number of countries returned, defaults to 10
+    :return: pipeline finding the most awarded category for each birth country
+    """
+    return [
+        {"$match": {"bornCountry": {"$exists": True}}},
+        project("bornCountry", "prizes.category"),
+        {"$unwind": "$prizes"},
+        {"$group": {
+            "_id": {"country": "$bornCountry", "category": "$prizes.category"},
+            "count": {"$sum": 1}
+        }},
+        {"$sort": {"_id.country": 1, "count": -1}},
+        {"$group": {
+            "_id": "$_id.country",
+            "topCategory": {"$first": "$_id.category"},
+            "count": {"$first": "$count"}
+        }},
+        {"$sort": {"count": -1}},
+        {"$limit": limit}
+    ]
+
+
+@PIPELINES.register()
+def category_winner_counts():
+    """
+    :return: pipeline counting the prizes in each category shared by one, two, three and four or more winners
+    """
+    return [
+        project("prizes.year", "prizes.category"),
+        {"$unwind": "$prizes"},
+        {"$group": {
+            "_id": {"year": "$prizes.year", "category": "$prizes.category"},
+            "winnersCount": {"$sum": 1}
+        }},
+        {"$group": {
+            "_id": "$_id.category",
+            "one_winner": {"$sum": {"$cond": [{"$eq": ["$winnersCount", 1]}, 1, 0]}},
+            "two_winners": {"$sum": {"$cond": [{"$eq": ["$winnersCount", 2]}, 1, 0]}},
+            "three_winners": {"$sum": {"$cond": [{"$eq": ["$winnersCount", 3]}, 1, 0]}},
+            "four_or_more_winners": {"$sum": {"$cond": [{"$gte": ["$winnersCount", 4]}, 1, 0]}}
+        }},
+        {"$sort": {"_id": 1}}
+    ]
+
+
+@PIPELINES.register()
+def age_ranges():
+    """
+    :return: pipeline counting prizes per 5 year age bucket, labelled like "20-24"
+    """
+    return ages_of_laureates() + [
+        {"$project": {
+            "age_range": {"$concat": [{"$toString": "$_id"}, "-", {"$toString": {"$add": ["$_id", 4]}}]},
+            "count": 1,
+            "_id": 0
+        }}
+    ]
+
+
+@PIPELINES.register()
+def solo_vs_collaborative_prizes():
+    """
+    :return: pipeline counting solo and shared prizes per decade
+    """
+    return [
+        project("prizes.year", "prizes.category"),
+        {"$unwind": "$prizes"},
+        {"$group": {
+            "_id": {"year": "$prizes.year", "category": "$prizes.category"},
+            "winners": {"$sum": 1}
+        }},
+        {"$addFields": {
+            "type": {"$cond": [{"$eq": ["$winners", 1]}, "solo", "collaborative"]}
+        }},
+        {"$group": {
+            "_id": {
+                "decade": {"$subtract": [{"$toInt": "$_id.year"}, {"$mod": [{"$toInt": "$_id.year"}, 10]}]},
+                "type": "$type"
+            },
+            "count": {"$sum": 1}
+        }},
+        {"$sort": {"_id.decade": 1, "_id.type": 1}}
+    ]
+
+
+@PIPELINES.register()
+def categories_split():
+    """
+    :return: pipeline counting the prizes in each category whose winners got different shares
+    """
+    return [
+        project("prizes.year", "prizes.category", "prizes.share"),
+        {"$unwind": "$prizes"},
+        {"$group": {
+            "_id": {"year": "$prizes.year", "category": "$prizes.category"},
+            "shares": {"$push": "$prizes.share"},
+            "category": {"$first": "$prizes.category"}
+        }},
+        {"$addFields": {
+            "isUneven": {"$gt": [{"$size": {"$setUnion": ["$shares", []]}}, 1]}
+        }},
+        {"$match": {"isUneven": True}},
+        {"$group": {
+            "_id": "$category",
+            "unevenCount": {"$sum": 1}
+        }},
+        {"$sort": {"unevenCount": -1}}
+    ]
+
+
+CATEGORY_WINNER_FIELDS = ("_id", "firstname", "surname", "prizes.year", "prizes.category", "prizes.motivation")
+
+
+@PIPELINES.register()
+def category_winners(laureate_ids, fields=CATEGORY_WINNER_FIELDS):
+    """
+    :param laureate_ids: ids of the laureates with a matching motivation, from MotivationIndex.laureate_ids,
+                         so the match uses the unique id index instead of scanning every motivation
+    :param fields: laureate fields or dotted paths to return, defaults to the names and the year, category
+                   and motivation of every prize
+    :return: pipeline selecting the laureates with a matching motivation
+    """
+    return [
+        {"$match": {"id": {"$in": list(laureate_ids)}}},
+        {"$project": projection(fields)}
+    ]
+
+
+@PIPELINES.register()
+def country_decades_winners():
+    """
+    :return: pipeline counting prizes per birth country and decade
+    """
+    return [
+        {"$match": {"bornCountry": {"$exists": True}}},
+        project("bornCountry", "prizes.year"),
+        {"$unwind": "$prizes"},
+        {"$group": {
+            "_id": {
+                "country": "$bornCountry",
+                "decade": {
+                    "$subtract": [{"$toInt": "$prizes.year"}, {"$mod": [{"$toInt": "$prizes.year"}, 10]}]
+                }
+            },
+            "count": {"$sum": 1}
+        }},
+        {"$sort": {"_id.decade": 1}}
+    ]
+
+
+@PIPELINES.register()
+def prize_table():
+    """
+    :return: pipeline turning every laureate-prize into a flat row with the columns of export.PRIZE_COLUMNS
+    """
+    return [
+        project("id", "gender", "bornCountry", "born", "prizes.year", "prizes.category", "prizes.share"),
+        {"$unwind": "$prizes"},
+        {"$project": {
+            "_id": 0,
+            "laureate_id": "$id",
+            "gender": 1,
+            "country": "$bornCountry",
+            "category": "$prizes.category",
+            "year": {"$toInt": {"$substr": ["$prizes.year", 0, 4]}},
+            "birth_year": {"$cond": [
+                {"$eq": [{"$ifNull": ["$born", "0000-00-00"]}, "0000-00-00"]},
+                None,
+                {"$toInt": {"$substr": ["$born", 0, 4]}}
+            ]},
+            "share": {"$toInt": "$prizes.share"}
+        }}
+    ]
+
+
+@FACT_PIPELINES.register("prize_table")
+def facts_prize_table():
+    """
+    :return: pipeline reading the rows of export.PRIZE_COLUMNS from prize_facts
+    """
+    return [
+        {"$project": {"_id": 0, "laureate_id": 1, "gender": 1, "country": 1, "category": 1, "year": 1,
+                      "birth_year": 1, "share": 1}}
+    ]
+
+
+@FACT_PIPELINES.register("top_categories")
+def facts_top_categories():
+    """
+    :return: pipeline counting prizes per category from prize_facts
+    """
+    return [
+        {"$group": {"_id": "$category", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}}
+    ]
+
+
+@FACT_PIPELINES.register("most_prizes_per_year")
+def facts_most_prizes_per_year(limit=10):
+    """
+    :param limit: the number of years returned, defaults to 10
+    :return: pipeline counting prizes per year from prize_facts
+    """
+    return [
+        {"$group": {"_id": "$year", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}},
+        {"$limit": limit},
+        {"$set": {"_id": {"$toString": "$_id"}}}
+    ]
+
+
+@FACT_PIPELINES.register("laureate_ages_yearly")
+def facts_laureate_ages_yearly():
+    """
+    :return: pipeline projecting the prize year and the laureate's age for every prize from prize_facts
+    """
+    return [
+        {"$match": {"age": {"$ne": None}, "gender": {"$ne": "org"}}},
+        {"$project": {"_id": 0, "year": 1, "age": 1}}
+    ]
+
+
+@FACT_PIPELINES.register("ages_of_laureates")
+def facts_ages_of_laureates():
+    """
+    :return: pipeline counting prizes per 5 year age bucket from prize_facts
+    """
+    return [
+        {"$match": {"age": {"$ne": None}, "gender": {"$ne": "org"}}},
+        {"$bucket": {
+            "groupBy": "$age",
+            "boundaries": list(range(0, 105, 5)),
+            "default": "other",
+            "output": {"count": {"$sum": 1}}
+        }}
+    ]
+
+
+@FACT_PIPELINES.register("minor_winners")
+def facts_minor_winners(collection_name="collection", fields=None):
+    """
+    :param collection_name: name of the laureate collection the full documents come from
+    :param fields: laureate fields or dotted paths such as "prizes.year" to return, defaults to the whole
+                   document. The age is always added.
+    :return: pipeline selecting the prizes won by laureates under 18 from prize_facts, shaped like
+             the rows of minor_winners
+    """
+    lookup = {"from": collection_name, "localField": "laureate_id", "foreignField": "id", "as": "laureate",
+              "pipeline": [{"$project": projection(fields)}]}
+    pipeline = [
+        {"$match": {"age": {"$lt": 18}, "gender": {"$ne": "org"}}},
+        {"$project": {"laureate_id": 1, "age": 1}},
+        {"$lookup": lookup},
+        {"$unwind": "$laureate"},
+        {"$replaceRoot": {"newRoot": {"$mergeObjects": [
+            "$laureate",
+            {"prizes": {"$arrayElemAt": ["$laureate.prizes", "$_id.prize"]}, "age": "$age"}
+        ]}}}
+    ]
+    if fields is not None and not any(field.split(".")[0] == "prizes" for field in fields):
+        pipeline.append({"$unset": "prizes"})
+    return pipeline
+
+
+@FACT_PIPELINES.register("category_introduction_year")
+def facts_category_introduction_year():
+    """
+    :return: pipeline finding the first year each category was awarded from prize_facts
+    """
+    return [
+        {"$group": {"_id": "$category", "firstYear": {"$min": "$year"}}},
+        {"$sort": {"firstYear": 1}},
+        {"$set": {"firstYear": {"$toString": "$firstYear"}}}
+    ]
+
+
+@FACT_PIPELINES.register("top_category_per_country")
+def facts_top_category_per_country(limit=10):
+    """
+    :param limit: the number of countries returned, defaults to 10
+    :return: pipeline finding the most awarded category for each birth country from prize_facts
+    """
+    return [
+        {"$match": {"country": {"$exists": True}}},
+        {"$group": {
+            "_id": {"country": "$country", "category": "$category"},
+            "count": {"$sum": 1}
+        }},
+        {"$sort": {"_id.country": 1, "count": -1}},
+        {"$group": {
+            "_id": "$_id.country",
+            "topCategory": {"$first": "$_id.category"},
+            "count": {"$first": "$count"}
+        }},
+        {"$sort": {"count": -1}},
+        {"$limit": limit}
+    ]
+
+
+@FACT_PIPELINES.register("category_winner_counts")
+def facts_category_winner_counts():
+    """
+    :return: pipeline counting the prizes in each category shared by one, two, three and four or more
+             winners from prize_facts
+    """
+    return [
+        {"$group": {
+            "_id": {"year": "$year", "category": "$category"},
+            "winnersCount": {"$sum": 1}
+        }},
+        {"$group": {
+            "_id": "$_id.category",
+            "one_winner": {"$sum": {"$cond": [{"$eq": ["$winnersCount", 1]}, 1, 0]}},
+            "two_winners": {"$sum": {"$cond": [{"$eq": ["$winnersCount", 2]}, 1, 0]}},
+            "three_winners": {"$sum": {"$cond": [{"$eq": ["$winnersCount", 3]}, 1, 0]}},
+            "four_or_more_winners": {"$sum": {"$cond": [{"$gte": ["$winnersCount", 4]}, 1, 0]}}
+        }},
+        {"$sort": {"_id": 1}}
+    ]
+
+
+@GROUP_PIPELINES.register("category_winner_counts")
+def groups_category_winner_counts():
+    """
+    :return: pipeline counting the prizes in each category shared by one, two, three and four or more
+             winners from prize_groups
+    """
+    return [
+        {"$group": {
+            "_id": "$category",
+            "one_winner": {"$sum": {"$cond": [{"$eq": ["$winners", 1]}, 1, 0]}},
+            "two_winners": {"$sum": {"$cond": [{"$eq": ["$winners", 2]}, 1, 0]}},
+            "three_winners": {"$sum": {"$cond": [{"$eq": ["$winners", 3]}, 1, 0]}},
+            "four_or_more_winners": {"$sum": {"$cond": [{"$gte": ["$winners", 4]}, 1, 0]}}
+        }},
+        {"$sort": {"_id": 1}}
+    ]
+
+
+@GROUP_PIPELINES.register("solo_vs_collaborative_prizes")
+def groups_solo_vs_collaborative_prizes():
+    """
+    :return: pipeline counting solo and shared prizes per decade from prize_groups
+    """
+    return [
+        {"$group": {
+            "_id": {"decade": "$decade", "type": {"$cond": [{"$eq": ["$winners", 1]}, "solo", "collaborative"]}},
+            "count": {"$sum": 1}
+        }},
+        {"$sort": {"_id.decade": 1, "_id.type": 1}}
+    ]
+
+
+@GROUP_PIPELINES.register("categories_split")
+def groups_categories_split():
+    """
+    :return: pipeline counting the prizes in each category whose winners got different shares from prize_groups
+    """
+    return [
+        {"$match": {"uneven": True}},
+        {"$group": {"_id": "$category", "unevenCount": {"$sum": 1}}},
+        {"$sort": {"unevenCount": -1}}
+    ]
+
+
+def facet_pipeline(pipeline):
+    """
+    Rewrites a pipeline to run as one branch of batch_pipeline, where every prize is already unwound
+    into its own document and laureates without prizes are kept once with prize_index null
+    :param pipeline: one of the pipelines above
+    :return: the pipeline for a $facet branch
+    """
+    unwind = [i for i, stage in enumerate(pipeline) if "$unwind" in stage]
+    if not unwind:
+        # a laureate level query only looks at the first row of each laureate, which is enough for
+        # the pipelines above since none of them read prizes without unwinding it first
+        return [{"$match": {"prize_index": {"$in": [0, None]}}}] + pipeline
+    i = unwind[0]
+    return ([{"$match": {"prize_index": {"$ne": None}}}] + pipeline[:i] +
+            [{"$project": {"prize_index": 0}}] + pipeline[i + 1:])
+
+
+def batch_pipeline(facets):
+    """
+    :param facets: dictionary of output names and pipelines made with facet_pipeline
+    :return: pipeline that unwinds the prizes once and runs every facet over the result, producing a
+             single document of output names and result lists. That document is limited to 16 MB, so
+             batches suit the summary queries rather than large row listings.
+    """
+    return [
+        {"$unwind": {"path": "$prizes", "includeArrayIndex": "prize_index", "preserveNullAndEmptyArrays": True}},
+        {"$facet": facets}
+    ]
+
@@ -0,0 +1,140 @@
+"""
+Materializes one row per laureate-prize into the prize_facts collection so the NobelAPI aggregations
+can skip the $unwind and the string parsing of years on every call.
+
+A row looks like
+{"_id": {"laureate": "6", "prize": 1}, "laureate_id": "6", "gender": "female", "country": "Russian Empire (now Poland)",
+ "category": "chemistry", "year": 1911, "birth_year": 1867, "age": 44, "decade": 1910, "share": 1}
+birth_year and age are null when the birth date is unknown and country is missing when bornCountry is.
+
+The prize_groups collection holds one row per (year, category) prize, so the co-winner and share analyses
+read a few hundred rows instead of regrouping every prize:
+{"_id": {"year": "1903", "category": "physics"}, "year": 1903, "category": "physics", "decade": 1900,
+ "winners": 3, "laureate_ids": ["4", "5", "6"], "shares": [2, 4, 4], "uneven": true}
+shares is sorted, so equal multisets compare equal, and uneven is true when the winners got different shares.
+
+Both need MongoDB 5.2 or later: the groups are sorted with $sortArray, the builds write with $merge into the
+same database, and the facts version of minor_winners runs a $lookup with both localField and a pipeline,
+which needs 5.0. MongoBackend(use_facts=False) runs every query against the laureate collection instead.
+"""
+from pymongo import ASCENDING, IndexModel
+
+from loader import METADATA_COLLECTION, dataset_version
+
+FACTS_COLLECTION = "prize_facts"
+GROUPS_COLLECTION = "prize_groups"
+
+FACT_INDEXES = [
+    IndexModel([("category", ASCENDING), ("year", ASCENDING)], name="category_year"),
+    IndexModel([("country", ASCENDING), ("category", ASCENDING)], name="country_category"),
+    IndexModel([("age", ASCENDING), ("gender", ASCENDING)], name="age_gender"),
+    IndexModel([("laureate_id", ASCENDING)], name="laureate_id"),
+]
+
+GROUP_INDEXES = [
+    IndexModel([("category", ASCENDING), ("year", ASCENDING)], name="category_year"),
+    IndexModel([("decade", ASCENDING)], name="decade"),
+]
+
+
+def facts_pipeline(version, target=FACTS_COLLECTION):
+    """
+    :param version: dataset version stamped on every row so rows from older loads can be removed
+    :param target: name of the collection to merge into, defaults to "prize_facts"
+    :return: pipeline that unwinds the laureate collection into typed prize rows
+    """
+    return [
+        {"$unwind": {"path": "$prizes", "includeArrayIndex": "prize_index"}},
+        {"$project": {
+            "_id": {"laureate": "$id", "prize": "$prize_index"},
+            "laureate_id": "$id",
+            "gender": "$gender",
+            "country": "$bornCountry",
+            "category": "$prizes.category",
+            "year": {"$toInt": {"$substr": ["$prizes.year", 0, 4]}},
+            "birth_year": {"$cond": [
+                {"$eq": [{"$ifNull": ["$born", "0000-00-00"]}, "0000-00-00"]},
+                None,
+                {"$toInt": {"$substr": ["$born", 0, 4]}}
+            ]},
+            "share": {"$toInt": "$prizes.share"},
+            "version": {"$literal": version}
+        }},
+        {"$addFields": {
+            "age": {"$subtract": ["$year", "$birth_year"]},
+            "decade": {"$subtract": ["$year", {"$mod": ["$year", 10]}]}
+        }},
+        {"$merge": {"into": target, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ]
+
+
+def groups_pipeline(version, target=GROUPS_COLLECTION):
+    """
+    :param version: dataset version stamped on every row so rows from older loads can be removed
+    :param target: name of the collection to merge into, defaults to "prize_groups"
+    :return: pipeline that groups the prizes of the laureate collection by year and category
+    """
+    return [
+        {"$project": {"_id": 0, "id": 1, "prizes.year": 1, "prizes.category": 1, "prizes.share": 1}},
+        {"$unwind": "$prizes"},
+        {"$group": {
+            "_id": {"year": "$prizes.year", "category": "$prizes.category"},
+            "winners": {"$sum": 1},
+            "laureate_ids": {"$push": "$id"},
+            "shares": {"$push": {"$toInt": "$prizes.share"}}
+        }},
+        {"$addFields": {
+            "year": {"$toInt": {"$substr": ["$_id.year", 0, 4]}},
+            "category": "$_id.category",
+            "shares": {"$sortArray": {"input": "$shares", "sortBy": 1}},
+            "uneven": {"$gt": [{"$size": {"$setUnion": ["$shares", []]}}, 1]},
+            "version": {"$literal": version}
+        }},
+        {"$addFields": {"decade": {"$subtract": ["$year", {"$mod": ["$year", 10]}]}}},
+        {"$merge": {"into": target, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ]
+
+
+def _materialize(db, collection_name, target, pipeline, indexes, force):
+    """
+    Runs a $merge pipeline from the laureate collection into target unless target already matches the
+    loaded data, then removes rows left over from older loads and records the version in the metadata
+    """
+    version = dataset_version(db, collection_name)
+    if not force and version is not None and dataset_version(db, target) == version:
+        return False
+
+    db[collection_name].aggregate(pipeline(version, target))
+    db[target].delete_many({"version": {"$ne": version}})
+    db[target].create_indexes(indexes)
+    db[METADATA_COLLECTION].update_one(
+        {"_id": target},
+        {"$set": {"source": collection_name, "checksum": version}},
+        upsert=True
+    )
+    return True
+
+
+def build_prize_facts(db, collection_name="collection", target=FACTS_COLLECTION, force=False):
+    """
+    Rebuilds the prize_facts collection from the laureate collection with $merge, then removes rows left
+    over from laureates that no longer exist. Nothing is done if the facts already match the loaded data.
+    :param db: the mongo database
+    :param collection_name: name of the laureate collection, defaults to "collection"
+    :param target: name of the facts collection, defaults to "prize_facts"
+    :param force: rebuild even if the facts are up to date, defaults to False
+    :return: True if the facts were rebuilt, False if they were already up to date
+    """
+    return _materialize(db, collection_name, target, facts_pipeline, FACT_INDEXES, force)
+
+
+def build_prize_groups(db, collection_name="collection", target=GROUPS_COLLECTION, force=False):
+    """
+    Rebuilds the prize_groups collection from the laureate collection, like build_prize_facts
+    :param db: the mongo database
+    :param collection_name: name of the laureate collection, defaults to "collection"
+    :param target: name of the groups collection, defaults to "prize_groups"
+    :param force: rebuild even if the groups are up to date, defaults to False
+    :return: True if the groups were rebuilt, False if they were already up to date
+    """
+    return _materialize(db, collection_name, target, groups_pipeline, GROUP_INDEXES, force)
@@ -0,0 +1,387 @@
+"""
+Keeps the counting aggregates of NobelAPI up to date as laureates change instead of recomputing them:
+    top_countries, top_categories, most_prizes_per_year, laureate_gender, ages_of_laureates,
+    category_introduction_year, top_category_per_country and category_winner_counts
+Every laureate's contribution is remembered, so a changed laureate is subtracted and added again and an
+update costs O(changed laureates). Reads only sort the few distinct countries, categories or years.
+
+Changes come from either source:
+    sync_file(path)        diff a new laureate.json against the laureates counted so far
+    watch(collection)      a change stream on the laureate collection, which needs a replica set
+
+    aggregates = RunningAggregates.from_file("laureate.json")
+    aggregates.sync_file("laureate_2026.json")
+    api = NobelAPI(backend=MaintainedBackend(aggregates, MongoBackend()))
+
+    python running_aggregates.py laureate.json --sync laureate_2026.json
+    python running_aggregates.py --watch --uri mongodb://replica-set-host/
+"""
+import argparse
+import pprint
+import threading
+from collections import Counter
+
+from ages import AGE_BOUNDARIES
+from loader import iter_laureates
+
+SOURCE_PROJECTION = {"_id": 1, "id": 1, "bornCountry": 1, "gender": 1, "born": 1, "prizes.year": 1,
+                     "prizes.category": 1}
+
+WINNER_BUCKETS = ("one_winner", "two_winners", "three_winners", "four_or_more_winners")
+
+MAINTAINED_QUERIES = ("top_countries", "top_categories", "most_prizes_per_year", "laureate_gender",
+                      "ages_of_laureates", "category_introduction_year", "top_category_per_country",
+                      "category_winner_counts")
+
+
+def age_bucket(age, boundaries=AGE_BOUNDARIES):
+    """
+    :param age: age in years
+    :param boundaries: sorted bucket edges, defaults to every 5 years from 0 to 100
+    :return: lower edge of the bucket like the $bucket stage of ages_of_laureates, or "other"
+    """
+    if not boundaries[0] <= age < boundaries[-1]:
+        return "other"
+    for lower, upper in zip(boundaries, boundaries[1:]):
+        if age < upper:
+            return int(lower)
+
+
+def _winner_bucket(winners):
+    return WINNER_BUCKETS[min(winners, 4) - 1]
+
+
+def _contribution(laureate):
+    """
+    The fields of a laureate the aggregates count. Two versions of a laureate with equal contributions
+    count the same, whatever else changed, so they are compared instead of a stored content hash, which
+    an update_one that bypasses the loader leaves stale.
+    """
+    born = laureate.get("born")
+    known_birth = born is not None and born != "0000-00-00" and laureate.get("gender") != "org"
+    prizes = []
+    for prize in laureate.get("prizes", []):
+        year = prize.get("year")
+        age = int(year[:4]) - int(born[:4]) if known_birth and year else None
+        prizes.append((year, prize.get("category"), age))
+    return {
+        "country": laureate.get("bornCountry"),
+        "has_country": "bornCountry" in laureate,
+        "gender": laureate.get("gender"),
+        "prizes": prizes,
+    }
+
+
+class RunningAggregates:
+
+    def __init__(self):
+        """
+        Creates empty aggregates; add laureates with update or build them with from_file or from_collection.
+        Counts that fall to zero stay in the counters and are left out of the results.
+        """
+        self.countries = Counter()
+        self.categories = Counter()
+        self.years = Counter()
+        self.genders = Counter()
+        self.age_buckets = Counter()
+        self.category_years = {}
+        self.country_categories = {}
+        self.group_winners = Counter()
+        self.winner_buckets = {}
+        self.laureates = {}
+        self.changes = 0
+        self._ids = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.laureates)
+
+    @classmethod
+    def from_file(cls, path="laureate.json"):
+        """
+        :param path: laureate.json or laureates_array.json
+        :return: RunningAggregates of the laureates in the file
+        """
+        aggregates = cls()
+        for laureate in iter_laureates(path):
+            aggregates.update(laureate)
+        return aggregates
+
+    @classmethod
+    def from_collection(cls, collection, batch_size=1000):
+        """
+        :param collection: the laureate collection
+        :param batch_size: documents per cursor batch, defaults to 1000
+        :return: RunningAggregates of the laureates in the collection
+        """
+        aggregates = cls()
+        for laureate in collection.find({}, SOURCE_PROJECTION, batch_size=batch_size):
+            aggregates.update(laureate)
+        return aggregates
+
+    def _count(self, contribution, sign):
+        if contribution["has_country"]:
+            self.countries[contribution["country"]] += sign
+        self.genders[contribution["gender"]] += sign
+        for year, category, age in contribution["prizes"]:
+            self.categories[category] += sign
+            self.years[year] += sign
+            self.category_years.setdefault(category, Counter())[year] += sign
+            if contribution["has_country"]:
+                self.country_categories.setdefault(contribution["country"], Counter())[category] += sign
+            if age is not None:
+                self.age_buckets[age_bucket(age)] += sign
+
+            # moving a (year, category) prize from one co-winner bucket to the next
+            buckets = self.winner_buckets.setdefault(category, Counter())
+            winners = self.group_winners[(year, category)]
+            if winners:
+                buckets[_winner_bucket(winners)] -= 1
+            winners += sign
+            if winners:
+                self.group_winners[(year, category)] = winners
+                buckets[_winner_bucket(winners)] += 1
+            else:
+                del self.group_winners[(year, category)]
+
+    def update(self, laureate):
+        """
+        Counts a new laureate, or a changed one in place of its previous version
+        :param laureate: laureate document
+        :return: True if the aggregates changed, False if the laureate was already counted as it is
+        """
+        contribution = _contribution(laureate)
+        laureate_id = laureate["id"]
+        with self._lock:
+            if "_id" in laureate:
+                self._ids[laureate["_id"]] = laureate_id
+            previous = self.laureates.get(laureate_id)
+            if previous == contribution:
+                return False
+            if previous is not None:
+                self._count(previous, -1)
+            self._count(contribution, 1)
+            self.laureates[laureate_id] = contribution
+            self.changes += 1
+            return True
+
+    def remove(self, laureate_id):
+        """
+        Stops counting a laureate
+        :param laureate_id: id of the laureate
+        :return: True if it was counted
+        """
+        with self._lock:
+            previous = self.laureates.pop(laureate_id, None)
+            if previous is None:
+                return False
+            self._count(previous, -1)
+            self.changes += 1
+            return True
+
+    def sync_file(self, path):
+        """
+        Brings the aggregates in line with a new laureate file; only laureates whose counted fields changed
+        are counted again, and laureates missing from the file are removed
+        :param path: laureate.json or laureates_array.json
+        :return: dictionary with the number of updated, removed and unchanged laureates
+        """
+        counts = {"updated": 0, "removed": 0, "unchanged": 0}
+        seen = set()
+        for laureate in iter_laureates(path):
+            seen.add(laureate["id"])
+            counts["updated" if self.update(laureate) else "unchanged"] += 1
+        for laureate_id in [i for i in self.laureates if i not in seen]:
+            self.remove(laureate_id)
+            counts["removed"] += 1
+        return counts
+
+    def apply_change(self, change):
+        """
+        Applies one change stream event of the laureate collection
+        :param change: change document from collection.watch(full_document="updateLookup")
+        :return: True if the aggregates changed
+        """
+        operation = change["operationType"]
+        if operation in ("insert", "replace", "update"):
+            document = change.get("fullDocument")
+            if document is not None:
+                return self.update(document)
+            # updated and deleted again before the lookup; the delete event follows
+            return False
+        if operation == "delete":
+            with self._lock:
+                laureate_id = self._ids.pop(change["documentKey"]["_id"], None)
+            return laureate_id is not None and self.remove(laureate_id)
+        return False
+
+    def map_ids(self, collection, batch_size=1000):
+        """
+        Records the _id of every counted laureate. Delete events carry only the _id, so laureates counted
+        from a file are only removed by them once their _id is known.
+        :param collection: the laureate collection
+        :param batch_size: documents per cursor batch, defaults to 1000
+        :return: number of _ids recorded
+        """
+        mapped = 0
+        with self._lock:
+            for doc in collection.find({}, {"_id": 1, "id": 1}, batch_size=batch_size):
+                if doc.get("id") in self.laureates and doc["_id"] not in self._ids:
+                    self._ids[doc["_id"]] = doc["id"]
+                    mapped += 1
+        return mapped
+
+    def watch(self, collection, resume_after=None, stop=None, on_change=None, start_at_operation_time=None):
+        """
+        Follows the laureate collection's change stream until stop is set or the stream is invalidated,
+        e.g. by dropping the collection. Runs in the calling thread; start it in a thread to maintain the
+        aggregates in the background.
+        To start from a scan without missing the changes made during it, record the cluster time before
+        scanning and pass it as start_at_operation_time; events the scan already saw are applied again,
+        which leaves the aggregates unchanged. Laureates counted without their _id, e.g. from a file, are
+        mapped with map_ids first, after taking the cluster time when no start is given.
+        :param collection: the laureate collection, on a replica set or sharded cluster
+        :param resume_after: resume token to continue from, defaults to now
+        :param stop: threading.Event ending the loop, checked at least once a second
+        :param on_change: function called with the resume token after every applied event
+        :param start_at_operation_time: bson Timestamp to start from when there is no resume token, such as
+                                        the operationTime of a command run before the scan
+        :return: the last resume token
+        """
+        if not set(self.laureates) <= set(self._ids.values()):
+            if resume_after is None and start_at_operation_time is None:
+                start_at_operation_time = collection.database.command("ping").get("operationTime")
+            self.map_ids(collection)
+        with collection.watch(full_document="updateLookup", resume_after=resume_after,
+                              start_at_operation_time=None if resume_after else start_at_operation_time,
+                              max_await_time_ms=1000) as stream:
+            while stream.alive and not (stop is not None and stop.is_set()):
+                change = stream.try_next()
+                if change is None:
+                    continue
+                if change["operationType"] in ("drop", "rename", "dropDatabase", "invalidate"):
+                    break
+                self.apply_change(change)
+                if on_change is not None:
+                    on_change(stream.resume_token)
+            return stream.resume_token
+
+    def top_countries(self, limit=10):
+        with self._lock:
+            return dict((+self.countries).most_common(limit))
+
+    def top_categories(self):
+        with self._lock:
+            return dict((+self.categories).most_common())
+
+    def most_prizes_per_year(self, limit=10):
+        with self._lock:
+            return dict((+self.years).most_common(limit))
+
+    def laureate_gender(self):
+        with self._lock:
+            return dict(+self.genders)
+
+    def ages_of_laureates(self):
+        with self._lock:
+            buckets = sorted(key for key, count in self.age_buckets.items() if key != "other" and count)
+            result = {key: self.age_buckets[key] for key in buckets}
+            if self.age_buckets["other"]:
+                result["other"] = self.age_buckets["other"]
+            return result
+
+    def category_introduction_year(self):
+        with self._lock:
+            first = {category: min(year for year, count in years.items() if count)
+                     for category, years in self.category_years.items() if any(years.values())}
+        return dict(sorted(first.items(), key=lambda item: item[1]))
+
+    def top_category_per_country(self, limit=10):
+        with self._lock:
+            top = {}
+            for country, categories in self.country_categories.items():
+                category, count = max(categories.items(), key=lambda item: item[1], default=(None, 0))
+                if count > 0:
+                    top[country] = {"category": category, "count": count}
+        ranked = sorted(top.items(), key=lambda item: -item[1]["count"])[:limit]
+        return dict(ranked)
+
+    def category_winner_counts(self):
+        with self._lock:
+            return [{"_id": category, **{bucket: buckets[bucket] for bucket in WINNER_BUCKETS}}
+                    for category, buckets in sorted(self.winner_buckets.items()) if self.categories[category]]
+
+
+class MaintainedBackend:
+    """
+    A NobelAPI backend answering the MAINTAINED_QUERIES from RunningAggregates and every other query from
+    another backend
+    """
+
+    def __init__(self, aggregates, fallback):
+        """
+        :param aggregates: RunningAggregates kept up to date by sync_file or watch
+        :param fallback: backend answering the other queries, such as backends.MongoBackend
+        """
+        self.aggregates = aggregates
+        self.fallback = fallback
+        for name in MAINTAINED_QUERIES:
+            setattr(self, name, getattr(aggregates, name))
+
+    def __getattr__(self, name):
+        return getattr(self.fallback, name)
+
+    def dataset_version(self):
+        """
+        :return: the fallback's version plus the number of changes applied, so NobelAPI's cache is
+                 invalidated by every change
+        """
+        return f"{self.fallback.dataset_version()}+{self.aggregates.changes}"
+
+    def batch(self, queries):
+        """
+        :param queries: list of (query name, dictionary of arguments) pairs
+        :return: dictionary of query names and results, the unmaintained ones from the fallback
+        """
+        rest = [(name, arguments) for name, arguments in queries if name not in MAINTAINED_QUERIES]
+        results = {}
+        if rest:
+            results = self.fallback.batch(rest) if hasattr(self.fallback, "batch") else \
+                {name: getattr(self.fallback, name)(**arguments) for name, arguments in rest}
+        for name, arguments in queries:
+            if name in MAINTAINED_QUERIES:
+                results[name] = getattr(self.aggregates, name)(**arguments)
+        return results
+
+    def close(self):
+        self.fallback.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the NobelAPI counting aggregates incrementally")
+    parser.add_argument("path", nargs="?", default="laureate.json", help="laureate file counted first")
+    parser.add_argument("--sync", nargs="+", default=[], help="newer laureate files applied in order")
+    parser.add_argument("--watch", action="store_true", help="follow the collection's change stream")
+    parser.add_argument("--uri", default=None, help="mongodb uri, defaults to localhost")
+    args = parser.parse_args(argv)
+
+    if args.watch:
+        from connection import mongo_client
+
+        with mongo_client(args.uri) as client:
+            # the stream starts before the scan, so nothing written while counting is missed
+            started = client.prize.command("ping")["operationTime"]
+            aggregates = RunningAggregates.from_collection(client.prize.collection)
+            print(f"counted {len(aggregates)} laureates, watching for changes")
+            aggregates.watch(client.prize.collection, start_at_operation_time=started,
+                             on_change=lambda token: pprint.pprint(aggregates.top_categories()))
+        return
+
+    aggregates = RunningAggregates.from_file(args.path)
+    for path in args.sync:
+        print(path, aggregates.sync_file(path))
+    pprint.pprint({name: getattr(aggregates, name)() for name in MAINTAINED_QUERIES})
+
+
+if __name__ == "__main__":
+    main()
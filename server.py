@@ -0,0 +1,292 @@
+"""
+Read-only HTTP JSON service over NobelAPI, so dashboards can query the laureates without pymongo.
+
+Every query method is a GET endpoint taking its arguments as query parameters:
+    GET /top_countries?limit=5
+    GET /minor_winners?fields=firstname,surname
+    GET /search_motivations?query=nuclear%20fission&limit=3
+    GET /                  lists the endpoints and their parameters
+    GET /health            the dataset version
+
+Responses carry an ETag built from the dataset version and the request, so a client sending it back in
+If-None-Match gets a 304 without the query running, and are gzip compressed when the client accepts it.
+Queries run on a bounded pool of worker threads, and identical requests arriving while one is running
+wait for its result instead of running their own aggregation.
+
+    python server.py --port 8080
+    python server.py --backend columnar --path laureate.json
+"""
+import argparse
+import gzip
+import hashlib
+import inspect
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+
+from backends import RESULT_SHAPES
+from nobel_api import NobelAPI
+
+ENDPOINTS = tuple(RESULT_SHAPES) + ("avg_winners_per_category", "search_motivations")
+
+# parameters converted to int whatever their default
+INT_PARAMETERS = ("limit", "batch_size")
+
+# the largest limit accepted; anything above it is clamped
+MAX_LIMIT = 1000
+
+# responses smaller than this are sent uncompressed
+GZIP_MIN_SIZE = 1024
+
+
+def _default(value):
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return float(value)
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    # ObjectId and anything else bson returns
+    return str(value)
+
+
+def to_json(result):
+    """
+    :param result: a NobelAPI query result
+    :return: the result as json bytes; dictionaries with tuple keys become lists of {"key": [...], "value": ...}
+    """
+    if isinstance(result, dict) and any(isinstance(key, tuple) for key in result):
+        result = [{"key": list(key), "value": value} for key, value in result.items()]
+    return json.dumps(result, default=_default).encode("utf-8")
+
+
+def parse_arguments(method, query):
+    """
+    Converts query parameters to the arguments of a NobelAPI method, using the type of each parameter's
+    default: int for limit (clamped to MAX_LIMIT) and batch_size, a comma separated list for fields, and
+    strings otherwise
+    :param method: the bound NobelAPI method
+    :param query: list of (name, value) pairs from the query string
+    :return: dictionary of keyword arguments
+    """
+    parameters = inspect.signature(method).parameters
+    arguments = {}
+    for name, value in query:
+        parameter = parameters.get(name)
+        if parameter is None or parameter.kind is not inspect.Parameter.POSITIONAL_OR_KEYWORD:
+            raise ValueError(f"unknown parameter {name}")
+        default = parameter.default
+        if name == "fields":
+            arguments[name] = tuple(field for field in value.split(",") if field)
+        elif name in INT_PARAMETERS or (isinstance(default, int) and not isinstance(default, bool)):
+            arguments[name] = int(value)
+            if name == "limit":
+                arguments[name] = max(0, min(arguments[name], MAX_LIMIT))
+        else:
+            arguments[name] = value
+    missing = [name for name, p in parameters.items() if p.default is inspect.Parameter.empty and name not in arguments]
+    if missing:
+        raise ValueError(f"missing parameter {', '.join(missing)}")
+    return arguments
+
+
+class QueryService:
+
+    def __init__(self, api, workers=8, cache_size=256):
+        """
+        :param api: NobelAPI answering the queries
+        :param workers: number of queries run at the same time, defaults to 8
+        :param cache_size: number of encoded responses kept by ETag, defaults to 256
+        """
+        self.api = api
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="nobel-query")
+        self.cache_size = cache_size
+        self._responses = OrderedDict()
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def endpoints(self):
+        """
+        :return: dictionary of endpoint names and their parameters with defaults
+        """
+        return {name: {p.name: None if p.default is inspect.Parameter.empty else p.default
+                       for p in inspect.signature(getattr(self.api, name)).parameters.values()}
+                for name in ENDPOINTS}
+
+    def etag(self, name, arguments):
+        """
+        :return: quoted ETag of a query at the current dataset version, or None when the version is unknown
+        """
+        version = self.api.dataset_version()
+        if version is None:
+            return None
+        key = json.dumps([version, name, sorted(arguments.items())], default=str)
+        return '"' + hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] + '"'
+
+    def _encode(self, name, arguments):
+        body = to_json(getattr(self.api, name)(**arguments))
+        return body, gzip.compress(body, 6) if len(body) >= GZIP_MIN_SIZE else None
+
+    def response(self, name, arguments, etag=None):
+        """
+        Runs a query on the worker pool, sharing the run with identical requests already in flight
+        :param name: endpoint name
+        :param arguments: keyword arguments of the query
+        :param etag: the request's ETag, whose encoded response is reused
+        :return: (json bytes, gzipped bytes or None)
+        """
+        key = etag or json.dumps([name, sorted(arguments.items())], default=str)
+        with self._lock:
+            if etag is not None and etag in self._responses:
+                self._responses.move_to_end(etag)
+                return self._responses[etag]
+            future = self._running.get(key)
+            owner = future is None
+            if owner:
+                future = self._running[key] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            result = self.executor.submit(self._encode, name, arguments).result()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._running[key]
+        future.set_result(result)
+        if etag is not None:
+            with self._lock:
+                self._responses[etag] = result
+                while len(self._responses) > self.cache_size:
+                    self._responses.popitem(last=False)
+        return result
+
+    def close(self):
+        self.executor.shutdown()
+        self.api.close()
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    Request handler of a server whose service attribute is a QueryService
+    """
+
+    server_version = "NobelQueryService/1.0"
+
+    def _send(self, status, body=b"", headers=None):
+        gzipped = None
+        if isinstance(body, tuple):
+            body, gzipped = body
+        headers = dict(headers or {})
+        if body:
+            headers.setdefault("Content-Type", "application/json")
+            headers["Vary"] = "Accept-Encoding"
+            if gzipped is not None and "gzip" in self.headers.get("Accept-Encoding", ""):
+                body = gzipped
+                headers["Content-Encoding"] = "gzip"
+        headers["Content-Length"] = str(len(body))
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._send(status, json.dumps({"error": message}).encode("utf-8"))
+
+    def do_GET(self):
+        service = self.server.service
+        url = urlsplit(self.path)
+        name = url.path.strip("/")
+        if name == "":
+            return self._send(HTTPStatus.OK, to_json(service.endpoints()))
+        if name == "health":
+            return self._send(HTTPStatus.OK, to_json({"status": "ok", "version": service.api.dataset_version()}))
+        if name not in ENDPOINTS:
+            return self._error(HTTPStatus.NOT_FOUND, f"no endpoint {name}")
+        try:
+            arguments = parse_arguments(getattr(service.api, name), parse_qsl(url.query))
+        except ValueError as e:
+            return self._error(HTTPStatus.BAD_REQUEST, str(e))
+
+        etag = service.etag(name, arguments)
+        headers = {"Cache-Control": "no-cache"}
+        if etag is not None:
+            headers["ETag"] = etag
+            if etag in [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]:
+                return self._send(HTTPStatus.NOT_MODIFIED, headers=headers)
+        try:
+            body = service.response(name, arguments, etag)
+        except Exception as e:
+            self.log_error("%s failed: %r", name, e)
+            return self._error(HTTPStatus.INTERNAL_SERVER_ERROR, f"{name} failed")
+        self._send(HTTPStatus.OK, body, headers)
+
+    do_HEAD = do_GET
+
+    def _read_only(self):
+        self._error(HTTPStatus.METHOD_NOT_ALLOWED, "the service is read-only")
+
+    do_POST = do_PUT = do_PATCH = do_DELETE = _read_only
+
+
+class QueryServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 makes a burst of dashboard requests retry after the query they could share
+    request_queue_size = 128
+
+
+def make_server(api, host="127.0.0.1", port=8080, workers=8):
+    """
+    :param api: NobelAPI answering the queries
+    :param host: interface to listen on, defaults to localhost
+    :param port: port to listen on, 0 for any free port, defaults to 8080
+    :param workers: number of queries run at the same time, defaults to 8
+    :return: QueryServer; call serve_forever, and server.service.close() when done
+    """
+    # connects and loads the data now, so the first burst of requests does not race to do it
+    api.dataset_version()
+    server = QueryServer((host, port), QueryHandler)
+    server.service = QueryService(api, workers)
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the NobelAPI queries as JSON over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=8, help="queries run at the same time")
+    parser.add_argument("--backend", choices=["mongo", "columnar"], default="mongo",
+                        help="columnar answers from laureate.json in memory, without mongod")
+    parser.add_argument("--path", default="laureate.json")
+    parser.add_argument("--uri", default=None, help="mongodb uri, defaults to NOBEL_MONGO_URI or localhost")
+    args = parser.parse_args(argv)
+
+    if args.backend == "columnar":
+        from columnar import ColumnarBackend
+
+        api = NobelAPI(backend=ColumnarBackend(args.path))
+    else:
+        api = NobelAPI(path=args.path, uri=args.uri)
+    server = make_server(api, args.host, args.port, args.workers)
+    print(f"serving on http://{args.host}:{server.server_address[1]}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+Synthetic laureate generator for load tests. LaureateModel.fit reads laureate.json and records the
+empirical distributions of:
+    prize groups: category, year, number of co-winners per (year, category) and their share values
+    winners: gender per category, birth country (with its code and city) of people, age at the prize,
+             lifespan and whether the laureate has died
+    text: first names, surnames, motivations and affiliations per category
+    prizes per laureate
+generate() samples whole prize groups in NumPy chunks and streams laureate documents in the same schema
+as laureate.json, so any number of records can be produced with flat memory.
+
+A laureate with several prizes takes the winner places of other prize groups in its chunk, so the groups
+keep their sizes and shares. The extra prizes are never in a group the laureate already won and fall at an
+age seen in the data, and the places are taken from the next MERGE_WINDOW in a shuffled order. Only about
+120 years of prizes exist, so once a dataset holds more groups than the real data has (year, category)
+editions, generated groups share editions and the co-winner counts seen by the (year, category) pipelines
+grow with the dataset.
+
+    python synthetic.py 10000000 --output data/laureates.json --shards 8
+"""
+import argparse
+import json
+import os
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from loader import iter_laureates
+
+# winner places searched for a laureate's extra prizes
+MERGE_WINDOW = 64
+
+
+def _empirical(values):
+    """
+    Returns the distinct values and their probabilities
+    """
+    counts = Counter(values)
+    keys = list(counts)
+    weights = np.array([counts[k] for k in keys], dtype=np.float64)
+    return keys, weights / weights.sum()
+
+
+class LaureateModel:
+
+    def __init__(self, categories, group_weights, group_years, group_sizes, share_patterns, genders,
+                 gender_weights, places, place_weights, person_ages, org_ages, lifespans, death_rate,
+                 firstnames, surnames, org_names, motivations, affiliations, current_year, prize_counts=(1,),
+                 prize_count_weights=(1.0,)):
+        self.categories = categories
+        self.group_weights = group_weights
+        self.group_years = group_years
+        self.group_sizes = group_sizes
+        self.share_patterns = share_patterns
+        self.genders = genders
+        self.gender_weights = gender_weights
+        self.places = places
+        self.place_weights = place_weights
+        self.person_ages = person_ages
+        self.org_ages = org_ages
+        self.lifespans = lifespans
+        self.death_rate = death_rate
+        self.firstnames = firstnames
+        self.surnames = surnames
+        self.org_names = org_names
+        self.motivations = motivations
+        self.affiliations = affiliations
+        self.current_year = current_year
+        self.prize_counts = prize_counts
+        self.prize_count_weights = prize_count_weights
+
+    @classmethod
+    def fit(cls, path="laureate.json"):
+        """
+        Fits the distributions of a laureate file
+        :param path: laureate.json or laureates_array.json
+        :return: LaureateModel
+        """
+        groups = defaultdict(list)
+        genders_by_category = defaultdict(list)
+        places, person_ages, org_ages, lifespans = [], [], [], []
+        died, firstnames, surnames, org_names = [], [], [], []
+        motivations, affiliations = defaultdict(list), defaultdict(list)
+        prize_counts = []
+        for laureate in iter_laureates(path):
+            prize_counts.append(len(laureate.get("prizes", [])))
+            gender = laureate.get("gender")
+            if gender == "org":
+                org_names.append(laureate.get("firstname", ""))
+            else:
+                firstnames.append(laureate.get("firstname", ""))
+            if laureate.get("surname"):
+                surnames.append(laureate["surname"])
+            born = laureate.get("born", "0000-00-00")
+            death = laureate.get("died", "0000-00-00")
+            if gender != "org":
+                places.append((laureate.get("bornCountry"), laureate.get("bornCountryCode"), laureate.get("bornCity")))
+                died.append(death != "0000-00-00")
+                if born != "0000-00-00" and death != "0000-00-00":
+                    lifespans.append(int(death[:4]) - int(born[:4]))
+            for prize in laureate.get("prizes", []):
+                groups[(prize["year"], prize["category"])].append(prize["share"])
+                genders_by_category[prize["category"]].append(gender)
+                motivations[prize["category"]].append(prize.get("motivation", ""))
+                affiliations[prize["category"]].append(prize.get("affiliations", []))
+                if born != "0000-00-00":
+                    (org_ages if gender == "org" else person_ages).append(int(prize["year"][:4]) - int(born[:4]))
+
+        categories = sorted({category for _, category in groups})
+        group_count = Counter(category for _, category in groups)
+        group_weights = np.array([group_count[c] for c in categories], dtype=np.float64)
+        group_years = [np.array([int(y) for y, c in groups if c == category]) for category in categories]
+        group_sizes = [np.array([len(s) for (_, c), s in groups.items() if c == category]) for category in categories]
+        share_patterns = defaultdict(list)
+        for shares in groups.values():
+            share_patterns[len(shares)].append(tuple(sorted(shares)))
+
+        genders = sorted({g for values in genders_by_category.values() for g in values if g is not None})
+        gender_weights = np.array([[genders_by_category[c].count(g) for g in genders] for c in categories],
+                                  dtype=np.float64)
+        gender_weights /= gender_weights.sum(axis=1, keepdims=True)
+        place_keys, place_weights = _empirical(places)
+        count_keys, count_weights = _empirical(count for count in prize_counts if count)
+
+        return cls(
+            categories=categories,
+            group_weights=group_weights / group_weights.sum(),
+            group_years=group_years,
+            group_sizes=group_sizes,
+            share_patterns=dict(share_patterns),
+            genders=genders,
+            gender_weights=gender_weights,
+            places=place_keys,
+            place_weights=place_weights,
+            person_ages=np.array(person_ages),
+            org_ages=np.array(org_ages or [0]),
+            lifespans=np.array(lifespans or [75]),
+            death_rate=sum(died) / max(1, len(died)),
+            firstnames=firstnames,
+            surnames=surnames,
+            org_names=org_names or [""],
+            motivations=[motivations[c] for c in categories],
+            affiliations=[affiliations[c] for c in categories],
+            current_year=max(int(y) for y, _ in groups),
+            prize_counts=count_keys,
+            prize_count_weights=count_weights,
+        )
+
+    def _chunk(self, rng, n_groups):
+        """
+        Samples n_groups prize groups and their winners as column arrays
+        """
+        category = rng.choice(len(self.categories), n_groups, p=self.group_weights)
+        year = np.empty(n_groups, dtype=np.int64)
+        size = np.empty(n_groups, dtype=np.int64)
+        for code in range(len(self.categories)):
+            rows = np.flatnonzero(category == code)
+            year[rows] = rng.choice(self.group_years[code], len(rows))
+            size[rows] = rng.choice(self.group_sizes[code], len(rows))
+
+        winners = int(size.sum())
+        w_group = np.repeat(np.arange(n_groups), size)
+        w_category = category[w_group]
+        w_year = year[w_group]
+        cdf = np.cumsum(self.gender_weights, axis=1)[w_category]
+        w_gender = np.minimum((rng.random(winners)[:, None] > cdf).sum(axis=1), len(self.genders) - 1)
+        is_org = np.array([g == "org" for g in self.genders])[w_gender]
+        age = np.where(is_org, rng.choice(self.org_ages, winners), rng.choice(self.person_ages, winners))
+        born = w_year - age
+        lifespan = rng.choice(self.lifespans, winners)
+        dead = (rng.random(winners) < self.death_rate) & ~is_org & (born + lifespan <= self.current_year)
+        return {
+            "group": w_group, "size": size, "category": w_category, "year": w_year, "gender": w_gender,
+            "org": is_org, "born": born, "month": rng.integers(1, 13, winners), "day": rng.integers(1, 29, winners),
+            "dead": dead, "died": born + lifespan, "place": rng.choice(len(self.places), winners, p=self.place_weights),
+            "name": rng.integers(0, 1 << 31, winners),
+            "text": rng.integers(0, 1 << 31, winners),
+        }
+
+    @staticmethod
+    def _name(pool, index):
+        return pool[index % len(pool)]
+
+    def _merge(self, cols, order, position, count):
+        """
+        Moves the winner places of a laureate's extra prizes right after its first place in order
+        :return: number of places the laureate takes, at most count
+        """
+        first = order[position]
+        org = cols["org"][first]
+        ages = self.org_ages if org else self.person_ages
+        low, high = cols["born"][first] + int(ages.min()), cols["born"][first] + int(ages.max())
+        groups = {cols["group"][first]}
+        taken = 1
+        while taken < count:
+            for j in range(position + taken, min(position + taken + MERGE_WINDOW, len(order))):
+                place = order[j]
+                if (cols["group"][place] not in groups and cols["org"][place] == org
+                        and low <= cols["year"][place] <= high):
+                    order[position + taken], order[j] = place, order[position + taken]
+                    groups.add(cols["group"][place])
+                    taken += 1
+                    break
+            else:
+                break
+        return taken
+
+    def _prize(self, cols, shares, seen, place, text):
+        group = cols["group"][place]
+        category = cols["category"][place]
+        prize = {
+            "year": str(cols["year"][place]),
+            "category": self.categories[category],
+            "share": shares[group][seen[group]],
+            "motivation": self.motivations[category][text % len(self.motivations[category])],
+            "affiliations": self.affiliations[category][text % len(self.affiliations[category])],
+        }
+        seen[group] += 1
+        return prize
+
+    def generate(self, n, seed=None, chunk_size=100000, first_id=1):
+        """
+        Streams n synthetic laureates
+        :param n: number of laureates
+        :param seed: random seed, defaults to None
+        :param chunk_size: number of laureates sampled per NumPy chunk, defaults to 100000
+        :param first_id: id of the first laureate, defaults to 1
+        :return: generator of laureate dictionaries
+        """
+        rng = np.random.default_rng(seed)
+        mean_size = float(np.mean(np.concatenate(self.group_sizes)))
+        mean_prizes = float(np.dot(self.prize_counts, self.prize_count_weights))
+        emitted = 0
+        while emitted < n:
+            cols = self._chunk(rng, max(1, int(min(chunk_size, n - emitted) * mean_prizes / mean_size) + 1))
+            shares = [self.share_patterns[s][i % len(self.share_patterns[s])]
+                      for s, i in zip(cols["size"].tolist(), rng.integers(0, 1 << 31, len(cols["size"])).tolist())]
+            cols = {key: values.tolist() for key, values in cols.items() if key != "size"}
+            order = rng.permutation(len(cols["group"])).tolist()
+            counts = rng.choice(self.prize_counts, len(order), p=self.prize_count_weights).tolist()
+            seen = Counter()
+            position = 0
+            for count in counts:
+                if emitted >= n or position >= len(order):
+                    break
+                taken = self._merge(cols, order, position, count)
+                i = order[position]
+                born_year = cols["born"][i]
+                text = cols["text"][i]
+                name = cols["name"][i]
+                org = cols["org"][i]
+                country, country_code, city = (None, None, None) if org else self.places[cols["place"][i]]
+                prizes = [self._prize(cols, shares, seen, place, text) for place in order[position:position + taken]]
+                laureate = {
+                    "id": str(first_id + emitted),
+                    "firstname": self._name(self.org_names if org else self.firstnames, name),
+                    "surname": None if org else self._name(self.surnames, name >> 8),
+                    "born": f"{born_year:04d}-00-00" if org else
+                            f"{born_year:04d}-{cols['month'][i]:02d}-{cols['day'][i]:02d}",
+                    "died": f"{cols['died'][i]:04d}-01-01" if cols["dead"][i] else "0000-00-00",
+                    "bornCountry": country,
+                    "bornCountryCode": country_code,
+                    "bornCity": city,
+                    "gender": self.genders[cols["gender"][i]],
+                    "prizes": sorted(prizes, key=lambda prize: prize["year"]),
+                }
+                position += taken
+                yield {key: value for key, value in laureate.items() if value is not None}
+                emitted += 1
+
+
+def write_dataset(laureates, path, shards=1, wrapped=True):
+    """
+    Streams laureates to one or more json files
+    :param laureates: iterable of laureate dictionaries
+    :param path: output path; with several shards the shard number is added before the extension
+    :param shards: number of files the laureates are spread over round robin, defaults to 1
+    :param wrapped: write the {"laureates": [...]} format of laureate.json instead of a bare array,
+                    defaults to True
+    :return: list of the paths written
+    """
+    stem, ext = os.path.splitext(path)
+    paths = [path] if shards == 1 else [f"{stem}-{i:03d}{ext or '.json'}" for i in range(shards)]
+    files = [open(p, "w", encoding="utf-8") for p in paths]
+    first = [True] * shards
+    try:
+        for f in files:
+            f.write('{"laureates":[' if wrapped else "[")
+        for i, laureate in enumerate(laureates):
+            shard = i % shards
+            files[shard].write(("" if first[shard] else ",\n") + json.dumps(laureate, ensure_ascii=False))
+            first[shard] = False
+        for f in files:
+            f.write("]}" if wrapped else "]")
+    finally:
+        for f in files:
+            f.close()
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic laureates shaped like laureate.json")
+    parser.add_argument("count", type=int, help="number of laureates")
+    parser.add_argument("--source", default="laureate.json", help="file the distributions are fitted to")
+    parser.add_argument("--output", default="synthetic_laureates.json")
+    parser.add_argument("--shards", type=int, default=1)
+    parser.add_argument("--array", action="store_true", help="write bare arrays like laureates_array.json")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    model = LaureateModel.fit(args.source)
+    for path in write_dataset(model.generate(args.count, args.seed), args.output, args.shards, not args.array):
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
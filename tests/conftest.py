@@ -0,0 +1,95 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+LAUREATE_PATH = os.path.join(ROOT, "laureate.json")
+LAUREATES_ARRAY_PATH = os.path.join(ROOT, "laureates_array.json")
+
+# non-default arguments the query tests call every backend with
+ARGUMENTS = {"top_countries": {"limit": 5}, "most_prizes_per_year": {"limit": 3},
+             "top_category_per_country": {"limit": 4}}
+
+
+def _sorted_arrays(stage):
+    # mongomock has no $sortArray: read the input array and sort it after the pipeline runs
+    sorted_fields = []
+    for operator in ("$addFields", "$set", "$project"):
+        for field, expression in stage.get(operator, {}).items():
+            if isinstance(expression, dict) and "$sortArray" in expression:
+                stage[operator][field] = expression["$sortArray"]["input"]
+                sorted_fields.append(field)
+    return sorted_fields
+
+
+@pytest.fixture
+def merge_emulation(monkeypatch):
+    """
+    Lets mongomock run the $merge pipelines of prize_facts.py by running the stages before $merge and
+    replacing the rows into the target collection on _id
+    """
+    mongomock = pytest.importorskip("mongomock")
+    aggregate = mongomock.collection.Collection.aggregate
+
+    def merge(collection, pipeline, *args, **kwargs):
+        if not pipeline or "$merge" not in pipeline[-1]:
+            return aggregate(collection, pipeline, *args, **kwargs)
+        stages = [dict((operator, dict(spec) if isinstance(spec, dict) else spec) for operator, spec in stage.items())
+                  for stage in pipeline[:-1]]
+        sorted_fields = [field for stage in stages for field in _sorted_arrays(stage)]
+        target = collection.database[pipeline[-1]["$merge"]["into"]]
+        for row in aggregate(collection, stages, *args, **kwargs):
+            for field in sorted_fields:
+                row[field] = sorted(row[field])
+            target.replace_one({"_id": row["_id"]}, row, upsert=True)
+        return iter(())
+
+    monkeypatch.setattr(mongomock.collection.Collection, "aggregate", merge)
+
+
+@pytest.fixture
+def mongo_db():
+    mongomock = pytest.importorskip("mongomock")
+    return mongomock.MongoClient().prize
+
+
+@pytest.fixture
+def mongod_db():
+    # a scratch database on the NOBEL_MONGO_URI or local server, for the stages mongomock cannot run
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+    from connection import default_uri
+
+    client = MongoClient(default_uri(), serverSelectionTimeoutMS=500)
+    try:
+        version = tuple(client.server_info()["versionArray"][:2])
+    except PyMongoError:
+        client.close()
+        pytest.skip("no MongoDB server")
+    if version < (5, 2):
+        client.close()
+        pytest.skip("prize_facts.py needs MongoDB 5.2")
+    db = client[f"nobel_test_{os.getpid()}"]
+    yield db
+    client.drop_database(db.name)
+    client.close()
+
+
+@pytest.fixture(scope="session")
+def mongo_backend():
+    # shared by the read-only tests; tests that write use mongo_db
+    mongomock = pytest.importorskip("mongomock")
+    from backends import MongoBackend
+
+    # mongomock has no $merge, so the queries run against the laureate collection
+    return MongoBackend(mongomock.MongoClient().prize, LAUREATE_PATH, use_facts=False)
+
+
+@pytest.fixture(scope="session")
+def columnar_backend():
+    from columnar import ColumnarBackend
+
+    return ColumnarBackend(LAUREATE_PATH)
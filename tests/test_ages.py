@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+import charts
+from ages import AgeDensity, OnlineLinearFit, linear_fit
+from nobel_api import NobelAPI
+
+
+@pytest.mark.parametrize("chunk", [1, 7, 1000])
+def test_online_linear_fit_matches_linear_fit(chunk):
+    rng = np.random.default_rng(0)
+    x = rng.integers(1901, 2025, 5000).astype(np.float64)
+    y = 0.05 * (x - 1900) + 55 + rng.normal(0, 12, len(x))
+    fit = OnlineLinearFit()
+    for start in range(0, len(x), chunk):
+        fit.update(x[start:start + chunk], y[start:start + chunk])
+    assert np.allclose(fit.fit(), linear_fit(x, y))
+
+    halves = OnlineLinearFit(), OnlineLinearFit()
+    halves[0].update(x[:1234], y[:1234])
+    halves[1].update(x[1234:], y[1234:])
+    assert np.allclose(halves[0].merge(halves[1]).fit(), linear_fit(x, y))
+
+
+def test_age_over_time_switches_to_streamed_density(columnar_backend, monkeypatch):
+    api = NobelAPI(backend=columnar_backend)
+    years, ages = api.chart_data("age_over_time")
+    assert np.array_equal(years, api.age_table().yearly()[0])
+    assert np.array_equal(ages, api.age_table().yearly()[1])
+
+    monkeypatch.setattr(charts, "SCATTER_LIMIT", 100)
+    density = api.chart_data("age_over_time")
+    assert isinstance(density, AgeDensity)
+    assert len(density) == len(years) and density.counts.sum() + density.outside == len(years)
+    assert np.allclose(density.regression.fit(), linear_fit(years, ages))
@@ -0,0 +1,130 @@
+import asyncio
+import inspect
+
+import numpy as np
+import pytest
+
+from async_api import NATIVE_QUERIES, AsyncNobelAPI
+from conftest import LAUREATE_PATH
+from nobel_api import NobelAPI
+
+# drawing methods, which only NobelAPI has
+PLOTTING = ("chart_data", "render_charts", "plot_age_histogram", "plot_category_winners", "plot_age_over_time")
+
+
+@pytest.fixture(scope="module")
+def api(columnar_backend):
+    return NobelAPI(backend=columnar_backend)
+
+
+class _AsyncCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    async def to_list(self, length):
+        return list(self.cursor)
+
+
+class _AsyncCollection:
+    # the coroutine API of PyMongo's AsyncCollection over a mongomock collection
+    def __init__(self, collection, calls):
+        self.collection = collection
+        self.calls = calls
+
+    async def aggregate(self, pipeline):
+        self.calls.append(self.collection.name)
+        return _AsyncCursor(self.collection.aggregate(pipeline))
+
+    async def find_one(self, *args):
+        return self.collection.find_one(*args)
+
+
+class _AsyncDatabase:
+    def __init__(self, db):
+        self.db = db
+        self.calls = []
+
+    def __getitem__(self, name):
+        return _AsyncCollection(self.db[name], self.calls)
+
+
+def _public(cls):
+    return {name: member for name, member in vars(cls).items()
+            if callable(member) and not name.startswith("_") and name not in PLOTTING}
+
+
+def test_async_api_has_every_method():
+    methods, async_methods = _public(NobelAPI), _public(AsyncNobelAPI)
+    assert set(methods) <= set(async_methods)
+    for name, method in methods.items():
+        assert inspect.signature(method) == inspect.signature(async_methods[name]), name
+
+
+def test_async_api_matches_sync(api):
+    async def run():
+        async_api = AsyncNobelAPI(api=api)
+        results = await async_api.gather(["top_countries", ("most_prizes_per_year", {"limit": 5}),
+                                          "country_decades_winners"])
+        winners = await async_api.search_motivations("nuclear", limit=3)
+        chunks = [chunk async for chunk in async_api.iter_laureate_ages_yearly(chunk_size=200, arrays=True)]
+        return results, winners, chunks
+
+    results, winners, chunks = asyncio.run(run())
+    assert results == {"top_countries": api.top_countries(), "most_prizes_per_year": api.most_prizes_per_year(5),
+                       "country_decades_winners": api.country_decades_winners()}
+    assert winners == api.search_motivations("nuclear", limit=3)
+    years = np.concatenate([years for years, ages in chunks])
+    assert years.tolist() == [row["year"] for row in api.laureate_ages_yearly()]
+
+
+def test_async_api_rejects_unknown_query(api):
+    with pytest.raises(ValueError):
+        asyncio.run(AsyncNobelAPI(api=api).gather(["drop_database"]))
+
+
+def test_async_api_runs_registry_pipelines_natively(mongo_db, merge_emulation):
+    api = NobelAPI(mongo_db, LAUREATE_PATH)
+    async_db = _AsyncDatabase(mongo_db)
+
+    async def run():
+        async_api = AsyncNobelAPI(api=api, async_db=async_db)
+        queries = [(name, {"limit": 3}) if name == "top_countries" else name for name in NATIVE_QUERIES]
+        results = await async_api.gather(queries)
+        return results, await async_api.top_countries(3)
+
+    results, cached = asyncio.run(run())
+    reference = NobelAPI(mongo_db, None, use_facts=False, cache=False)
+    assert results == {name: getattr(reference, name)(**({"limit": 3} if name == "top_countries" else {}))
+                       for name in NATIVE_QUERIES}
+    assert cached == results["top_countries"]
+    # every query went through the async collections, the second top_countries came from the cache
+    assert len(async_db.calls) == len(NATIVE_QUERIES)
+    assert {"prize_facts", "prize_groups", "collection"} <= set(async_db.calls)
+    assert api.top_countries(3) == cached
+
+
+def test_async_iterators_close_the_generator(api, monkeypatch):
+    closed = []
+
+    def rows(*args):
+        try:
+            yield from range(10)
+        finally:
+            closed.append(True)
+
+    monkeypatch.setattr(api, "iter_laureate_ages_yearly", rows)
+
+    async def run():
+        rows = AsyncNobelAPI(api=api).iter_laureate_ages_yearly()
+        async for row in rows:
+            if row == 2:
+                break
+        await rows.aclose()
+
+    asyncio.run(run())
+    assert closed == [True]
+
+
+def test_gather_rejects_repeated_queries(api):
+    with pytest.raises(ValueError, match="top_countries"):
+        asyncio.run(AsyncNobelAPI(api=api).gather(["top_countries", ("top_countries", {"limit": 5})]))
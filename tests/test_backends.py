@@ -0,0 +1,42 @@
+import pytest
+
+from backends import RESULT_SHAPES
+from conftest import ARGUMENTS
+
+
+def _comparable(name, result):
+    # the columnar backend has no ObjectId to return
+    if name == "minor_winners":
+        return [{key: value for key, value in row.items() if key != "_id"} for row in result]
+    return result
+
+
+@pytest.mark.parametrize("name", sorted(RESULT_SHAPES))
+def test_columnar_matches_mongo(mongo_backend, columnar_backend, name):
+    for arguments in ({}, ARGUMENTS.get(name, {})):
+        expected = _comparable(name, getattr(mongo_backend, name)(**arguments))
+        assert getattr(columnar_backend, name)(**arguments) == expected
+        if isinstance(expected, dict):
+            assert list(getattr(columnar_backend, name)(**arguments)) == list(expected)
+
+
+def test_columnar_matches_mongo_projected(mongo_backend, columnar_backend):
+    fields = ("firstname", "prizes.year", "prizes.category")
+    assert columnar_backend.minor_winners(fields) == mongo_backend.minor_winners(fields)
+    assert list(columnar_backend.iter_laureate_ages_yearly()) == list(mongo_backend.iter_laureate_ages_yearly())
+
+
+def test_projection_drops_paths_under_a_listed_field():
+    from pipelines import projection
+
+    assert projection(("prizes",), "born", "prizes.year") == {"_id": 0, "prizes": 1, "born": 1}
+    assert projection(("prizes.year", "prizes"), "id") == {"_id": 0, "prizes": 1, "id": 1}
+    # only whole path segments collide
+    assert projection(("prize", "prizes.year")) == {"_id": 0, "prize": 1, "prizes.year": 1}
+
+
+def test_minor_winners_with_a_whole_parent_field(mongo_backend, columnar_backend):
+    rows = mongo_backend.minor_winners(("prizes",))
+    assert rows and all(set(row) == {"prizes", "age"} and "year" in row["prizes"] for row in rows)
+    assert list(mongo_backend.iter_minor_winners(("prizes",))) == rows
+    assert columnar_backend.minor_winners(("prizes",)) == rows
@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+import pytest
+
+import cache
+from cache import DiskBackend, MemoryBackend, ResultCache
+from nobel_api import NobelAPI
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache, "time", SimpleNamespace(time=lambda: now[0], monotonic=lambda: now[0]))
+    return now
+
+
+def test_disk_cache_is_shared_through_the_file(tmp_path, columnar_backend):
+    path = str(tmp_path / "cache.sqlite")
+    api = NobelAPI(backend=columnar_backend, cache=ResultCache(DiskBackend(path)))
+    expected = api.top_countries(5)
+
+    # a second process opens the same file
+    other = NobelAPI(backend=columnar_backend, cache=ResultCache(DiskBackend(path)))
+    assert other.top_countries(5) == expected
+    assert (other.cache.hits, other.cache.misses) == (1, 0)
+    hit, _ = other.cache.get("top_countries", {"limit": 5}, "another version")
+    assert not hit
+
+
+@pytest.mark.parametrize("make", [lambda path: MemoryBackend(ttl=10), lambda path: DiskBackend(path, ttl=10)])
+def test_entries_expire_after_the_ttl(tmp_path, clock, make):
+    backend = make(str(tmp_path / "cache.sqlite"))
+    backend.set("key", b"value")
+    clock[0] += 9
+    assert backend.get("key") == b"value"
+    clock[0] += 2
+    assert backend.get("key") is None
+
+
+def test_disk_cache_evicts_the_least_recently_used(tmp_path, clock):
+    backend = DiskBackend(str(tmp_path / "cache.sqlite"), maxsize=2)
+    backend.set("a", b"1")
+    clock[0] += 1
+    backend.set("b", b"2")
+    clock[0] += 1
+    assert backend.get("a") == b"1"
+    clock[0] += 1
+    backend.set("c", b"3")
+    assert (backend.get("a"), backend.get("b"), backend.get("c")) == (b"1", None, b"3")
@@ -0,0 +1,64 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+pytest.importorskip("matplotlib")
+
+import charts
+from charts import ChartCache, ChartJob, ReportRenderer, chart_key
+from conftest import ROOT
+from nobel_api import NobelAPI
+
+AGES = {"20-29": 3, "30-39": 10, "40-49": 7}
+
+
+def test_chart_key_depends_on_what_is_drawn():
+    key = chart_key("age_histogram", AGES)
+    assert chart_key("age_histogram", dict(AGES)) == key
+    assert chart_key("age_histogram", {**AGES, "50-59": 1}) != key
+    assert chart_key("age_histogram", AGES, "svg") != key
+    assert chart_key("age_histogram", AGES, dpi=200) != key
+    assert chart_key("age_histogram", AGES, title="Ages") != key
+    # arrays hash by their contents
+    years = np.arange(1901, 1911)
+    assert (chart_key("age_over_time", (years, years - 1850))
+            == chart_key("age_over_time", (years.copy(), np.array(list(range(51, 61))))))
+
+
+def test_chart_key_is_stable_across_processes():
+    script = f"import charts; print(charts.chart_key('age_histogram', {AGES!r}, 'png', 100))"
+    output = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == chart_key("age_histogram", AGES)
+
+
+def test_renderer_reads_unchanged_charts_from_the_cache(tmp_path, monkeypatch):
+    renderer = ReportRenderer(ChartCache(str(tmp_path / "cache")), processes=0)
+    path = str(tmp_path / "ages.png")
+    assert renderer.render_many([ChartJob("age_histogram", AGES, path)]) == [path]
+    with open(path, "rb") as f:
+        image = f.read()
+    assert image.startswith(b"\x89PNG")
+
+    def render(*args, **kwargs):
+        raise AssertionError("rendered an unchanged chart")
+
+    monkeypatch.setattr(charts, "render", render)
+    assert renderer.render_many([ChartJob("age_histogram", dict(AGES))]) == [image]
+    monkeypatch.undo()
+
+    changed = renderer.render_many([ChartJob("age_histogram", {**AGES, "50-59": 1})])
+    assert changed[0] != image
+    assert sum(len(files) for _, _, files in os.walk(tmp_path / "cache")) == 2
+
+
+def test_render_charts_writes_each_chart(columnar_backend, tmp_path):
+    api = NobelAPI(backend=columnar_backend)
+    paths = api.render_charts(["age_histogram", "category_winners"], str(tmp_path), fmt="svg",
+                              renderer=ReportRenderer(processes=0))
+    assert paths == [str(tmp_path / "age_histogram.svg"), str(tmp_path / "category_winners.svg")]
+    for path in paths:
+        with open(path, "rb") as f:
+            assert f.read().startswith(b"<?xml")
@@ -0,0 +1,62 @@
+import connection
+from backends import MongoBackend
+from connection import CLIENTS, ClientRegistry, mongo_client
+
+# MongoClient connects in the background, so none of these need a server
+URI = "mongodb://localhost:27017"
+
+
+def test_clients_are_shared_and_closed_by_the_last_release(monkeypatch):
+    registry = ClientRegistry()
+    client = registry.acquire(URI)
+    assert registry.acquire(URI) is client
+    other = registry.acquire(URI, maxPoolSize=5)
+    assert other is not client and len(registry) == 2
+
+    closed = []
+    monkeypatch.setattr(client, "close", lambda: closed.append(client))
+    registry.release(client)
+    assert not closed and len(registry) == 2
+    registry.release(client)
+    assert closed == [client] and len(registry) == 1
+    assert registry.acquire(URI) is not client
+    registry.close_all()
+    assert len(registry) == 0
+
+
+def test_mongo_client_releases_on_exit():
+    count = len(CLIENTS)
+    with mongo_client(URI, appname="test-connection") as client:
+        assert len(CLIENTS) == count + 1
+        with mongo_client(URI, appname="test-connection") as inner:
+            assert inner is client
+        assert len(CLIENTS) == count + 1
+    assert len(CLIENTS) == count
+
+
+def test_forked_child_forgets_inherited_clients(monkeypatch):
+    registry = ClientRegistry()
+    client = registry.acquire(URI)
+    closed = []
+    monkeypatch.setattr(client, "close", lambda: closed.append(client))
+    # what the at-fork hook sees in a child
+    registry._pid = -1
+    registry._forget_inherited()
+    assert len(registry) == 0 and not closed
+    assert registry.acquire(URI) is not client
+    registry.close_all()
+
+
+def test_backend_reacquires_its_client_after_a_fork(monkeypatch):
+    registry = ClientRegistry()
+    monkeypatch.setattr(connection, "CLIENTS", registry)
+    backend = MongoBackend(path=None, uri=URI)
+    client = backend.collection.database.client
+    assert backend.collection.database.client is client
+
+    registry._pid = backend._pid = -1
+    registry._forget_inherited()
+    assert backend.collection.database.client is not client
+    assert len(registry) == 1
+    backend.close()
+    assert len(registry) == 0
@@ -0,0 +1,44 @@
+import pytest
+
+from export import PRIZE_COLUMNS, RESULT_COLUMNS, prize_table, read_table, result_columns, table_columns, write_table
+
+
+@pytest.mark.parametrize("backend", ["mongo_backend", "columnar_backend"])
+@pytest.mark.parametrize("name", sorted(RESULT_COLUMNS))
+def test_export_result_columns(request, tmp_path, backend, name):
+    result = getattr(request.getfixturevalue(backend), name)()
+    columns = result_columns(result, RESULT_COLUMNS[name])
+    assert list(columns) == list(RESULT_COLUMNS[name])
+    assert {len(values) for values in columns.values()} == {len(result)}
+
+    path = write_table(columns, str(tmp_path / name))
+    table = read_table(path)
+    assert list(table) == list(RESULT_COLUMNS[name])
+    for column, values in columns.items():
+        assert table[column].tolist() == values.tolist()
+
+
+def test_export_parquet_round_trip(columnar_backend, tmp_path):
+    pytest.importorskip("pyarrow")
+    columns = result_columns(columnar_backend.country_decades_winners(), RESULT_COLUMNS["country_decades_winners"])
+    table = read_table(write_table(columns, str(tmp_path / "decades.parquet")))
+    assert table.column_names == list(columns)
+    assert table.column("count").to_pylist() == columns["count"].tolist()
+
+
+def test_export_arrow_round_trip_is_memory_mapped(mongo_backend, columnar_backend, tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    columns = prize_table(columnar_backend)
+    assert list(columns) == list(PRIZE_COLUMNS)
+    mongo_columns = prize_table(mongo_backend.collection, chunk_size=100)
+    for name, values in columns.items():
+        assert mongo_columns[name].tolist() == values.tolist(), name
+
+    path = write_table(columns, str(tmp_path / "prizes.arrow"))
+    allocated = pa.total_allocated_bytes()
+    table = read_table(path)
+    # the columns point into the mapped file instead of memory allocated by Arrow
+    assert pa.total_allocated_bytes() == allocated
+    assert table.column_names == list(PRIZE_COLUMNS)
+    for name, values in table_columns(table).items():
+        assert values.tolist() == columns[name].tolist(), name
@@ -0,0 +1,49 @@
+import indexes
+
+IXSCAN_EXPLAIN = {"stages": [{"$cursor": {"queryPlanner": {
+    "winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "id_1"}},
+    "rejectedPlans": [{"stage": "COLLSCAN"}],
+}}}, {"$project": {"_hash": False}}]}
+
+COLLSCAN_EXPLAIN = {"queryPlanner": {"winningPlan": {"stage": "PROJECTION_SIMPLE",
+                                                     "inputStage": {"stage": "COLLSCAN"}}}}
+
+# slot-based engine output, where the classic plan sits under queryPlan
+NESTED_EXPLAIN = {"queryPlanner": {"winningPlan": {"queryPlan": {
+    "stage": "PROJECTION_SIMPLE",
+    "inputStage": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "gender_born"}},
+}}}}
+
+
+def test_plan_summary_index_scan():
+    assert indexes.plan_summary(IXSCAN_EXPLAIN) == {"stages": ["FETCH", "IXSCAN"], "indexes": ["id_1"],
+                                                    "uses_index": True}
+
+
+def test_plan_summary_collection_scan():
+    assert indexes.plan_summary(COLLSCAN_EXPLAIN) == {"stages": ["PROJECTION_SIMPLE", "COLLSCAN"], "indexes": [],
+                                                      "uses_index": False}
+
+
+def test_plan_summary_nested_input_stages():
+    summary = indexes.plan_summary(NESTED_EXPLAIN)
+    assert summary["stages"] == ["PROJECTION_SIMPLE", "FETCH", "IXSCAN"]
+    assert summary["indexes"] == ["gender_born"] and summary["uses_index"]
+
+
+def test_verify_indexes_explains_category_winners(mongo_backend, monkeypatch):
+    explained = []
+
+    def explain(collection, pipeline):
+        # mongomock cannot explain; a $match on id is what the id_1 index answers
+        explained.append(pipeline)
+        return IXSCAN_EXPLAIN if "id" in pipeline[0].get("$match", {}) else COLLSCAN_EXPLAIN
+
+    monkeypatch.setattr(indexes, "explain_pipeline", explain)
+    summaries = indexes.verify_indexes(mongo_backend.collection)
+    assert set(summaries) == set(indexes.pipelines.PIPELINES)
+    assert summaries["category_winners"]["uses_index"]
+    assert not summaries["top_categories"]["uses_index"]
+    samples = indexes.sample_parameters(mongo_backend.collection)["category_winners"]["laureate_ids"]
+    assert samples and any(pipeline[0].get("$match", {}).get("id") == {"$in": samples}
+                           for pipeline in explained)
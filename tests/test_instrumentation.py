@@ -0,0 +1,62 @@
+import pytest
+
+from conftest import LAUREATE_PATH
+from instrumentation import Instrumentation, PrometheusSink, RingBufferSink
+from nobel_api import NobelAPI
+
+
+@pytest.fixture
+def instrumented(mongo_db):
+    from backends import MongoBackend
+
+    # mongomock cannot explain, so nothing is explained
+    instrumentation = Instrumentation([RingBufferSink(), PrometheusSink()], explain=None)
+    backend = MongoBackend(mongo_db, LAUREATE_PATH, use_facts=False, instrumentation=instrumentation)
+    return NobelAPI(backend=backend, cache=False), instrumentation
+
+
+def test_sinks_record_every_query(instrumented):
+    api, instrumentation = instrumented
+    ring, prometheus = instrumentation.sinks
+    api.top_countries(3)
+    api.top_countries(3)
+    winners = api.minor_winners()
+
+    records = ring.records()
+    # minor_winners reads the age table first, then fetches the minors
+    assert [(r["operation"], r["name"]) for r in records] == [
+        ("aggregate", "top_countries"), ("aggregate", "top_countries"), ("find", "age_table"), ("find", "minor_winners")]
+    assert [r["rows"] for r in records[:2]] == [3, 3] and records[-1]["rows"] == len(winners)
+    assert records[0]["params"] == {"limit": 3} and records[0]["collection"] == "collection"
+    assert not any(r["slow"] or "command" in r for r in records)
+
+    text = prometheus.text()
+    assert "# TYPE nobel_queries_total counter\n" in text
+    assert 'nobel_queries_total{query="top_countries"} 2\n' in text
+    assert 'nobel_query_rows_total{query="top_countries"} 6\n' in text
+    assert f'nobel_query_rows_total{{query="minor_winners"}} {len(winners)}\n' in text
+
+
+def test_slow_queries_keep_their_pipeline(instrumented):
+    api, instrumentation = instrumented
+    instrumentation.slow_ms = 0
+    list(api.iter_laureate_ages_yearly())
+    (record,) = instrumentation.sinks[0].records(slow_only=True)
+    assert record["slow"] and record["name"] == "laureate_ages_yearly" and isinstance(record["command"], list)
+
+
+def test_ring_buffer_keeps_the_latest_records():
+    ring = RingBufferSink(size=2)
+    for i in range(3):
+        ring.record({"name": str(i), "slow": i == 1})
+    assert [r["name"] for r in ring.records()] == ["1", "2"]
+    assert [r["name"] for r in ring.records(slow_only=True)] == ["1"]
+
+
+def test_disabled_instrumentation_records_nothing(instrumented, mongo_backend):
+    api, instrumentation = instrumented
+    instrumentation.enabled = False
+    assert api.top_countries(3) == mongo_backend.top_countries(3)
+    assert api.laureate_gender() == mongo_backend.laureate_gender()
+    assert len(api.minor_winners(("id",))) == len(mongo_backend.minor_winners())
+    assert instrumentation.sinks[0].records() == [] and "{" not in instrumentation.sinks[1].text()
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from conftest import LAUREATE_PATH, LAUREATES_ARRAY_PATH
+from loader import HASH_FIELD, iter_laureates, load_laureates
+
+
+def _write(path, laureates):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"laureates": laureates}, f)
+    return str(path)
+
+
+def test_load_laureates_counts(mongo_db, tmp_path):
+    with open(LAUREATE_PATH, encoding="utf-8") as f:
+        laureates = json.load(f)["laureates"][:50]
+    path = _write(tmp_path / "laureate.json", laureates)
+    assert load_laureates(mongo_db, path) == {"upserted": 50, "deleted": 0, "unchanged": 0}
+    assert load_laureates(mongo_db, path) == {"upserted": 0, "deleted": 0, "unchanged": 50}
+
+    changed = [{**laureates[0], "surname": "Changed"}] + laureates[1:40]
+    path = _write(tmp_path / "changed.json", changed)
+    assert load_laureates(mongo_db, path) == {"upserted": 1, "deleted": 10, "unchanged": 39}
+    assert mongo_db.collection.count_documents({}) == 40
+    assert mongo_db.collection.find_one({"id": laureates[0]["id"]})["surname"] == "Changed"
+
+
+def test_minor_winners_leave_out_hash(mongo_backend):
+    rows = mongo_backend.minor_winners()
+    assert rows and all(HASH_FIELD not in row for row in rows)
+    rows = list(mongo_backend.iter_minor_winners())
+    assert rows and all(HASH_FIELD not in row for row in rows)
+
+
+@pytest.mark.parametrize("chunk_size", [7, 1 << 16])
+def test_iter_laureates_matches_json_load(chunk_size):
+    with open(LAUREATE_PATH, encoding="utf-8") as f:
+        expected = json.load(f)["laureates"]
+    assert list(iter_laureates(LAUREATE_PATH, chunk_size=chunk_size)) == expected
+    with open(LAUREATES_ARRAY_PATH, encoding="utf-8") as f:
+        expected = json.load(f)
+    assert list(iter_laureates(LAUREATES_ARRAY_PATH, chunk_size=chunk_size)) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"laureates": []}', []),
+    ('{"other": {"a": [1, 2]}, "laureates": [{"id": "1", "n": 12345}], "after": 1}', [{"id": "1", "n": 12345}]),
+    ("[1.5, -20, null]", [1.5, -20, None]),
+])
+def test_iter_laureates_small_chunks(tmp_path, text, expected):
+    path = tmp_path / "laureates.json"
+    path.write_text(text, encoding="utf-8")
+    assert list(iter_laureates(str(path), chunk_size=3)) == expected
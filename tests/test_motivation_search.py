@@ -0,0 +1,46 @@
+import pytest
+
+import pipelines
+from conftest import LAUREATE_PATH
+from motivation_search import MotivationIndex, prefix_query
+
+
+@pytest.fixture(scope="module")
+def index():
+    return MotivationIndex.from_file(LAUREATE_PATH)
+
+
+@pytest.mark.parametrize("keyword", ["physics", "nuclear", "peace"])
+def test_category_winners_match_the_index(mongo_backend, index, keyword):
+    laureate_ids = index.laureate_ids(keyword)
+    pipeline = pipelines.PIPELINES.build("category_winners", laureate_ids=laureate_ids, fields=("id",))
+    winners = [doc["id"] for doc in mongo_backend.collection.aggregate(pipeline)]
+    assert laureate_ids and sorted(winners) == laureate_ids
+    # the same laureates a word-bounded, case-insensitive scan of the motivations finds
+    scanned = mongo_backend.collection.find({"prizes.motivation": {"$regex": rf"\b{keyword}\b", "$options": "i"}},
+                                            {"id": 1})
+    assert sorted(doc["id"] for doc in scanned) == laureate_ids
+
+
+def _regex_ids(backend, pattern):
+    scanned = backend.collection.find({"prizes.motivation": {"$regex": pattern, "$options": "i"}}, {"id": 1})
+    return sorted(doc["id"] for doc in scanned)
+
+
+@pytest.mark.parametrize("text", ["physic", "radio", "nuclear physic"])
+def test_prefix_query_matches_the_regex_at_word_starts(mongo_backend, index, text):
+    laureate_ids = index.laureate_ids(prefix_query(text))
+    assert laureate_ids and laureate_ids == _regex_ids(mongo_backend, rf"\b{text}")
+    # the unanchored $regex category_winners used also matched inside words, e.g. "physic" in astrophysics
+    assert set(laureate_ids) <= set(_regex_ids(mongo_backend, text))
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("physic", "physic*"),
+    ("nuclear  physic", "nuclear physic*"),
+    ("phys*", "phys*"),
+    ('"nuclear fission"', '"nuclear fission"'),
+    ("", ""),
+])
+def test_prefix_query(text, expected):
+    assert prefix_query(text) == expected
@@ -0,0 +1,61 @@
+import subprocess
+import sys
+
+import pytest
+
+from backends import RESULT_SHAPES
+from conftest import ARGUMENTS, ROOT
+from nobel_api import NobelAPI
+
+
+def test_age_table_is_not_copied_through_the_cache(columnar_backend):
+    api = NobelAPI(backend=columnar_backend)
+    assert api.age_table() is api.age_table()
+    assert api.ages_of_laureates() == columnar_backend.ages_of_laureates()
+
+
+@pytest.mark.parametrize("backend", ["mongo_backend", "columnar_backend"])
+@pytest.mark.parametrize("cache", [False, True])
+def test_batch_matches_individual_calls(request, backend, cache):
+    api = NobelAPI(backend=request.getfixturevalue(backend), cache=cache)
+    # with the cache on, part of the batch is answered from it
+    api.top_categories()
+    queries = [name if name not in ARGUMENTS else (name, ARGUMENTS[name]) for name in RESULT_SHAPES]
+    results = api.batch(queries)
+    assert list(results) == list(RESULT_SHAPES)
+    for name in RESULT_SHAPES:
+        assert results[name] == getattr(api, name)(**ARGUMENTS.get(name, {})), name
+
+
+def test_batch_rejects_repeated_queries(columnar_backend):
+    api = NobelAPI(backend=columnar_backend)
+    with pytest.raises(ValueError, match="top_countries"):
+        api.batch([("top_countries", {"limit": 3}), ("top_countries", {"limit": 5})])
+
+
+def test_import_and_construction_are_side_effect_free():
+    script = ("import sys, connection, nobel_api\n"
+              "api = nobel_api.NobelAPI()\n"
+              "print(sorted(name for name in sys.modules if name.split('.')[0] == 'matplotlib'), len(connection.CLIENTS))")
+    output = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True)
+    # no plotting library is loaded and no MongoClient is opened until they are used
+    assert output.stdout.split() == ["[]", "0"]
+
+
+@pytest.mark.parametrize("backend", ["mongo_backend", "columnar_backend"])
+def test_iter_chunks_match_the_lists(request, backend):
+    api = NobelAPI(backend=request.getfixturevalue(backend), cache=False)
+    rows = api.laureate_ages_yearly()
+    assert list(api.iter_laureate_ages_yearly(batch_size=50)) == rows
+    chunks = list(api.iter_laureate_ages_yearly(chunk_size=100))
+    assert all(len(chunk) == 100 for chunk in chunks[:-1]) and 0 < len(chunks[-1]) <= 100
+    assert [row for chunk in chunks for row in chunk] == [(row["year"], row["age"]) for row in rows]
+    arrays = list(api.iter_laureate_ages_yearly(chunk_size=100, arrays=True))
+    assert [year for years, _ in arrays for year in years.tolist()] == [row["year"] for row in rows]
+    assert [age for _, ages in arrays for age in ages.tolist()] == [row["age"] for row in rows]
+
+    fields = ("id", "firstname", "prizes.year")
+    winners = api.minor_winners(fields)
+    assert list(api.iter_minor_winners(fields)) == winners
+    chunks = list(api.iter_minor_winners(fields, chunk_size=1))
+    assert chunks == [[(row["id"], row["firstname"], row["prizes"]["year"], row["age"])] for row in winners]
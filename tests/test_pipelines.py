@@ -0,0 +1,51 @@
+import pipelines
+from pipelines import PipelineRegistry
+
+
+def _registry():
+    registry = PipelineRegistry()
+    built = []
+
+    @registry.register("top")
+    def top(limit=10, fields=()):
+        built.append(limit)
+        return [{"$sort": {"count": -1}}, {"$limit": limit}]
+
+    return registry, built
+
+
+def test_build_reuses_pipelines_per_parameters(monkeypatch):
+    registry, built = _registry()
+    pipeline = registry.build("top", limit=3)
+    assert registry.build("top", limit=3) is pipeline
+    assert registry.build("top", limit=4) is not pipeline
+    # list arguments are keyed by their contents
+    assert registry.build("top", limit=5, fields=["a"]) is registry.build("top", limit=5, fields=["a"])
+    assert built == [3, 4, 5]
+
+    monkeypatch.setattr(pipelines, "BUILD_CACHE_SIZE", 2)
+    registry.build("top", limit=6)
+    registry.build("top", limit=3)
+    assert built == [3, 4, 5, 6, 3]
+
+
+def test_run_and_stream_record_timings(mongo_db):
+    registry, _ = _registry()
+    mongo_db.counts.insert_many([{"count": i} for i in range(5)])
+    assert len(registry.run(mongo_db.counts, "top", limit=2)) == 2
+    stream = registry.stream(mongo_db.counts, "top", limit=3)
+    next(stream)
+    assert registry.timings()["top"]["calls"] == 1
+    # a stream is timed once it is closed
+    stream.close()
+    timings = registry.timings()["top"]
+    assert timings["calls"] == 2 and timings["max"] >= timings["mean"] > 0
+    registry.reset_timings()
+    assert registry.timings() == {}
+
+
+def test_every_registry_builds_its_queries():
+    for registry in (pipelines.PIPELINES, pipelines.FACT_PIPELINES, pipelines.GROUP_PIPELINES):
+        for name, builder in registry.items():
+            if name != "category_winners":
+                assert registry.build(name) == builder(), name
@@ -0,0 +1,102 @@
+import json
+
+import pipelines
+from backends import RESULT_SHAPES
+from conftest import LAUREATE_PATH
+from loader import dataset_version, load_laureates
+from prize_facts import FACTS_COLLECTION, GROUPS_COLLECTION, build_prize_facts, build_prize_groups
+
+
+def _backends(db):
+    from backends import MongoBackend
+
+    return MongoBackend(db, None), MongoBackend(db, None, use_facts=False)
+
+
+def test_facts_are_built_for_laureates_loaded_elsewhere(mongo_db, merge_emulation):
+    load_laureates(mongo_db, LAUREATE_PATH)
+    backend, reference = _backends(mongo_db)
+    assert backend.top_categories() == reference.top_categories()
+    assert backend.categories_split() == reference.categories_split()
+    assert mongo_db[FACTS_COLLECTION].count_documents({}) and mongo_db[GROUPS_COLLECTION].count_documents({})
+
+
+def test_facts_follow_a_reload(mongo_db, merge_emulation, tmp_path):
+    load_laureates(mongo_db, LAUREATE_PATH)
+    backend, reference = _backends(mongo_db)
+    assert backend.top_categories() == reference.top_categories()
+
+    with open(LAUREATE_PATH, encoding="utf-8") as f:
+        laureates = json.load(f)["laureates"][:100]
+    path = tmp_path / "laureate.json"
+    path.write_text(json.dumps({"laureates": laureates}), encoding="utf-8")
+    load_laureates(mongo_db, str(path))
+    assert backend.top_categories() == reference.top_categories()
+    assert backend.category_winner_counts() == reference.category_winner_counts()
+    assert len({row["laureate_id"] for row in mongo_db[FACTS_COLLECTION].find()}) == 100
+
+
+def test_unversioned_laureates_skip_the_facts(mongo_db, merge_emulation):
+    with open(LAUREATE_PATH, encoding="utf-8") as f:
+        mongo_db.collection.insert_many(json.load(f)["laureates"])
+    backend, reference = _backends(mongo_db)
+    assert backend.top_categories() == reference.top_categories()
+    assert FACTS_COLLECTION not in mongo_db.list_collection_names()
+
+
+def _run(registry, collection, name, **params):
+    return RESULT_SHAPES.get(name, list)(collection.aggregate(registry.build(name, **params)))
+
+
+def test_fact_pipelines_match_the_laureate_pipelines(mongo_db, merge_emulation):
+    load_laureates(mongo_db, LAUREATE_PATH)
+    build_prize_facts(mongo_db)
+    # mongomock cannot run the $lookup sub-pipeline of minor_winners; test_derived_queries_on_mongod covers it
+    for name in sorted(set(pipelines.FACT_PIPELINES) - {"minor_winners"}):
+        expected = _run(pipelines.PIPELINES, mongo_db.collection, name)
+        assert _run(pipelines.FACT_PIPELINES, mongo_db[FACTS_COLLECTION], name) == expected, name
+
+
+def test_rebuild_removes_rows_of_older_loads(mongo_db, merge_emulation, tmp_path):
+    load_laureates(mongo_db, LAUREATE_PATH)
+    assert build_prize_facts(mongo_db)
+    assert not build_prize_facts(mongo_db)
+
+    with open(LAUREATE_PATH, encoding="utf-8") as f:
+        laureates = json.load(f)["laureates"][:100]
+    path = tmp_path / "laureate.json"
+    path.write_text(json.dumps({"laureates": laureates}), encoding="utf-8")
+    load_laureates(mongo_db, str(path))
+    assert build_prize_facts(mongo_db)
+    version = dataset_version(mongo_db, "collection")
+    assert dataset_version(mongo_db, FACTS_COLLECTION) == version
+    assert mongo_db[FACTS_COLLECTION].distinct("version") == [version]
+    assert sorted(mongo_db[FACTS_COLLECTION].distinct("laureate_id")) == sorted(row["id"] for row in laureates)
+    assert {index["name"] for index in mongo_db[FACTS_COLLECTION].list_indexes()} >= {"category_year", "laureate_id"}
+
+
+def _by_id(rows):
+    return sorted(rows, key=lambda row: (row["id"], row["prizes"]["year"]))
+
+
+def test_derived_queries_on_mongod(mongod_db):
+    from backends import MongoBackend
+
+    backend = MongoBackend(mongod_db, LAUREATE_PATH)
+    reference = MongoBackend(mongod_db, None, use_facts=False)
+    for name in sorted(set(pipelines.FACT_PIPELINES) | set(pipelines.GROUP_PIPELINES)):
+        if name in RESULT_SHAPES and name != "minor_winners":
+            assert getattr(backend, name)() == getattr(reference, name)(), name
+    assert _by_id(backend.iter_minor_winners()) == _by_id(reference.iter_minor_winners())
+    fields = ("id", "firstname", "prizes.year")
+    assert _by_id(backend.iter_minor_winners(fields)) == _by_id(reference.iter_minor_winners(fields))
+
+
+def test_group_pipelines_match_the_laureate_pipelines(mongo_db, merge_emulation):
+    load_laureates(mongo_db, LAUREATE_PATH)
+    build_prize_groups(mongo_db)
+    row = mongo_db[GROUPS_COLLECTION].find_one({"_id": {"year": "1903", "category": "physics"}})
+    assert (row["winners"], row["shares"], row["uneven"], row["decade"]) == (3, [2, 4, 4], True, 1900)
+    for name in sorted(pipelines.GROUP_PIPELINES):
+        expected = _run(pipelines.PIPELINES, mongo_db.collection, name)
+        assert _run(pipelines.GROUP_PIPELINES, mongo_db[GROUPS_COLLECTION], name) == expected, name
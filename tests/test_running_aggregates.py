@@ -0,0 +1,99 @@
+import json
+
+from conftest import LAUREATE_PATH
+from running_aggregates import RunningAggregates
+
+
+class FakeStream:
+
+    def __init__(self, changes):
+        self.changes = list(changes)
+        self.resume_token = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    @property
+    def alive(self):
+        return bool(self.changes)
+
+    def try_next(self):
+        change = self.changes.pop(0)
+        self.resume_token = {"_data": len(self.changes)}
+        return change
+
+
+class FakeDatabase:
+
+    def command(self, name):
+        return {"ok": 1, "operationTime": "now"}
+
+
+class FakeCollection:
+
+    def __init__(self, changes, documents=()):
+        self.changes = changes
+        self.documents = list(documents)
+        self.options = None
+        self.database = FakeDatabase()
+
+    def find(self, filter, projection, batch_size=0):
+        return [{key: doc[key] for key in projection if key in doc} for doc in self.documents]
+
+    def watch(self, **options):
+        self.options = options
+        return FakeStream(self.changes)
+
+
+def _laureates(count):
+    with open(LAUREATE_PATH, encoding="utf-8") as f:
+        return json.load(f)["laureates"][:count]
+
+
+def test_watch_replays_changes_seen_by_the_scan():
+    laureates = _laureates(100)
+    aggregates = RunningAggregates()
+    for i, laureate in enumerate(laureates):
+        aggregates.update({**laureate, "_id": i})
+    expected = aggregates.top_categories()
+
+    # the stream starts before the scan, so it repeats inserts the scan already counted
+    changes = [{"operationType": "insert", "fullDocument": {**laureate, "_id": i}}
+               for i, laureate in enumerate(laureates[:10])]
+    changes.append({"operationType": "delete", "documentKey": {"_id": 0}})
+    collection = FakeCollection(changes)
+    aggregates.watch(collection, start_at_operation_time="started")
+    assert collection.options["start_at_operation_time"] == "started"
+    assert len(aggregates) == 99
+    category = laureates[0]["prizes"][0]["category"]
+    assert aggregates.top_categories()[category] == expected[category] - len(laureates[0]["prizes"])
+
+
+def test_update_with_a_stale_stored_hash_is_counted():
+    laureates = _laureates(20)
+    aggregates = RunningAggregates()
+    for i, laureate in enumerate(laureates):
+        aggregates.update({**laureate, "_id": i, "_hash": "loaded"})
+    # update_one({"id": ...}, {"$set": {"bornCountry": ...}}) keeps the hash the loader stored
+    changed = {**laureates[3], "_id": 3, "_hash": "loaded", "bornCountry": "Atlantis"}
+    assert aggregates.apply_change({"operationType": "update", "fullDocument": changed})
+    assert aggregates.top_countries(100)["Atlantis"] == 1
+    # a change to a field the aggregates do not count leaves them as they are
+    renamed = {**changed, "firstname": "Renamed"}
+    assert not aggregates.apply_change({"operationType": "update", "fullDocument": renamed})
+
+
+def test_watch_applies_deletes_of_laureates_counted_from_a_file(tmp_path):
+    laureates = _laureates(20)
+    path = tmp_path / "laureate.json"
+    path.write_text(json.dumps({"laureates": laureates}), encoding="utf-8")
+    aggregates = RunningAggregates.from_file(str(path))
+    documents = [{"_id": 100 + i, "id": laureate["id"]} for i, laureate in enumerate(laureates)]
+    collection = FakeCollection([{"operationType": "delete", "documentKey": {"_id": 105}}], documents)
+    aggregates.watch(collection)
+    # the cluster time is taken before the _ids are read, so a delete in between is not missed
+    assert collection.options["start_at_operation_time"] == "now"
+    assert len(aggregates) == 19 and laureates[5]["id"] not in aggregates.laureates
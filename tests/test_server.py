@@ -0,0 +1,79 @@
+import gzip
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from columnar import ColumnarBackend
+from conftest import LAUREATE_PATH
+from nobel_api import NobelAPI
+from server import MAX_LIMIT, make_server
+
+
+class FailingBackend(ColumnarBackend):
+
+    def top_categories(self):
+        raise ValueError("internal detail")
+
+
+@pytest.fixture(scope="module")
+def base_url():
+    server = make_server(NobelAPI(backend=FailingBackend(LAUREATE_PATH)), port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    server.service.close()
+
+
+def get(url, headers=None):
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers or {})) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def test_etag_and_not_modified(base_url):
+    status, headers, body = get(f"{base_url}/top_countries?limit=3")
+    assert status == 200
+    assert len(json.loads(body)) == 3
+    etag = headers["ETag"]
+
+    status, headers, body = get(f"{base_url}/top_countries?limit=3", {"If-None-Match": etag})
+    assert status == 304
+    assert headers["ETag"] == etag
+    assert body == b""
+
+    status, headers, _ = get(f"{base_url}/top_countries?limit=4", {"If-None-Match": etag})
+    assert status == 200
+    assert headers["ETag"] != etag
+
+
+def test_gzip(base_url):
+    status, headers, body = get(f"{base_url}/laureate_ages_yearly", {"Accept-Encoding": "gzip"})
+    assert status == 200
+    assert headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(body))[0].keys() == {"year", "age"}
+
+
+def test_bad_parameters_are_400(base_url):
+    assert get(f"{base_url}/top_countries?limit=x")[0] == 400
+    assert get(f"{base_url}/top_countries?bogus=1")[0] == 400
+    assert get(f"{base_url}/search_motivations")[0] == 400
+    assert get(f"{base_url}/nope")[0] == 404
+
+
+def test_query_errors_are_500_without_details(base_url):
+    status, _, body = get(f"{base_url}/top_categories")
+    assert status == 500
+    assert b"internal detail" not in body
+
+
+def test_limit_is_clamped(base_url):
+    _, headers, _ = get(f"{base_url}/top_countries?limit={MAX_LIMIT}")
+    _, clamped, _ = get(f"{base_url}/top_countries?limit={MAX_LIMIT * 10}")
+    assert clamped["ETag"] == headers["ETag"]
@@ -0,0 +1,44 @@
+import json
+from collections import Counter
+
+import pytest
+
+from conftest import LAUREATE_PATH
+from loader import iter_laureates
+from synthetic import LaureateModel, write_dataset
+
+PRIZE_FIELDS = {"year", "category", "share", "motivation", "affiliations"}
+
+
+@pytest.fixture(scope="module")
+def model():
+    return LaureateModel.fit(LAUREATE_PATH)
+
+
+def test_generate_is_deterministic_per_seed(model):
+    laureates = list(model.generate(500, seed=7, chunk_size=100))
+    assert laureates == list(model.generate(500, seed=7, chunk_size=100))
+    assert laureates != list(model.generate(500, seed=8, chunk_size=100))
+
+
+def test_generated_laureates_have_the_schema(model, tmp_path):
+    with open(LAUREATE_PATH, encoding="utf-8") as f:
+        fields = {field for laureate in json.load(f)["laureates"] for field in laureate}
+    laureates = list(model.generate(2000, seed=1, chunk_size=500))
+    assert [laureate["id"] for laureate in laureates] == [str(i) for i in range(1, 2001)]
+    for laureate in laureates:
+        assert set(laureate) <= fields and laureate["gender"] in model.genders
+        assert laureate["prizes"] and all(set(prize) == PRIZE_FIELDS for prize in laureate["prizes"])
+        assert len({(prize["year"], prize["category"]) for prize in laureate["prizes"]}) == len(laureate["prizes"])
+    (path,) = write_dataset(iter(laureates), str(tmp_path / "laureates.json"))
+    assert list(iter_laureates(path)) == laureates
+
+
+def test_prizes_per_laureate_follow_the_data(model):
+    with open(LAUREATE_PATH, encoding="utf-8") as f:
+        real = Counter(len(laureate["prizes"]) for laureate in json.load(f)["laureates"])
+    generated = Counter(len(laureate["prizes"]) for laureate in model.generate(50000, seed=3))
+    assert set(generated) == set(real)
+    several = sum(count for prizes, count in generated.items() if prizes > 1) / 50000
+    expected = sum(count for prizes, count in real.items() if prizes > 1) / sum(real.values())
+    assert expected / 2 < several < expected * 2